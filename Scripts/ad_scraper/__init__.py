@@ -0,0 +1,16 @@
+# Shared core of the video ID scrapers: one progress journal, one scheduler
+# and one command line (python -m ad_scraper --help) for every backend.
+# The backends (http, playwright, selenium) are imported on first use so that
+# each only needs its own browser library installed.
+
+from .backends import BACKENDS, Backend, CachedBackend, ChainBackend, make_backend
+from .cache import VideoCache
+from .common import (MAX_ATTEMPTS, NETWORK_ERROR, NOT_VIDEO, PARSE_ERROR, RATE_LIMITED, TIMEOUT,
+                     TRANSIENT_OUTCOMES, TRANSPARENCY_URL, VIDEO, ScrapeFailure)
+from .csv_io import read_creatives, write_results
+from .limits import ConcurrencyLimiter, LatencyTracker, StageTimings
+from .metrics import Metrics, MetricsServer
+from .processed import ProcessedSet
+from .sinks import ResultList, ResultSink
+from .scheduler import process_url, scrape_all
+from .tracker import ProgressTracker
@@ -0,0 +1,5 @@
+from .cli import main
+
+# Guarded, since the processes of a sharded run import this module again
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# The interface every scraping backend implements, and how backends are
+# looked up by name.
+#
+# A backend turns one creative into a result:
+#
+#   result = await backend.extract(cr, ar)
+#   result == {'video_id': 'dQw4w9WgXcQ' or None, 'backend': 'playwright', 'bytes': 1536 or None,
+#              'stages': {'navigation': 0.41, 'fletch_render': 0.05, ...}}
+#
+# video_id None means the creative has no video. Every other way of failing
+# raises ScrapeFailure with its outcome, which the scheduler records and
+# retries if it is transient. stages holds the seconds spent in each step of
+# the extraction, for the metrics; a ScrapeFailure carries the stages it got
+# through. Backends are started before the first extract and closed after the
+# last one; extract may be called by many workers at once. Backends that need
+# a browser library import it themselves, so a backend can be used without
+# the libraries of the others installed.
+
+import asyncio
+import importlib
+import time
+
+from .common import TRANSIENT_OUTCOMES, TRANSPARENCY_URL, ScrapeFailure
+from .limits import StageTimings
+
+# name -> (module, class), imported on first use
+BACKENDS = {
+    'http': ('.http_backend', 'HttpBackend'),
+    'playwright': ('.playwright_backend', 'PlaywrightBackend'),
+    'selenium': ('.selenium_backend', 'SeleniumBackend'),
+}
+# Backends whose "no video" can be wrong: without running the page's
+# scripts, the HTTP path can miss a video a browser finds. Their misses are
+# not cached, and cached ones are ignored
+INCONCLUSIVE_MISSES = {'http'}
+
+class Backend:
+    """Base class of the backends; start and close do nothing by default"""
+    name = None
+
+    def __init__(self, base_url=TRANSPARENCY_URL, timings=None):
+        self.base_url = base_url
+        self.timings = timings if timings is not None else StageTimings()
+
+    @classmethod
+    def from_options(cls, options, timings=None):
+        """Backend configured from a dict of command-line options"""
+        return cls(options.get('base_url', TRANSPARENCY_URL), timings)
+
+    async def start(self):
+        pass
+
+    async def extract(self, cr, ar):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def summary(self):
+        """Lines of backend-specific statistics for the end of a run"""
+        return []
+
+    def result(self, video_id, transferred=None, stages=None):
+        return {'video_id': video_id, 'backend': self.name, 'bytes': transferred, 'stages': stages or {}}
+
+class ChainBackend(Backend):
+    """Tries its backends in order until one finds a video. A miss or a parse
+    error of any but the last falls through to the next one; a transient
+    failure (a timeout, a 429, a network error) is raised at once, so the
+    scheduler backs off and retries instead of the next backend hitting the
+    site straight away. The last one's result or failure is final. Used to
+    try the cheap HTTP path before a browser"""
+    def __init__(self, backends):
+        self.backends = list(backends)
+        self.name = '+'.join(backend.name for backend in self.backends)
+        self.base_url = self.backends[-1].base_url
+        self.timings = self.backends[-1].timings
+
+    async def start(self):
+        for backend in self.backends:
+            await backend.start()
+
+    async def extract(self, cr, ar):
+        # The stages of every backend tried are kept; their names differ
+        stages = {}
+        for backend in self.backends[:-1]:
+            try:
+                result = await backend.extract(cr, ar)
+            except ScrapeFailure as e:
+                if e.outcome in TRANSIENT_OUTCOMES:
+                    e.stages = {**stages, **e.stages}
+                    raise
+                stages.update(e.stages)
+                continue
+            if result['video_id']:
+                return result
+            stages.update(result['stages'])
+        try:
+            result = await self.backends[-1].extract(cr, ar)
+        except ScrapeFailure as e:
+            e.stages = {**stages, **e.stages}
+            raise
+        result['stages'] = {**stages, **result['stages']}
+        return result
+
+    async def close(self):
+        for backend in reversed(self.backends):
+            await backend.close()
+
+    def summary(self):
+        return [line for backend in self.backends for line in backend.summary()]
+
+class CachedBackend(Backend):
+    """Answers creatives from a VideoCache (see cache.py) when it can, with
+    'cache' as the backend of the result, and scrapes the others with backend,
+    caching what it finds. A miss is only cached, and only answered from the
+    cache, if it comes from a backend not in INCONCLUSIVE_MISSES; a chain's
+    misses come from its last backend"""
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.name = backend.name
+        self.base_url = backend.base_url
+        self.timings = backend.timings
+        self.hits = 0
+        self.misses = 0
+
+    async def start(self):
+        await self.backend.start()
+
+    async def extract(self, cr, ar):
+        start_time = time.perf_counter()
+        cached, video_id = self.cache.lookup(cr, ar, ignore_negatives_from=INCONCLUSIVE_MISSES)
+        if cached:
+            self.hits += 1
+            return {'video_id': video_id, 'backend': 'cache', 'bytes': None,
+                    'stages': {'cache': time.perf_counter() - start_time}}
+        self.misses += 1
+        result = await self.backend.extract(cr, ar)
+        if result['video_id'] or result['backend'] not in INCONCLUSIVE_MISSES:
+            # The commit waits on the disk, so it is kept off the event loop
+            await asyncio.to_thread(self.cache.store, cr, ar, result['video_id'], result['backend'])
+        return result
+
+    async def close(self):
+        await self.backend.close()
+
+    def summary(self):
+        return self.backend.summary() + [
+            f"Video cache: {self.hits} of {self.hits + self.misses} creatives answered from {self.cache.path}"]
+
+def backend_class(name):
+    """Class of a backend by name; imports its module"""
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend {name!r}, choose from {list(BACKENDS)}")
+    module_name, class_name = BACKENDS[name]
+    return getattr(importlib.import_module(module_name, __package__), class_name)
+
+def make_backend(spec, options=None, timings=None):
+    """Backend for a spec such as 'playwright', or several names joined with
+    '+' (e.g. 'http+playwright') to chain them. All share one StageTimings"""
+    options = options or {}
+    timings = timings if timings is not None else StageTimings()
+    backends = [backend_class(name).from_options(options, timings) for name in spec.split('+')]
+    return backends[0] if len(backends) == 1 else ChainBackend(backends)
@@ -0,0 +1,80 @@
+# Cache of the video ID of every creative ever scraped, shared by all runs
+# and input files, so that re-scraping a slice that overlaps an earlier one
+# (e.g. overlapping date windows from scraping_creative.py) costs a lookup per
+# creative already seen instead of a page load.
+#
+# A SQLite database keyed by (Advertiser_ID, Creative_ID) holding the video
+# ID found, or NULL for a creative without a video, with when it was
+# checked, and by which backend. A creative's video does not change, so
+# videos are kept for good; creatives without one are checked again after
+# negative_ttl, since a miss can also come from a page that did not render
+# fully. Misses of a backend that can overlook a video are not trusted at
+# all (see INCONCLUSIVE_MISSES in backends.py). Failures are never stored.
+# The database is in WAL mode, so the processes of a sharded run can share
+# it. store() commits, so CachedBackend calls it in a worker thread.
+
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                             'ad_scraper', 'videos.sqlite3')
+DEFAULT_NEGATIVE_TTL = 30 * 24 * 3600
+
+class VideoCache:
+    """Video IDs by (cr, ar), persisted in a SQLite file"""
+    def __init__(self, path=DEFAULT_CACHE, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection used from the event loop and, for some backends,
+        # worker threads; _lock serializes it
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS videos ('
+            ' advertiser_id TEXT NOT NULL,'
+            ' creative_id TEXT NOT NULL,'
+            ' video_id TEXT,'
+            ' backend TEXT,'
+            ' checked REAL NOT NULL,'
+            ' PRIMARY KEY (advertiser_id, creative_id)'
+            ') WITHOUT ROWID')
+        self.connection.commit()
+        self._lock = threading.Lock()
+
+    def lookup(self, cr, ar, ignore_negatives_from=()):
+        """(True, video ID or None) if the creative's result is cached and
+        current, else (False, None). A miss stored by a backend in
+        ignore_negatives_from is not current"""
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT video_id, backend, checked FROM videos WHERE advertiser_id = ? AND creative_id = ?',
+                (ar, cr)).fetchone()
+        if row is None:
+            return False, None
+        video_id, backend, checked = row
+        if video_id is None and (time.time() - checked > self.negative_ttl or backend in ignore_negatives_from):
+            return False, None
+        return True, video_id
+
+    def store(self, cr, ar, video_id, backend=None):
+        """Cache the result of scraping a creative: its video ID, or None"""
+        with self._lock:
+            self.connection.execute('INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?)',
+                                    (ar, cr, video_id, backend, time.time()))
+            self.connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,388 @@
+# Command line of the video ID scraper:
+#
+#   python -m ad_scraper creatives.csv
+#   python -m ad_scraper creatives.csv --backend selenium --workers 3
+#   python -m ad_scraper creatives.csv --backend http --backend playwright --backend http+playwright --limit 200
+#   python -m ad_scraper creatives.csv --shards 16
+#   python -m ad_scraper creatives.csv --shard 3/16          (then --merge-shards 16 once all are done)
+#
+# With one --backend, the creatives of the input CSV are scraped with it,
+# resuming from the progress journal, and the video IDs found are written to
+# the output as they are found, with the creatives of every video next to it
+# (see sinks.py). With several, every backend scrapes the same creatives from
+# a fresh journal in turn and a comparison of their speed and results is
+# printed instead, so the fastest backend for an environment can be picked.
+#
+# --shards N runs the N shards of the input (see shards.py) in N processes
+# of this machine, each with its own browser, journal and log, and merges
+# their outputs. --shard K/N runs just shard K, so the shards can be spread
+# over several machines; --merge-shards N combines their outputs afterwards.
+#
+# Every run writes a JSON report of where its seconds went (see metrics.py)
+# next to its journal; --metrics-port serves the same metrics live.
+#
+# Creatives scraped by any earlier run, of any input, are answered from the
+# video cache (see cache.py) without loading their page; --no-cache scrapes
+# everything. Backend comparisons never use it.
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import copy
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from .backends import BACKENDS, CachedBackend, make_backend
+from .cache import DEFAULT_CACHE, DEFAULT_NEGATIVE_TTL, VideoCache
+from .common import MAX_ATTEMPTS, TRANSPARENCY_URL
+from .csv_io import read_creatives
+from .limits import ConcurrencyLimiter, StageTimings
+from .metrics import Metrics, MetricsServer
+from .scheduler import checkpoint_progress, report_progress, scrape_all
+from .shards import merge_shards, parse_shard, shard_of, shard_path
+from .sinks import ResultList, ResultSink
+from .tracker import ProgressTracker
+
+DEFAULT_BACKEND = 'http+playwright'
+
+def default_paths(input_file):
+    # (output CSV, progress file) next to the input CSV
+    directory, name = os.path.split(input_file)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(directory, f'video_ids_{stem}.csv'), os.path.join(directory, f'progress_{stem}.json')
+
+def parse_backend(text):
+    # "http+playwright" -> itself, after checking every name
+    for name in text.split('+'):
+        if name not in BACKENDS:
+            raise argparse.ArgumentTypeError(f"unknown backend {name!r}, choose from {list(BACKENDS)}")
+    return text
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='ad_scraper',
+        description="Scrape the YouTube IDs of video creatives from the Google ad transparency site.",
+    )
+    parser.add_argument('input', help="CSV with Creative_ID and Advertiser_ID as its first two columns")
+    parser.add_argument('-o', '--output', metavar='PATH',
+                        help="output CSV, or Parquet if it ends in .parquet (default video_ids_<input name>.csv "
+                             "next to the input); the video -> creatives mapping goes to <name>.videos.<ext>")
+    parser.add_argument('--progress', metavar='PATH',
+                        help="progress file; its journal is <name>.jsonl (default progress_<input name>.json next to the input)")
+    parser.add_argument('--backend', action='append', type=parse_backend,
+                        help=f"one of {list(BACKENDS)}, or several joined with '+' to try in order "
+                             f"(default {DEFAULT_BACKEND}); repeat to compare backends on the same creatives")
+    parser.add_argument('--workers', type=int, default=7, help="ceiling on creatives in flight")
+    parser.add_argument('--initial-concurrency', type=int, default=2,
+                        help="creatives in flight at the start; the limit adapts between 1 and --workers")
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                        help="attempts per creative before a transient failure is final")
+    parser.add_argument('--limit', type=int, default=0, help="only the first N creatives (0 for all)")
+    parser.add_argument('--base-url', default=TRANSPARENCY_URL, help="transparency site to scrape")
+    parser.add_argument('--recycle-after', type=int, default=200,
+                        help="playwright: navigations before the browser context is replaced")
+    parser.add_argument('--allow-host', action='append', default=[],
+                        help="playwright: extra host the request filter lets through (repeatable)")
+    parser.add_argument('--proxy', action='append', default=[],
+                        help="selenium: proxy as ip:port or user:password@ip:port (repeatable)")
+    parser.add_argument('--firefox-binary', help="selenium: Firefox executable")
+    parser.add_argument('--geckodriver', help="selenium: geckodriver executable")
+    parser.add_argument('--order', choices=['input', 'advertiser'], default='input',
+                        help="scrape creatives in input order, or grouped by advertiser with each group "
+                             "kept on one worker (default %(default)s)")
+    parser.add_argument('--group-size', type=int, default=50, metavar='N',
+                        help="--order advertiser: most creatives of one advertiser a worker takes at once "
+                             "(default %(default)s)")
+    parser.add_argument('--quiet', action='store_true', help="no log line per creative")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve live metrics on http://127.0.0.1:PORT/metrics (shard K of a sharded run uses PORT+K-1)")
+    parser.add_argument('--report', metavar='PATH',
+                        help="end-of-run JSON report (default <progress file name>.report.json)")
+    parser.add_argument('--cache', metavar='PATH', default=DEFAULT_CACHE,
+                        help="video IDs of every creative scraped so far, shared by all runs (default %(default)s)")
+    parser.add_argument('--no-cache', action='store_true', help="neither use nor fill the video cache")
+    parser.add_argument('--negative-ttl', type=float, default=DEFAULT_NEGATIVE_TTL / 86400, metavar='DAYS',
+                        help="days after which a creative cached without a video is scraped again (default %(default)g)")
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument('--shards', type=int, metavar='N',
+                          help="scrape the N shards of the input in N processes, then merge their outputs")
+    sharding.add_argument('--shard', metavar='K/N',
+                          help="scrape only shard K of N, to its own output and journal")
+    sharding.add_argument('--merge-shards', type=int, metavar='N',
+                          help="only merge the outputs of the N shards into the output")
+    args = parser.parse_args(argv)
+
+    args.backend = args.backend or [DEFAULT_BACKEND]
+    output, progress = default_paths(args.input)
+    args.output = args.output or output
+    args.progress = args.progress or progress
+    args.report = args.report or os.path.splitext(args.progress)[0] + '.report.json'
+    if (args.shards or args.shard) and len(args.backend) > 1:
+        parser.error("backends cannot be compared in sharded mode")
+    if args.group_size < 1:
+        parser.error("--group-size must be at least 1")
+    if args.shards is not None and args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.shard:
+        try:
+            shard, num_shards = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(f"--shard expects K/N: {e}")
+        return for_shard(args, shard, num_shards)
+    args.shard = None
+    return args
+
+def for_shard(args, shard, num_shards):
+    """Copy of the arguments that scrapes one shard, to its own output and journal"""
+    shard_args = copy.copy(args)
+    shard_args.shard = (shard, num_shards)
+    shard_args.shards = None
+    shard_args.output = shard_path(args.output, shard, num_shards)
+    shard_args.progress = shard_path(args.progress, shard, num_shards)
+    shard_args.report = shard_path(args.report, shard, num_shards)
+    if args.metrics_port:
+        shard_args.metrics_port = args.metrics_port + shard - 1
+    return shard_args
+
+@contextlib.contextmanager
+def quiet_output(quiet):
+    # Drop the per-creative log lines when quiet
+    if not quiet:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def backend_options(args):
+    """Options the backends are configured from"""
+    return {
+        'base_url': args.base_url,
+        'workers': args.workers,
+        'recycle_after': args.recycle_after,
+        'allow_hosts': args.allow_host,
+        'proxies': args.proxy,
+        'firefox_binary': args.firefox_binary,
+        'geckodriver': args.geckodriver,
+    }
+
+def order_group_size(args):
+    """group_size of scrape_all for the --order chosen"""
+    return args.group_size if args.order == 'advertiser' else None
+
+async def scrape(backend, urls, progress_tracker, num_workers, limiter, metrics, group_size=None,
+                 report_interval=30):
+    """Start the backend, scrape every unprocessed URL with it and close it"""
+    background = [
+        asyncio.create_task(report_progress(progress_tracker, len(urls), report_interval, limiter)),
+        asyncio.create_task(checkpoint_progress(progress_tracker)),
+    ]
+    try:
+        await backend.start()
+        await scrape_all(backend, urls, progress_tracker, num_workers, limiter, metrics, group_size)
+    finally:
+        for task in background:
+            task.cancel()
+        await backend.close()
+
+def run_backend(spec, urls, progress_tracker, options, initial_concurrency=2, metrics_port=None, cache=None,
+                group_size=None):
+    """Scrape urls with one backend spec, answering from cache if given,
+    serving live metrics on metrics_port if given and in advertiser groups of
+    group_size if given; returns (seconds, backend, limiter, metrics). The
+    tracker is left open"""
+    num_workers = options.get('workers', 7)
+    backend = make_backend(spec, options, StageTimings())
+    if cache is not None:
+        backend = CachedBackend(backend, cache)
+    limiter = ConcurrencyLimiter(initial=min(initial_concurrency, num_workers), max_limit=num_workers)
+    metrics = Metrics(limiter)
+    start_time = time.time()
+    try:
+        with MetricsServer(metrics, metrics_port) if metrics_port else contextlib.nullcontext() as server:
+            if server:
+                print(f"Serving live metrics on {server.url}")
+            asyncio.run(scrape(backend, urls, progress_tracker, num_workers, limiter, metrics, group_size))
+    except KeyboardInterrupt:
+        print("\nInterrupted by user. Saving progress...")
+    return time.time() - start_time, backend, limiter, metrics
+
+def print_summary(progress_tracker, total_time, start_count, backend, limiter):
+    processed = len(progress_tracker.processed_urls)
+    processed_now = processed - start_count
+
+    print(f"\n=== FINAL RESULTS ===")
+    print(f"Backend: {backend.name}")
+    print(f"Total time: {total_time/3600:.2f} hours")
+    print(f"URLs processed: {processed} ({processed_now} in this run)")
+    print(f"Videos found: {progress_tracker.videos}")
+    print(f"Unique videos: {progress_tracker.sink.unique_videos}")
+    if processed:
+        print(f"Success rate: {progress_tracker.videos/processed*100:.1f}%")
+    if processed_now:
+        print(f"Rate: {processed_now / (total_time / 60):.1f} URLs/min, {total_time/processed_now:.2f}s per URL")
+    print(f"Outcomes this run: {dict(progress_tracker.outcome_counts)}")
+    print(f"Left to retry in a later run: {len(progress_tracker.failures)}")
+    print(f"Stage timings:\n{backend.timings.summary()}")
+    for line in backend.summary():
+        print(line)
+    print(f"Final concurrency limit: {limiter.limit:.1f} after {limiter.decreases} back-offs")
+
+def read_input(args):
+    # The distinct creatives of the input CSV, the first --limit of them, and
+    # of those only the ones of the shard being scraped
+    urls = list(dict.fromkeys(read_creatives(args.input)))
+    if args.limit:
+        urls = urls[:args.limit]
+    if args.shard:
+        shard, num_shards = args.shard
+        urls = [(cr, ar) for cr, ar in urls if shard_of(cr, num_shards) == shard]
+    return urls
+
+def scrape_file(args):
+    """Scrape the input CSV with one backend and write the video IDs found"""
+    try:
+        urls = read_input(args)
+    except FileNotFoundError:
+        print(f"Error: File not found - {args.input}")
+        return
+
+    # Results are written as they are found; the tracker starts by writing
+    # those of earlier runs from the journal
+    try:
+        sink = ResultSink(args.output)
+    except ImportError as e:
+        print(f"Error: {e}")
+        return
+    cache = None if args.no_cache else VideoCache(args.cache, args.negative_ttl * 86400)
+    with sink, cache if cache is not None else contextlib.nullcontext():
+        # Progress tracking, checkpointed every 50 URLs or 30 seconds
+        progress_tracker = ProgressTracker(args.progress, checkpoint_every=50, checkpoint_seconds=30,
+                                           max_attempts=args.max_attempts, sink=sink)
+        remaining = len(progress_tracker.unprocessed(urls))
+        start_count = len(progress_tracker.processed_urls)
+        print(f"Total URLs to process: {len(urls)}")
+        print(f"Already processed: {len(urls) - remaining}")
+        print(f"Remaining: {remaining}")
+        print(f"Writing results to: {args.output}, videos -> creatives to: {sink.mapping_file}")
+
+        try:
+            with quiet_output(args.quiet):
+                total_time, backend, limiter, metrics = run_backend(args.backend[0], urls, progress_tracker,
+                                                                    backend_options(args), args.initial_concurrency,
+                                                                    args.metrics_port, cache, order_group_size(args))
+        finally:
+            # Final save, also on errors
+            progress_tracker.close()
+
+    print_summary(progress_tracker, total_time, start_count, backend, limiter)
+    print(f"Results saved to: {args.output}")
+    metrics.write_report(args.report, input=args.input, backend=backend.name, shard=args.shard, order=args.order,
+                         processed=len(progress_tracker.processed_urls), videos=progress_tracker.videos,
+                         unique_videos=sink.unique_videos, left_to_retry=len(progress_tracker.failures))
+    print(f"Metrics report saved to: {args.report}")
+
+def run_shard(args):
+    # Entry point of a shard's process; its log goes to a file next to its journal
+    log_file = os.path.splitext(args.progress)[0] + '.log'
+    with open(log_file, 'a', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        scrape_file(args)
+
+def scrape_sharded(args):
+    """Scrape every shard in a process of its own, then merge their outputs"""
+    num_shards = args.shards
+    # Spawned, not forked: every shard starts its own browser from a clean process
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    for shard in range(1, num_shards + 1):
+        shard_args = for_shard(args, shard, num_shards)
+        process = context.Process(target=run_shard, args=(shard_args,), name=f"shard-{shard}-of-{num_shards}")
+        process.start()
+        processes[shard] = process
+        print(f"Shard {shard}/{num_shards}: started (pid {process.pid}), "
+              f"log in {os.path.splitext(shard_args.progress)[0]}.log")
+
+    start_time = time.time()
+    try:
+        for shard, process in processes.items():
+            process.join()
+            status = 'done' if process.exitcode == 0 else f'FAILED (exit code {process.exitcode})'
+            print(f"Shard {shard}/{num_shards}: {status} after {(time.time() - start_time)/60:.1f} minutes")
+    except KeyboardInterrupt:
+        # The shards got the interrupt too; let them save their progress
+        print("\nInterrupted by user. Waiting for the shards to save their progress...")
+        for process in processes.values():
+            process.join()
+        return
+
+    failed = [shard for shard, process in processes.items() if process.exitcode != 0]
+    if failed:
+        print(f"Not merging, shards {failed} failed; run them again with --shard K/{num_shards}")
+        return
+    merge_and_report(args.output, num_shards)
+
+def merge_and_report(output_file, num_shards):
+    merged = merge_shards(output_file, num_shards)
+    if merged is not None:
+        print(f"Merged {merged.count} results ({merged.unique_videos} unique videos) of {num_shards} shards "
+              f"into: {output_file}, videos -> creatives in: {merged.mapping_file}")
+
+def compare_backends(specs, urls, options, initial_concurrency=2, max_attempts=MAX_ATTEMPTS, quiet=True,
+                     group_size=None):
+    """Scrape the same URLs with every backend spec in turn, each from a fresh
+    journal. Returns one dict per spec with its seconds, results and stats"""
+    runs = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for spec in specs:
+            progress_tracker = ProgressTracker(os.path.join(work_dir, f"progress_{spec}.json"),
+                                               max_attempts=max_attempts, sink=ResultList())
+            try:
+                with quiet_output(quiet):
+                    seconds, backend, limiter, metrics = run_backend(spec, urls, progress_tracker, options,
+                                                                     initial_concurrency, group_size=group_size)
+            finally:
+                progress_tracker.close()
+            runs.append({
+                'backend': backend,
+                'seconds': seconds,
+                'found': {result['cr']: result['video_id'] for result in progress_tracker.sink.results},
+                'outcomes': collections.Counter(progress_tracker.outcome_counts),
+                'limiter': limiter,
+                'report': metrics.report(),
+            })
+    return runs
+
+def print_comparison(runs, count):
+    """One line per backend; results are compared with the first backend's"""
+    reference = runs[0]['found']
+    for run in runs:
+        backend = run['backend']
+        agree = sum(run['found'].get(cr) == video_id for cr, video_id in reference.items())
+        page_bytes = ''.join(f", {backend.timings.bytes_per_call(stage) / 1024:.1f} KB per {stage} call"
+                             for stage in backend.timings.bytes)
+        print(f"{backend.name:>20}: {run['seconds']:.1f}s, {count / (run['seconds'] / 60):.1f} URLs/min, "
+              f"{len(run['found'])} videos ({agree}/{len(reference)} as {runs[0]['backend'].name}), "
+              f"p95 {run['report']['stages'].get('total', {}).get('p95', 0):.2f}s per attempt, "
+              f"final limit {run['limiter'].limit:.1f}{page_bytes}, outcomes {dict(run['outcomes'])}")
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.merge_shards:
+        merge_and_report(args.output, args.merge_shards)
+        return
+    if args.shards:
+        scrape_sharded(args)
+        return
+    if len(args.backend) == 1:
+        scrape_file(args)
+        return
+
+    urls = read_input(args)
+    print(f"Comparing {len(args.backend)} backends on {len(urls)} creatives, up to {args.workers} in flight")
+    runs = compare_backends(args.backend, urls, backend_options(args), args.initial_concurrency,
+                            args.max_attempts, args.quiet, order_group_size(args))
+    print_comparison(runs, len(urls))
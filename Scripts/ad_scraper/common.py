@@ -0,0 +1,56 @@
+# Outcomes of scraping a creative and the helpers every backend and the
+# scheduler share.
+
+import asyncio
+import random
+
+TRANSPARENCY_URL = "https://adstransparency.google.com"
+
+# The nested iframes a creative page renders, as (stage, selector)
+IFRAME_CHAIN = [
+    ('fletch_render', 'iframe[id^="fletch-render"]'),
+    ('google_ad', 'iframe[id^="google_ad"]'),
+    ('video', 'iframe[id^="video"]'),
+]
+
+# Outcomes of scraping one creative. Transient failures go back on the queue
+# after an exponentially growing delay, at most MAX_ATTEMPTS times in total
+VIDEO = 'video'
+NOT_VIDEO = 'not_video'
+TIMEOUT = 'timeout'
+RATE_LIMITED = 'rate_limited'
+NETWORK_ERROR = 'network_error'
+PARSE_ERROR = 'parse_error'
+TRANSIENT_OUTCOMES = {TIMEOUT, RATE_LIMITED, NETWORK_ERROR}
+MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 600
+
+class ScrapeFailure(Exception):
+    """Scraping a creative failed; outcome says how"""
+    def __init__(self, outcome, message=None):
+        super().__init__(message or outcome)
+        self.outcome = outcome
+        self.stages = {}  # Seconds spent in each stage before failing
+
+def classify_error(error):
+    # Outcome of an unexpected exception raised while scraping; backends map
+    # the exceptions of their own library first
+    if isinstance(error, ScrapeFailure):
+        return error.outcome
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return TIMEOUT
+    if isinstance(error, OSError):
+        return NETWORK_ERROR
+    return PARSE_ERROR
+
+def retry_delay(attempts, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """Seconds to wait before the next attempt: exponential in the attempts made
+    so far, capped, with jitter so failed creatives do not return all at once"""
+    return min(base_delay * 2 ** (attempts - 1), max_delay) * random.uniform(0.5, 1.0)
+
+def embed_video_id(url):
+    # YouTube ID of a youtube.com/embed/ URL, or None
+    if not url or "youtube.com/embed/" not in url:
+        return None
+    return url.split("youtube.com/embed/")[1].split("?")[0] or None
@@ -0,0 +1,23 @@
+# Reading the creatives to scrape and writing the video IDs found.
+
+import csv
+
+def read_creatives(input_file):
+    """(cr, ar) pairs of a CSV whose first two columns are Creative_ID and
+    Advertiser_ID, after a header row"""
+    creatives = []
+    with open(input_file, mode='r', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip header row
+        for row in reader:
+            if len(row) >= 2:
+                creatives.append((row[0], row[1]))
+    return creatives
+
+def write_results(output_file, results):
+    """Write {'cr', 'ar', 'video_id'} results as Creative_ID,Advertiser_ID,Video_ID"""
+    with open(output_file, mode='w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Creative_ID', 'Advertiser_ID', 'Video_ID'])
+        for result in results:
+            writer.writerow([result['cr'], result['ar'], result['video_id']])
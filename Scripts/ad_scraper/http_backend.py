@@ -0,0 +1,128 @@
+# Direct extraction over plain HTTP: the creative RPC the transparency page
+# itself calls, then the render payloads it points at. No browser is started,
+# so it is by far the cheapest backend, but it only sees what the payloads
+# spell out; chain it before a browser backend ('http+playwright') to catch
+# the rest.
+
+import json
+import re
+import time
+
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from .backends import Backend
+from .common import NETWORK_ERROR, PARSE_ERROR, RATE_LIMITED, TIMEOUT, TRANSPARENCY_URL, ScrapeFailure, classify_error
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Version/17.2 Safari/537.36"
+
+# RPC the transparency page itself calls to load a creative. Its response holds
+# the URL of the creative's render payload (what the fletch-render iframe loads),
+# which in turn holds the YouTube embed of a video ad
+CREATIVE_RPC_PATH = "/anji/_/rpc/LookupService/GetCreativeById"
+RENDER_PAYLOAD_URL = re.compile(r'https?://[^"\'\s\\<>]+/ads/preview/content\.js[^"\'\s\\<>]*')
+YOUTUBE_ID = re.compile(r'(?:youtube\.com/embed/|ytimg\.com/vi/|youtube\.com/watch\?v=|video_videoId["\']?\s*:\s*["\'])([A-Za-z0-9_-]{11})')
+ESCAPED_CHAR = re.compile(r'\\u([0-9a-fA-F]{4})|\\x([0-9a-fA-F]{2})|\\(/)')
+
+async def create_http_client(playwright, base_url=TRANSPARENCY_URL):
+    """Create the pooled HTTP client used for direct extraction; it reuses
+    connections across requests and needs no browser"""
+    return await playwright.request.new_context(
+        user_agent=USER_AGENT,
+        extra_http_headers={'Origin': base_url, 'Referer': f"{base_url}/"},
+        timeout=10000,
+    )
+
+def unescape_payload(text):
+    # The RPC and render payloads embed URLs as JSON/JS string escapes
+    # (\u003d, \x26, \/), sometimes twice over
+    for _ in range(3):
+        unescaped = ESCAPED_CHAR.sub(lambda m: '/' if m.group(3) else chr(int(m.group(1) or m.group(2), 16)), text)
+        if unescaped == text:
+            break
+        text = unescaped
+    return text
+
+def find_video_id(text):
+    """YouTube ID referenced by an RPC or render payload, or None"""
+    match = YOUTUBE_ID.search(text)
+    return match.group(1) if match else None
+
+def check_status(response, what):
+    # Raise the outcome of a failed response
+    if response.status == 429:
+        raise ScrapeFailure(RATE_LIMITED, f"HTTP 429 for {what}")
+    if response.status >= 500:
+        raise ScrapeFailure(NETWORK_ERROR, f"HTTP {response.status} for {what}")
+    if not response.ok:
+        raise ScrapeFailure(PARSE_ERROR, f"HTTP {response.status} for {what}")
+
+async def extract_video_id_with_http(http_client, cr, ar, base_url=TRANSPARENCY_URL, stages=None):
+    """Extract video ID by fetching the creative's render payload directly.
+    Returns None if neither the RPC nor the payloads name a video; failed
+    requests raise ScrapeFailure. The seconds spent on the RPC and on the
+    payloads are added to stages"""
+    stages = {} if stages is None else stages
+    try:
+        rpc_start = time.perf_counter()
+        response = await http_client.post(
+            f"{base_url}{CREATIVE_RPC_PATH}",
+            params={'authuser': '0'},
+            form={'f.req': json.dumps({'1': ar, '2': cr, '5': {'1': 1}})},
+        )
+        check_status(response, cr)
+        text = unescape_payload(await response.text())
+        stages['rpc'] = time.perf_counter() - rpc_start
+        video_id = find_video_id(text)
+        if video_id:
+            return video_id
+
+        # Follow the render payload URLs the fletch-render iframe would load
+        for payload_url in dict.fromkeys(RENDER_PAYLOAD_URL.findall(text)):
+            payload_start = time.perf_counter()
+            payload = await http_client.get(payload_url)
+            check_status(payload, payload_url)
+            video_id = find_video_id(unescape_payload(await payload.text()))
+            stages['payload'] = stages.get('payload', 0.0) + time.perf_counter() - payload_start
+            if video_id:
+                return video_id
+        return None
+
+    except ScrapeFailure:
+        raise
+    except PlaywrightTimeoutError as e:
+        raise ScrapeFailure(TIMEOUT, str(e)) from e
+    except PlaywrightError as e:
+        raise ScrapeFailure(NETWORK_ERROR, str(e)) from e
+    except Exception as e:
+        raise ScrapeFailure(classify_error(e), str(e)) from e
+
+class HttpBackend(Backend):
+    """Extraction with a pooled HTTP client; pass client to share one"""
+    name = 'http'
+
+    def __init__(self, base_url=TRANSPARENCY_URL, timings=None, client=None):
+        super().__init__(base_url, timings)
+        self.client = client
+        self._playwright = None
+
+    async def start(self):
+        if self.client is None:
+            self._playwright = await async_playwright().start()
+            self.client = await create_http_client(self._playwright, self.base_url)
+
+    async def extract(self, cr, ar):
+        stages = {}
+        try:
+            with self.timings.measure(self.name):
+                video_id = await extract_video_id_with_http(self.client, cr, ar, self.base_url, stages)
+        except ScrapeFailure as e:
+            e.stages = stages
+            raise
+        return self.result(video_id, stages=stages)
+
+    async def close(self):
+        # A client passed in belongs to the caller
+        if self._playwright:
+            await self.client.dispose()
+            await self._playwright.stop()
+            self._playwright = None
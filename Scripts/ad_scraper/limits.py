@@ -0,0 +1,147 @@
+# Timing bookkeeping and the two adaptive limits of a scraping run: the
+# per-stage iframe timeouts and the number of creatives in flight.
+
+import asyncio
+import collections
+import contextlib
+import statistics
+import threading
+import time
+
+from .common import NOT_VIDEO, RATE_LIMITED, TIMEOUT, VIDEO
+
+class StageTimings:
+    """Count and total seconds spent in each stage of scraping (setup, one per
+    backend), and the bytes transferred by the stages that report them"""
+    def __init__(self):
+        self.counts = {}
+        self.totals = {}
+        self.bytes = {}
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+            self.totals[stage] = self.totals.get(stage, 0.0) + elapsed
+
+    def add_bytes(self, stage, count):
+        self.bytes[stage] = self.bytes.get(stage, 0) + count
+
+    def bytes_per_call(self, stage):
+        """Average bytes transferred per measured call of a stage"""
+        return self.bytes.get(stage, 0) / max(self.counts.get(stage, 0), 1)
+
+    def summary(self):
+        """One line per stage"""
+        return '\n'.join(
+            f"  {stage:<14} {self.counts[stage]:>7} x {self.totals[stage] / self.counts[stage] * 1000:>8.1f} ms avg "
+            f"{self.totals[stage]:>9.1f} s total"
+            + (f" {self.bytes_per_call(stage) / 1024:>9.1f} KB avg" if stage in self.bytes else '')
+            for stage in self.counts
+        )
+
+class LatencyTracker:
+    """Recent latencies of each iframe stage, from which its timeout is set.
+
+    Once min_samples latencies of a stage have been seen, the stage may take
+    factor times their given percentile (clamped to [minimum, maximum]
+    seconds), so timeouts follow how fast the site currently is instead of
+    being fixed guesses; until then the stage's default applies. Safe to use
+    from the threads of a blocking backend."""
+    def __init__(self, defaults, percentile=0.99, factor=3.0,
+                 minimum=0.5, maximum=20.0, window=500, min_samples=20):
+        self.defaults = dict(defaults)
+        self.percentile = percentile
+        self.factor = factor
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_samples = min_samples
+        self.samples = {stage: collections.deque(maxlen=window) for stage in self.defaults}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """Add how long a stage took when it succeeded"""
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def timeout(self, stage):
+        """Seconds the stage may take now"""
+        with self._lock:
+            ordered = sorted(self.samples[stage])
+        if len(ordered) < self.min_samples:
+            return self.defaults[stage]
+        observed = ordered[min(int(self.percentile * len(ordered)), len(ordered) - 1)]
+        return min(max(observed * self.factor, self.minimum), self.maximum)
+
+    def summary(self):
+        """Current timeout of every stage"""
+        return ', '.join(f"{stage} {self.timeout(stage):.2f}s" for stage in self.defaults)
+
+class ConcurrencyLimiter:
+    """AIMD limit on the creatives in flight, shared by all workers.
+
+    Every clean result adds 1/limit, so the limit grows by about one per round
+    of requests while the site keeps up. A rate limit, a timeout, or a recent
+    median latency above slow_factor times the long-run median (per kind of
+    request, i.e. per backend) multiplies the limit by decrease. That happens
+    at most once per round: requests started before the last decrease cannot
+    trigger another one. The limit stays within [min_limit, max_limit];
+    max_limit is the operator's ceiling."""
+    def __init__(self, initial=2, min_limit=1, max_limit=7, decrease=0.5, slow_factor=2.0,
+                 recent_window=10, history_window=500):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.slow_factor = slow_factor
+        self.recent_window = recent_window
+        self.history_window = history_window
+        self.in_flight = 0
+        self.started = 0
+        self.last_decrease = 0  # Value of started at the last decrease
+        self.decreases = 0
+        self.samples = {}  # kind -> (recent latencies, long-run latencies)
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """Wait for a free slot; returns the ticket to pass to release()"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self.started += 1
+            return self.started
+
+    async def release(self, ticket, outcome, latency, kind):
+        """Free the slot and adapt the limit to how the request went"""
+        async with self._condition:
+            self.in_flight -= 1
+            self._adjust(ticket, outcome, latency, kind)
+            self._condition.notify_all()
+
+    def _adjust(self, ticket, outcome, latency, kind):
+        clean = outcome in (VIDEO, NOT_VIDEO)
+        if clean:
+            recent, history = self.samples.setdefault(
+                kind, (collections.deque(maxlen=self.recent_window), collections.deque(maxlen=self.history_window)))
+            recent.append(latency)
+            history.append(latency)
+        if outcome in (RATE_LIMITED, TIMEOUT) or (clean and self._slow(kind)):
+            if ticket > self.last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                self.last_decrease = self.started
+                self.decreases += 1
+                # Latencies seen before the decrease say nothing about the new limit
+                for recent, _ in self.samples.values():
+                    recent.clear()
+        elif clean:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _slow(self, kind):
+        recent, history = self.samples[kind]
+        if len(recent) < self.recent_window or len(history) < 5 * self.recent_window:
+            return False
+        return statistics.median(recent) > self.slow_factor * statistics.median(history)
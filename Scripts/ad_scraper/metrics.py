@@ -0,0 +1,227 @@
+# Live metrics of a scraping run: how long every creative spends in each
+# stage (navigation, each iframe hop, the HTTP requests, and in total), how
+# each attempt ended, and how many creatives are in flight.
+#
+# They can be scraped while the run goes on from a local endpoint in the
+# Prometheus text format (MetricsServer, python -m ad_scraper --metrics-port)
+# and are written as a JSON report at the end of the run. Histograms keep
+# bucket counts only, so memory stays constant however long a run is;
+# quantiles in the report are interpolated within buckets, like Prometheus'
+# histogram_quantile.
+
+import datetime
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds of the stage histogram buckets
+STAGE_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+def format_labels(names, values):
+    # {stage="navigation",...} or an empty string
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+class Counter:
+    """Monotonic counts per combination of label values"""
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        """{label values: count}"""
+        with self._lock:
+            return dict(self.values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in self.snapshot().items()]
+        return lines
+
+class Histogram:
+    """Bucketed observations per combination of label values"""
+    def __init__(self, name, help, labels=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.series = {}  # label values -> [bucket counts (not cumulative), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """{label values: (bucket counts, sum, count)}"""
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self.series.items()}
+
+    def quantile(self, q, counts):
+        """Estimated q-quantile of a series' bucket counts"""
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i]
+                if upper == math.inf:
+                    return lower
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-2]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self.snapshot().items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == math.inf else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+class Metrics:
+    """Everything measured in one scraping run. The scheduler calls begin()
+    when a creative starts and end() with its outcome and stage times"""
+    def __init__(self, limiter=None, buckets=STAGE_BUCKETS):
+        self.limiter = limiter
+        self.start_time = time.time()
+        self.stage_seconds = Histogram(
+            'scraper_stage_seconds', "Seconds a creative spent in each stage of scraping; stage total is the whole attempt",
+            ('stage',), buckets)
+        self.creatives = Counter('scraper_creatives_total', "Attempts at a creative, by backend and outcome",
+                                 ('backend', 'outcome'))
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self, backend, outcome, seconds, stages):
+        """Record a finished attempt: its outcome, total seconds and {stage: seconds}"""
+        with self._lock:
+            self.in_flight -= 1
+        self.creatives.inc(backend, outcome)
+        for stage, stage_seconds in stages.items():
+            self.stage_seconds.observe(stage_seconds, stage)
+        self.stage_seconds.observe(seconds, 'total')
+
+    def completed(self):
+        return sum(self.creatives.snapshot().values())
+
+    def throughput(self):
+        """Attempts finished per minute since the start"""
+        minutes = (time.time() - self.start_time) / 60
+        return self.completed() / minutes if minutes > 0 else 0.0
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = self.stage_seconds.render() + self.creatives.render()
+        gauges = [
+            ('scraper_in_flight', "Creatives being scraped right now", self.in_flight),
+            ('scraper_throughput_per_minute', "Attempts finished per minute since the start", self.throughput()),
+            ('scraper_uptime_seconds', "Seconds since the run started", time.time() - self.start_time),
+        ]
+        if self.limiter:
+            gauges.append(('scraper_concurrency_limit', "Current AIMD limit on creatives in flight", self.limiter.limit))
+            gauges.append(('scraper_concurrency_backoffs', "Times the concurrency limit was decreased", self.limiter.decreases))
+        for name, help, value in gauges:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value:g}"]
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        """End-of-run summary as a JSON-serializable dict"""
+        outcomes = {}
+        for (backend, outcome), count in self.creatives.snapshot().items():
+            outcomes.setdefault(backend, {})[outcome] = count
+        stages = {}
+        for (stage,), (counts, total, count) in self.stage_seconds.snapshot().items():
+            stages[stage] = {
+                'count': count,
+                'seconds': round(total, 3),
+                'mean': round(total / count, 4),
+                **{f'p{round(q * 100)}': round(self.stage_seconds.quantile(q, counts), 4) for q in (0.5, 0.95, 0.99)},
+            }
+        report = {
+            'started': datetime.datetime.fromtimestamp(self.start_time).isoformat(timespec='seconds'),
+            'seconds': round(time.time() - self.start_time, 1),
+            'attempts': self.completed(),
+            'throughput_per_minute': round(self.throughput(), 2),
+            'outcomes': outcomes,
+            'stages': stages,
+        }
+        if self.limiter:
+            report['concurrency'] = {'final_limit': round(self.limiter.limit, 2), 'back_offs': self.limiter.decreases}
+        return report
+
+    def write_report(self, report_file, **extra):
+        """Write report() plus any extra fields as JSON"""
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump({**extra, **self.report()}, f, indent=2)
+
+class MetricsServer:
+    """Serves GET /metrics from a background thread; use as a context manager"""
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        self.metrics = metrics
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                payload = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
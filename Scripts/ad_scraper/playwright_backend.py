@@ -0,0 +1,331 @@
+# Extraction in a headless WebKit browser driven by Playwright: the creative
+# page is loaded in a warm page of a pooled browser context, with every
+# request the video iframe does not need aborted, and the video ID is taken
+# from the first YouTube embed request any of its frames makes.
+
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from .backends import Backend
+from .common import (IFRAME_CHAIN, NETWORK_ERROR, PARSE_ERROR, RATE_LIMITED, TIMEOUT, TRANSPARENCY_URL,
+                     ScrapeFailure, classify_error, embed_video_id)
+from .http_backend import USER_AGENT
+from .limits import LatencyTracker, StageTimings
+
+# What a creative page may load: only documents and scripts from the hosts that
+# render the transparency page and the fletch-render/google_ad frames.
+# Everything else (analytics, images, fonts, styles, media and the YouTube
+# player itself) is aborted
+ALLOWED_RESOURCE_TYPES = ('document', 'script', 'xhr', 'fetch')
+ALLOWED_HOSTS = (
+    'adstransparency.google.com',
+    'gstatic.com',
+    'googleusercontent.com',
+    'googlesyndication.com',
+    'doubleclick.net',
+)
+
+# Seconds each iframe stage may take until enough latencies have been observed
+DEFAULT_STAGE_TIMEOUTS = {'fletch_render': 5.0, 'google_ad': 1.0, 'video': 1.0}
+
+def classify_playwright_error(error):
+    # Outcome of an unexpected exception raised while scraping
+    if isinstance(error, PlaywrightTimeoutError):
+        return TIMEOUT
+    if isinstance(error, PlaywrightError):
+        return NETWORK_ERROR
+    return classify_error(error)
+
+async def create_webkit_browser(playwright):
+    """Create a single WebKit browser with optimized settings"""
+    browser = await playwright.webkit.launch(
+        headless=True,
+        args=[
+            "--disable-web-security",
+            "--disable-features=VizDisplayCompositor",
+            "--disable-background-networking",
+            "--disable-default-apps",
+            "--disable-extensions"
+        ]
+    )
+    return browser
+
+class RequestFilter:
+    """Allow-list for the requests of a creative page"""
+    def __init__(self, allowed_hosts=ALLOWED_HOSTS, allowed_resource_types=ALLOWED_RESOURCE_TYPES):
+        self.allowed_hosts = tuple(allowed_hosts)
+        self.allowed_resource_types = set(allowed_resource_types)
+
+    def allows(self, request):
+        """True if the request is needed to reach the video iframe"""
+        # The embed's URL is all we need; its page and player are never loaded
+        if embed_video_id(request.url):
+            return False
+        if request.resource_type not in self.allowed_resource_types:
+            return False
+        host = urlsplit(request.url).hostname or ''
+        return any(host == allowed or host.endswith('.' + allowed) for allowed in self.allowed_hosts)
+
+    async def route(self, route):
+        if self.allows(route.request):
+            await route.continue_()
+        else:
+            await route.abort()
+
+async def create_optimized_context(browser, request_filter=None):
+    """Create an optimized browser context"""
+    context = await browser.new_context(
+        user_agent=USER_AGENT,
+        viewport={'width': 1280, 'height': 720},
+        bypass_csp=True,
+        java_script_enabled=True,
+    )
+
+    # Abort every request the allow-list does not need
+    request_filter = request_filter or RequestFilter()
+    await context.route("**/*", request_filter.route)
+
+    return context
+
+class TransferMeter:
+    """Counts the bytes (headers and bodies, both ways) of the requests a page
+    completes between start() and stop()"""
+    def __init__(self, page):
+        self.page = page
+        self.sizes = []
+
+    def start(self):
+        self.page.on('requestfinished', self._on_finished)
+        return self
+
+    def _on_finished(self, request):
+        self.sizes.append(asyncio.ensure_future(request.sizes()))
+
+    async def stop(self):
+        """Total bytes transferred"""
+        self.page.remove_listener('requestfinished', self._on_finished)
+        total = 0
+        for sizes in await asyncio.gather(*self.sizes, return_exceptions=True):
+            if isinstance(sizes, dict):
+                total += sum(sizes.values())
+        return total
+
+class PagePool:
+    """Warm pages of one browser context, navigated again and again instead of
+    being opened and closed for every URL.
+
+    The context is replaced after recycle_after navigations so that whatever
+    leaks across navigations is released: idle pages of the old context are
+    closed at once, pages still in use when they are released, and the old
+    context itself once its last page is gone."""
+    def __init__(self, browser, recycle_after=200, timings=None, request_filter=None):
+        self.browser = browser
+        self.recycle_after = recycle_after
+        self.request_filter = request_filter
+        self.timings = timings if timings is not None else StageTimings()
+        self.context = None
+        self.navigations = 0
+        self.recycled = 0
+        self.idle = []
+        self.open_pages = {}  # context -> number of its pages still open
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """A page of the current context, ready to navigate"""
+        async with self._lock:
+            if self.context is None or self.navigations >= self.recycle_after:
+                await self._new_context()
+            self.navigations += 1
+            if self.idle:
+                return self.idle.pop()
+            with self.timings.measure('page_setup'):
+                page = await self.context.new_page()
+            self.open_pages[self.context] += 1
+            return page
+
+    async def release(self, page):
+        """Return a page for reuse, or close it if its context was recycled.
+        A reused page is navigated to about:blank first, so nothing of the
+        creative it showed (such as a late embed request of its player) can be
+        taken for the next creative's"""
+        if page.context is self.context and not page.is_closed():
+            try:
+                await page.goto('about:blank', timeout=5000)
+            except Exception:
+                await self._close_page(page)
+                return
+            # The context may have been recycled while the page was blanked
+            if page.context is self.context:
+                self.idle.append(page)
+                return
+        await self._close_page(page)
+
+    async def _close_page(self, page):
+        context = page.context
+        await page.close()
+        self.open_pages[context] -= 1
+        if context is not self.context and self.open_pages[context] == 0:
+            del self.open_pages[context]
+            await context.close()
+
+    async def _new_context(self):
+        old_context = self.context
+        with self.timings.measure('context_setup'):
+            self.context = await create_optimized_context(self.browser, self.request_filter)
+        self.open_pages[self.context] = 0
+        self.navigations = 0
+        if old_context is None:
+            return
+
+        self.recycled += 1
+        idle, self.idle = self.idle, []
+        for page in idle:
+            await self._close_page(page)
+        if self.open_pages.get(old_context) == 0:
+            del self.open_pages[old_context]
+            await old_context.close()
+
+    async def close(self):
+        """Close every page and context"""
+        self.idle = []
+        for context in list(self.open_pages):
+            await context.close()
+        self.open_pages = {}
+        self.context = None
+
+async def find_video_iframe_src(page, latency, stages=None):
+    """Walk the nested iframes of a loaded creative page; returns the src of the
+    video iframe, or None if the ad frame holds no video. A missing
+    fletch-render or google_ad frame is a timeout, an empty one a parse error.
+    The seconds each iframe took are added to stages"""
+    stages = {} if stages is None else stages
+    frame = page
+    for stage, selector in IFRAME_CHAIN:
+        stage_start = time.perf_counter()
+        try:
+            element = await frame.wait_for_selector(selector, timeout=latency.timeout(stage) * 1000)
+        except PlaywrightTimeoutError:
+            if stage == 'video':
+                return None
+            raise ScrapeFailure(TIMEOUT, f"no {stage} iframe")
+        stages[stage] = time.perf_counter() - stage_start
+        latency.record(stage, stages[stage])
+        if stage == 'video':
+            return await element.get_attribute('src')
+        frame = await element.content_frame()
+        if not frame:
+            raise ScrapeFailure(PARSE_ERROR, f"{stage} iframe has no content")
+
+async def extract_video_id_with_page(page, cr, ar, base_url=TRANSPARENCY_URL, latency=None, stages=None):
+    """Extract video ID using Playwright page.
+
+    The ID is taken from the first youtube.com/embed/ request any frame of the
+    page makes, so it is returned as soon as the player is requested. The
+    iframe walk runs alongside with adaptive timeouts and decides when a
+    creative has no video, in which case None is returned. Every other way of
+    failing raises ScrapeFailure. The seconds spent navigating and in each
+    iframe are added to stages."""
+    latency = latency or LatencyTracker(DEFAULT_STAGE_TIMEOUTS)
+    stages = {} if stages is None else stages
+    embed = asyncio.get_running_loop().create_future()
+
+    def on_request(request):
+        video_id = embed_video_id(request.url)
+        if video_id and not embed.done():
+            embed.set_result(video_id)
+
+    page.on('request', on_request)
+    walk = None
+    try:
+        adtransparency_url = f"{base_url}/advertiser/{ar}/creative/{cr}"
+
+        navigation_start = time.perf_counter()
+        response = await page.goto(adtransparency_url, wait_until='domcontentloaded', timeout=20000)
+        stages['navigation'] = time.perf_counter() - navigation_start
+        if response and response.status == 429:
+            raise ScrapeFailure(RATE_LIMITED, f"HTTP 429 for {cr}")
+        if response and response.status >= 500:
+            raise ScrapeFailure(NETWORK_ERROR, f"HTTP {response.status} for {cr}")
+
+        walk = asyncio.ensure_future(find_video_iframe_src(page, latency, stages))
+        await asyncio.wait([embed, walk], return_when=asyncio.FIRST_COMPLETED)
+        if embed.done():
+            return embed.result()
+        return embed_video_id(walk.result())
+
+    except ScrapeFailure:
+        raise
+    except Exception as e:
+        raise ScrapeFailure(classify_playwright_error(e), str(e)) from e
+    finally:
+        page.remove_listener('request', on_request)
+        if walk:
+            walk.cancel()
+            await asyncio.gather(walk, return_exceptions=True)
+
+class PlaywrightBackend(Backend):
+    """Extraction in the warm pages of a PagePool. Launches its own WebKit
+    browser unless one is passed in; page_pool replaces the default pool"""
+    name = 'playwright'
+
+    def __init__(self, base_url=TRANSPARENCY_URL, timings=None, recycle_after=200, request_filter=None,
+                 latency=None, browser=None, page_pool=None):
+        super().__init__(base_url, timings)
+        self.recycle_after = recycle_after
+        self.request_filter = request_filter or RequestFilter()
+        # One LatencyTracker for all workers, so their iframe timeouts adapt together
+        self.latency = latency or LatencyTracker(DEFAULT_STAGE_TIMEOUTS)
+        self.browser = browser
+        self.page_pool = page_pool
+        self._playwright = None
+
+    @classmethod
+    def from_options(cls, options, timings=None):
+        request_filter = RequestFilter(ALLOWED_HOSTS + tuple(options.get('allow_hosts') or ()))
+        return cls(options.get('base_url', TRANSPARENCY_URL), timings, options.get('recycle_after', 200), request_filter)
+
+    async def start(self):
+        if self.browser is None:
+            self._playwright = await async_playwright().start()
+            self.browser = await create_webkit_browser(self._playwright)
+        if self.page_pool is None:
+            self.page_pool = PagePool(self.browser, self.recycle_after, self.timings, self.request_filter)
+
+    async def extract(self, cr, ar):
+        stages = {}
+        page = await self.page_pool.acquire()
+        meter = TransferMeter(page).start()
+        try:
+            with self.timings.measure(self.name):
+                video_id = await extract_video_id_with_page(page, cr, ar, self.base_url, self.latency, stages)
+        except ScrapeFailure as e:
+            e.stages = stages
+            raise
+        finally:
+            transferred = await meter.stop()
+            self.timings.add_bytes(self.name, transferred)
+            await self.page_pool.release(page)
+        return self.result(video_id, transferred, stages)
+
+    async def close(self):
+        if self.page_pool:
+            await self.page_pool.close()
+        # A browser passed in belongs to the caller. The launch may have failed,
+        # leaving Playwright started without a browser
+        if self._playwright:
+            try:
+                if self.browser is not None:
+                    await self.browser.close()
+                    self.browser = None
+            finally:
+                await self._playwright.stop()
+                self._playwright = None
+
+    def summary(self):
+        return [
+            f"Browser contexts recycled: {self.page_pool.recycled if self.page_pool else 0}",
+            f"Final iframe timeouts: {self.latency.summary()}",
+        ]
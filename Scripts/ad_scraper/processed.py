@@ -0,0 +1,192 @@
+# Compact set of the (Creative ID, Advertiser ID) pairs a run has processed.
+#
+# Creative IDs are 'CR' followed by 20 digits, which fit a 9-byte integer,
+# and there are far fewer advertisers than creatives, so a pair is stored as
+# a 12-byte record: the creative's integer, big-endian, then the 3-byte index
+# of the advertiser in a table of the Advertiser IDs seen. The records are
+# kept in a sorted numpy array of 12-byte strings, which sort like the
+# records, with a small set of recent ones that is merged in once it fills
+# up: about 12 bytes per pair instead of the ~120 of a Python string in a
+# set, which matters on multi-million-creative runs. The price is speed: a
+# lookup is a binary search of the array, a few times slower than a set
+# lookup, so contains_many and add_many do a whole list of pairs with one
+# sort and search. Pairs that cannot be encoded are kept in an ordinary set.
+#
+# The advertiser table and the sorted records are also the on-disk snapshot
+# (save/load), which is read straight into the array.
+
+import os
+
+import numpy as np
+
+CR_DIGITS = 20
+CR_BYTES = 9  # 10**20 < 2**72
+AR_BYTES = 3
+RECORD = CR_BYTES + AR_BYTES
+MAX_ADVERTISERS = 2 ** (8 * AR_BYTES)
+RECORD_DTYPE = np.dtype(f'S{RECORD}')
+SNAPSHOT_MAGIC = b'ADSCRAPER-PROCESSED-1\n'
+
+class ProcessedSet:
+    """Set of (cr, ar) pairs supporting add, in, len and iteration.
+    Membership is O(log n); adds are amortized O(log n), with a merge into
+    the sorted records every merge_every new pairs"""
+    def __init__(self, merge_every=65536):
+        self.merge_every = merge_every
+        self.records = np.empty(0, dtype=RECORD_DTYPE)  # Sorted, never changed in place
+        self.recent = set()  # Records not merged into self.records yet
+        self.other = set()  # (cr, ar) pairs that cannot be encoded
+        self.advertisers = []  # Advertiser IDs by index
+        self.advertiser_index = {}
+
+    def __len__(self):
+        return len(self.records) + len(self.recent) + len(self.other)
+
+    def __contains__(self, pair):
+        record = self._encode(pair)
+        if record is None:
+            return pair in self.other
+        return record in self.recent or self._stored(record)
+
+    def contains_many(self, pairs):
+        """[pair in self for pair in pairs], searching for all of them at once"""
+        pairs = list(pairs)
+        records, encoded = self._encode_many(pairs)
+        found = np.zeros(len(pairs), dtype=bool)
+        if self.other:
+            found[:] = [pair in self.other for pair in pairs]
+        if self.recent:
+            found[encoded] |= np.isin(records, np.array(list(self.recent), dtype=RECORD_DTYPE))
+        if len(self.records):
+            # Sorted queries walk the array in order, with far fewer cache misses
+            order = np.argsort(records)
+            positions = np.minimum(self.records.searchsorted(records[order]), len(self.records) - 1)
+            found[np.array(encoded, dtype=np.int64)[order]] |= self.records[positions] == records[order]
+        return found.tolist()
+
+    def __iter__(self):
+        self.merge()
+        data = self.records.tobytes()
+        for start in range(0, len(data), RECORD):
+            yield self._decode(data[start:start + RECORD])
+        yield from list(self.other)
+
+    def add(self, pair):
+        """Add a pair; returns False if it was in the set already"""
+        record = self._encode(pair, add_advertiser=True)
+        if record is None:
+            if pair in self.other:
+                return False
+            self.other.add(pair)
+            return True
+        if record in self.recent or self._stored(record):
+            return False
+        self.recent.add(record)
+        if len(self.recent) >= self.merge_every:
+            self.merge()
+        return True
+
+    def add_many(self, pairs):
+        """[self.add(pair) for pair in pairs], with one merge of the new pairs
+        into the sorted records"""
+        self.merge()
+        pairs = list(pairs)
+        records, encoded = self._encode_many(pairs, add_advertiser=True)
+        added = np.zeros(len(pairs), dtype=bool)
+        if len(encoded) < len(pairs):
+            for i in sorted(set(range(len(pairs))).difference(encoded)):
+                added[i] = pairs[i] not in self.other
+                self.other.add(pairs[i])
+        # Only the first of the repeats of a record, and only if not stored
+        order = np.argsort(records, kind='stable')
+        records = records[order]
+        new = np.ones(len(records), dtype=bool)
+        new[1:] = records[1:] != records[:-1]
+        positions = self.records.searchsorted(records)
+        if len(self.records):
+            new &= self.records[np.minimum(positions, len(self.records) - 1)] != records
+        added[np.array(encoded, dtype=np.int64)[order]] = new
+        self.records = np.insert(self.records, positions[new], records[new])
+        return added.tolist()
+
+    def _encode(self, pair, add_advertiser=False):
+        # Record of a pair, or None if it has none: its Creative ID is not of
+        # the usual form, or its advertiser is not in the table (and is not
+        # added, or cannot be written to the snapshot, or the table is full)
+        cr, ar = pair
+        digits = cr[2:]
+        if len(cr) != CR_DIGITS + 2 or cr[:2] != 'CR' or not (digits.isdigit() and digits.isascii()):
+            return None
+        index = self.advertiser_index.get(ar)
+        if index is None:
+            if not add_advertiser or len(self.advertisers) >= MAX_ADVERTISERS or '\n' in ar:
+                return None
+            index = self.advertiser_index[ar] = len(self.advertisers)
+            self.advertisers.append(ar)
+        # The creative's CR_BYTES big-endian, then the advertiser's AR_BYTES
+        return (int(digits) << (8 * AR_BYTES) | index).to_bytes(RECORD, 'big')
+
+    def _encode_many(self, pairs, add_advertiser=False):
+        # (Array of the records of the pairs that have one, their indices in pairs)
+        records = [self._encode(pair, add_advertiser) for pair in pairs]
+        encoded = [i for i, record in enumerate(records) if record is not None]
+        if len(encoded) < len(records):
+            records = [records[i] for i in encoded]
+        return np.array(records, dtype=RECORD_DTYPE), encoded
+
+    def _decode(self, record):
+        cr = f"CR{int.from_bytes(record[:CR_BYTES], 'big'):0{CR_DIGITS}d}"
+        return cr, self.advertisers[int.from_bytes(record[CR_BYTES:], 'big')]
+
+    def _stored(self, record):
+        # Whether record is in the sorted records; compared as raw bytes, since
+        # numpy drops the trailing zero bytes of the items it returns
+        position = self.records.searchsorted(record)
+        return self.records[position:position + 1].tobytes() == record
+
+    def merge(self):
+        """Move the recent pairs into the sorted records"""
+        if self.recent:
+            new = np.sort(np.array(list(self.recent), dtype=RECORD_DTYPE))
+            self.recent = set()
+            self.records = np.insert(self.records, self.records.searchsorted(new), new)
+
+    def copy(self):
+        processed = ProcessedSet(self.merge_every)
+        processed.records = self.records
+        processed.recent = set(self.recent)
+        processed.other = set(self.other)
+        processed.advertisers = list(self.advertisers)
+        processed.advertiser_index = dict(self.advertiser_index)
+        return processed
+
+    def save(self, snapshot_file):
+        """Atomically write the encoded pairs to snapshot_file; the others
+        (in self.other) must be stored by the caller"""
+        self.merge()
+        temp_file = snapshot_file + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(f"{len(self.advertisers)}\n".encode('ascii'))
+            f.write(''.join(ar + '\n' for ar in self.advertisers).encode('utf-8'))
+            f.write(self.records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, snapshot_file)
+
+    @classmethod
+    def load(cls, snapshot_file, merge_every=65536):
+        """ProcessedSet of a snapshot written by save(); raises ValueError if
+        the file is not one"""
+        processed = cls(merge_every)
+        with open(snapshot_file, 'rb') as f:
+            if f.readline() != SNAPSHOT_MAGIC:
+                raise ValueError(f"{snapshot_file} is not a processed-pairs snapshot")
+            num_advertisers = int(f.readline())
+            processed.advertisers = [f.readline()[:-1].decode('utf-8') for _ in range(num_advertisers)]
+            processed.advertiser_index = {ar: index for index, ar in enumerate(processed.advertisers)}
+            data = f.read()
+        if len(data) % RECORD:
+            raise ValueError(f"{snapshot_file} is truncated")
+        processed.records = np.frombuffer(data, dtype=RECORD_DTYPE)
+        return processed
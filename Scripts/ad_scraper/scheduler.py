@@ -0,0 +1,198 @@
+# The one scheduler every backend runs under: long-lived workers over a
+# shared queue, an adaptive limit on the creatives in flight, retries of
+# transient failures with backoff, and checkpoints of the progress journal.
+#
+# By default creatives are scraped in input order, which jumps between
+# advertisers from one creative to the next. In advertiser-locality mode
+# (group_size) the queue holds runs of creatives of one advertiser instead,
+# and a worker scrapes a whole run before taking the next, so at most
+# num_workers advertisers are in flight at a time and the advertiser-level
+# state a site keeps for a client (session, caches, connections) stays warm.
+
+import asyncio
+import time
+
+from .common import NOT_VIDEO, TRANSIENT_OUTCOMES, VIDEO, classify_error, retry_delay
+
+async def process_url(backend, cr, ar, worker_id, progress_tracker, limiter=None, metrics=None):
+    """Scrape one creative with the backend. With a limiter, waits for a free
+    slot first and reports back how the request went; with metrics, records
+    the time spent in every stage. Records and returns the outcome"""
+    video_id = None
+    kind = backend.name
+    transfer = ''
+    stages = {}
+    ticket = await limiter.acquire() if limiter else None
+    if metrics:
+        metrics.begin()
+    print(f"Worker {worker_id}: Processing {cr}")
+    start_time = time.time()
+    try:
+        result = await backend.extract(cr, ar)
+        video_id, kind, stages = result['video_id'], result['backend'], result['stages']
+        if result['bytes'] is not None:
+            transfer = f", {result['bytes'] / 1024:.1f} KB"
+        outcome = VIDEO if video_id else NOT_VIDEO
+        error = None
+    except Exception as e:
+        outcome = classify_error(e)
+        stages = getattr(e, 'stages', {})
+        error = e
+    elapsed = time.time() - start_time
+    if limiter:
+        await limiter.release(ticket, outcome, elapsed, kind)
+    if metrics:
+        metrics.end(kind, outcome, elapsed, stages)
+
+    # Add to progress tracker
+    done = progress_tracker.record_outcome(cr, ar, outcome, video_id)
+
+    if outcome == VIDEO:
+        print(f"Worker {worker_id}: SUCCESS - {cr} -> {video_id} ({elapsed:.2f}s, {kind}{transfer})")
+    elif outcome == NOT_VIDEO:
+        print(f"Worker {worker_id}: FAILED - {cr} ({elapsed:.2f}s{transfer})")
+    else:
+        attempts = '' if done else f", attempt {progress_tracker.attempts(cr, ar)}"
+        print(f"Worker {worker_id}: ERROR - {cr}: {outcome}: {error} ({elapsed:.2f}s{attempts})")
+    return outcome
+
+class RetryQueue(asyncio.Queue):
+    """Queue of (cr, ar) pairs, or groups of them, whose items can be put back after a delay.
+    join() also waits for items that are waiting to come back"""
+    def __init__(self):
+        super().__init__()
+        self._retries = set()
+
+    def retry_later(self, item, delay):
+        """Put an item taken from the queue back after delay seconds; called
+        instead of task_done for it"""
+        task = asyncio.create_task(self._put_later(item, delay))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _put_later(self, item, delay):
+        await asyncio.sleep(delay)
+        # Put before marking the first attempt done, so join() never sees zero
+        self.put_nowait(item)
+        self.task_done()
+
+async def scrape_worker(worker_id, backend, queue, progress_tracker, limiter=None, metrics=None):
+    """Long-lived worker: pulls (cr, ar) pairs from the shared queue. Transient
+    failures go back on the queue after a backoff delay until the tracker's
+    attempt cap is reached"""
+    while True:
+        cr, ar = await queue.get()
+        retrying = False
+        try:
+            outcome = await process_url(backend, cr, ar, worker_id, progress_tracker, limiter, metrics)
+            if outcome in TRANSIENT_OUTCOMES and not progress_tracker.is_processed(cr, ar):
+                delay = retry_delay(progress_tracker.attempts(cr, ar))
+                print(f"Worker {worker_id}: RETRY - {cr} in {delay:.0f}s")
+                queue.retry_later((cr, ar), delay)
+                retrying = True
+        finally:
+            if not retrying:
+                queue.task_done()
+
+async def scrape_group_worker(worker_id, backend, queue, progress_tracker, limiter=None, metrics=None):
+    """Long-lived worker of the advertiser-locality mode: pulls a group of
+    creatives of one advertiser from the shared queue and scrapes them one
+    after the other. Its transient failures go back on the queue as one group,
+    after the longest of their backoff delays"""
+    while True:
+        group = await queue.get()
+        retrying = False
+        try:
+            retries = []
+            delay = 0
+            for cr, ar in group:
+                outcome = await process_url(backend, cr, ar, worker_id, progress_tracker, limiter, metrics)
+                if outcome in TRANSIENT_OUTCOMES and not progress_tracker.is_processed(cr, ar):
+                    delay = max(delay, retry_delay(progress_tracker.attempts(cr, ar)))
+                    retries.append((cr, ar))
+            if retries:
+                print(f"Worker {worker_id}: RETRY - {len(retries)} creatives of {group[0][1]} in {delay:.0f}s")
+                queue.retry_later(retries, delay)
+                retrying = True
+        finally:
+            if not retrying:
+                queue.task_done()
+
+def advertiser_groups(urls, group_size):
+    """The (cr, ar) pairs grouped by advertiser, in groups of at most
+    group_size creatives so one large advertiser still spreads over the
+    workers. Largest advertisers first, so no worker is left with a long run
+    at the end"""
+    by_advertiser = {}
+    for cr, ar in urls:
+        by_advertiser.setdefault(ar, []).append((cr, ar))
+    groups = []
+    for pairs in sorted(by_advertiser.values(), key=len, reverse=True):
+        groups.extend(pairs[start:start + group_size] for start in range(0, len(pairs), group_size))
+    return groups
+
+async def report_progress(progress_tracker, total, interval=30, limiter=None):
+    """Print progress, throughput and ETA periodically"""
+    start_time = time.time()
+    start_count = len(progress_tracker.processed_urls)
+    while True:
+        await asyncio.sleep(interval)
+        processed_count = len(progress_tracker.processed_urls)
+        rate = (processed_count - start_count) / ((time.time() - start_time) / 60)
+        eta = (total - processed_count) / rate if rate > 0 else float('inf')
+        print(f"Total progress: {processed_count}/{total} ({processed_count/total*100:.1f}%)")
+        print(f"Rate: {rate:.1f} URLs/min, ETA: {eta:.1f} minutes")
+        if limiter:
+            print(f"Concurrency limit: {limiter.limit:.1f} ({limiter.in_flight} in flight, {limiter.decreases} back-offs)")
+
+async def checkpoint_progress(progress_tracker, poll_interval=1):
+    """Save progress whenever the tracker says a checkpoint is due. The save runs
+    in a thread so workers never wait on disk I/O. An interruption loses at
+    most checkpoint_every results (or checkpoint_seconds of work) plus whatever
+    completes within one poll_interval"""
+    while True:
+        await asyncio.sleep(poll_interval)
+        if progress_tracker.checkpoint_due():
+            await asyncio.to_thread(progress_tracker.save_progress)
+
+async def scrape_all(backend, urls_to_process, progress_tracker, num_workers, limiter=None, metrics=None,
+                     group_size=None):
+    """Run num_workers workers over a shared queue of the unprocessed URLs.
+
+    Every worker picks up the next URL as soon as it finishes one, so the
+    number of creatives in flight stays at num_workers instead of waiting for
+    the slowest of a batch. URLs the tracker already has as processed, and
+    repeats of a URL, are skipped. With a limiter, num_workers is only the
+    ceiling and the limiter decides how many of them have a creative in
+    flight. Attempts are recorded in metrics if given. With a group_size, the
+    URLs are scraped in advertiser-locality mode, in groups of up to
+    group_size creatives of one advertiser. Returns once every URL is
+    processed or out of attempts."""
+    queue = RetryQueue()
+    pending = progress_tracker.unprocessed(dict.fromkeys(urls_to_process))
+    if group_size:
+        worker = scrape_group_worker
+        for group in advertiser_groups(pending, group_size):
+            queue.put_nowait(group)
+        print(f"Queued {len(pending)} URLs in {queue.qsize()} advertiser groups "
+              f"for {num_workers} workers ({backend.name})")
+    else:
+        worker = scrape_worker
+        for pair in pending:
+            queue.put_nowait(pair)
+        print(f"Queued {queue.qsize()} URLs for {num_workers} workers ({backend.name})")
+    workers = [
+        asyncio.create_task(worker(worker_id + 1, backend, queue, progress_tracker, limiter, metrics))
+        for worker_id in range(min(num_workers, queue.qsize()))
+    ]
+    finished = asyncio.ensure_future(queue.join())
+    try:
+        # Workers never return; one that stops has raised
+        await asyncio.wait([finished, *workers], return_when=asyncio.FIRST_COMPLETED)
+        for worker in workers:
+            if worker.done():
+                worker.result()
+    finally:
+        for task in [finished, *workers]:
+            task.cancel()
+        await asyncio.gather(finished, *workers, return_exceptions=True)
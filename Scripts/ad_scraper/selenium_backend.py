@@ -0,0 +1,354 @@
+# Extraction in a pool of headless Firefox browsers driven by Selenium. The
+# WebDriver calls block, so every extraction runs in a thread of its own and
+# holds one browser of the pool for its duration.
+
+import asyncio
+import threading
+import time
+import random
+from queue import Queue
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.webdriver.firefox.service import Service as FirefoxService
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from .backends import Backend
+from .common import (IFRAME_CHAIN, NETWORK_ERROR, RATE_LIMITED, TIMEOUT, TRANSPARENCY_URL,
+                     ScrapeFailure, classify_error)
+from .limits import LatencyTracker
+
+# Seconds each iframe stage may take until enough latencies have been observed
+DEFAULT_STAGE_TIMEOUTS = {'fletch_render': 7.0, 'google_ad': 5.0, 'video': 5.0}
+
+# How often WebDriverWait checks for an iframe; short, so a frame that is
+# already there is picked up almost immediately
+POLL_FREQUENCY = 0.05
+
+# Firefox and geckodriver executables; None finds them on the PATH (or lets
+# Selenium Manager fetch geckodriver), --firefox-binary/--geckodriver override
+FIREFOX_BINARY = None
+GECKODRIVER = None
+
+def classify_selenium_error(error):
+    # Outcome of an unexpected exception raised while scraping
+    if isinstance(error, TimeoutException):
+        return TIMEOUT
+    if isinstance(error, WebDriverException):
+        return NETWORK_ERROR
+    return classify_error(error)
+
+class BrowserPool:
+    """Thread-safe browser pool for concurrent processing. The browsers are
+    launched with the proxies given, in rotation, or the list below"""
+    def __init__(self, pool_size=3, browser_type='firefox', firefox_binary=FIREFOX_BINARY, geckodriver=GECKODRIVER,
+                 proxies=None):
+        self.pool_size = pool_size
+        self.browser_type = browser_type
+        self.firefox_binary = firefox_binary
+        self.geckodriver = geckodriver
+        self.browsers = Queue()
+        self._lock = threading.Lock()
+
+        # Proxy rotation setup
+        self.proxies = list(proxies) if proxies else [
+            # Add your proxy list here - format: "ip:port" or "username:password@ip:port"
+            # Example proxies (replace with your actual proxies):
+            # "192.168.1.100:8080",
+            # "192.168.1.101:8080",
+            # "user:pass@192.168.1.102:8080",
+            # "proxy1.example.com:3128",
+            # "proxy2.example.com:3128"
+        ]
+
+        # If no proxies provided, use direct connection
+        if not self.proxies:
+            print("⚠️  No proxies configured - using direct connection")
+            self.proxies = [None]  # None means no proxy
+        else:
+            print(f"✅ Configured {len(self.proxies)} proxies for rotation")
+
+        self.proxy_index = 0
+        self._initialize_browsers()
+
+    def _get_next_proxy(self):
+        """Get next proxy in rotation"""
+        with self._lock:
+            proxy = self.proxies[self.proxy_index]
+            self.proxy_index = (self.proxy_index + 1) % len(self.proxies)
+            return proxy
+
+    def _create_browser(self):
+        """Create a single browser instance with optimized settings"""
+
+        # Get next proxy in rotation
+        proxy = self._get_next_proxy()
+
+        # Rotate user agents to avoid detection
+        user_agents = [
+            "Mozilla/5.0 (X11; Linux x86_64; rv:91.0) Gecko/20100101 Firefox/91.0",
+            "Mozilla/5.0 (X11; Linux x86_64; rv:92.0) Gecko/20100101 Firefox/92.0", 
+            "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:91.0) Gecko/20100101 Firefox/91.0",
+            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36"
+        ]
+
+        # Firefox
+        options = FirefoxOptions()
+        options.add_argument("--headless")
+
+        # Configure proxy if available
+        if proxy:
+            print(f"🌐 Using proxy: {proxy}")
+            if "@" in proxy:
+                # Proxy with authentication: username:password@ip:port
+                auth_part, proxy_part = proxy.split("@")
+                username, password = auth_part.split(":")
+                ip, port = proxy_part.split(":")
+
+                # Set proxy preferences for Firefox
+                options.set_preference("network.proxy.type", 1)  # Manual proxy
+                options.set_preference("network.proxy.http", ip)
+                options.set_preference("network.proxy.http_port", int(port))
+                options.set_preference("network.proxy.ssl", ip)
+                options.set_preference("network.proxy.ssl_port", int(port))
+
+                # Authentication (requires additional setup)
+                options.set_preference("network.proxy.share_proxy_settings", True)
+
+            else:
+                # Simple proxy: ip:port
+                ip, port = proxy.split(":")
+                options.set_preference("network.proxy.type", 1)  # Manual proxy
+                options.set_preference("network.proxy.http", ip)
+                options.set_preference("network.proxy.http_port", int(port))
+                options.set_preference("network.proxy.ssl", ip)
+                options.set_preference("network.proxy.ssl_port", int(port))
+                options.set_preference("network.proxy.share_proxy_settings", True)
+
+        # Performance optimizations
+        options.set_preference("dom.webdriver.enabled", False)
+        options.set_preference("useAutomationExtension", False)
+        options.set_preference("general.useragent.override", random.choice(user_agents))
+
+        # Disable images for faster loading (but keep JavaScript enabled)
+        options.set_preference("permissions.default.image", 2)
+        # options.set_preference("javascript.enabled", False)  # COMMENTED OUT - we need JS!
+
+        # Additional performance settings
+        options.set_preference("dom.ipc.plugins.enabled.libflashplayer.so", False)
+        options.set_preference("media.volume_scale", "0.0")
+
+        # Custom Firefox binary and geckodriver paths
+        if self.firefox_binary:
+            options.binary_location = self.firefox_binary
+        driver = webdriver.Firefox(options=options, service=FirefoxService(executable_path=self.geckodriver))
+
+        return driver
+
+    def _initialize_browsers(self):
+        """Initialize the browser pool"""
+        for _ in range(self.pool_size):
+            try:
+                browser = self._create_browser()
+                self.browsers.put(browser)
+            except Exception as e:
+                print(f"Error creating browser: {e}")
+
+    def get_browser(self, timeout=30):
+        """Get a browser from the pool"""
+        try:
+            return self.browsers.get(timeout=timeout)
+        except:
+            # If pool is empty, create a new browser
+            return self._create_browser()
+
+    def return_browser(self, browser):
+        """Return a browser to the pool"""
+        try:
+            self.browsers.put_nowait(browser)
+        except:
+            # If queue is full, properly close the browser
+            try:
+                browser.close()  # Close the current window
+            except:
+                pass
+            try:
+                browser.quit()   # Quit the driver
+            except:
+                pass
+
+    def close_all(self):
+        """Close all browsers in the pool"""
+        while not self.browsers.empty():
+            try:
+                browser = self.browsers.get_nowait()
+                # Properly close browser windows first, then quit the driver
+                try:
+                    browser.close()  # Close the current window
+                except:
+                    pass
+                try:
+                    browser.quit()   # Quit the driver and close all windows
+                except:
+                    pass
+            except:
+                pass
+
+    def add_proxies(self, proxy_list):
+        """Add a list of proxies to the rotation"""
+        with self._lock:
+            self.proxies = proxy_list if proxy_list else [None]
+            self.proxy_index = 0
+            print(f"✅ Updated proxy list: {len(self.proxies)} proxies")
+
+def extract_video_id_with_selenium(driver, cr, ar, base_url=TRANSPARENCY_URL, latency=None, min_page_chars=1000,
+                                   stages=None):
+    """Extract video ID using Selenium WebDriver, waiting for each iframe for as
+    long as the latency tracker currently allows. Returns None if the ad frame
+    holds no video and raises ScrapeFailure for every other failure. A page
+    source shorter than min_page_chars is taken for a blocked response. The
+    seconds spent navigating and in each iframe are added to stages"""
+    latency = latency or LatencyTracker(DEFAULT_STAGE_TIMEOUTS)
+    stages = {} if stages is None else stages
+    try:
+        adtransparency_url = f"{base_url}/advertiser/{ar}/creative/{cr}"
+
+        navigation_start = time.perf_counter()
+        driver.get(adtransparency_url)
+        stages['navigation'] = time.perf_counter() - navigation_start
+
+        # Check for rate limiting indicators
+        page_source = driver.page_source.lower()
+        page_title = driver.title.lower()
+
+        # Common rate limiting/blocking indicators
+        rate_limit_indicators = [
+            "rate limit",
+            "too many requests", 
+            "429",
+            "blocked",
+            "captcha",
+            "unusual traffic",
+            "suspicious activity",
+            "access denied",
+            "forbidden",
+            "503 service unavailable",
+            "502 bad gateway",
+            "cloudflare"
+        ]
+
+        # Check if we're being rate limited
+        for indicator in rate_limit_indicators:
+            if indicator in page_source or indicator in page_title:
+                raise ScrapeFailure(RATE_LIMITED, f"RATE LIMITED: Detected '{indicator}' on page for {cr}")
+
+        # Check for empty or error pages
+        if len(page_source) < min_page_chars:  # Suspiciously small page
+            raise ScrapeFailure(NETWORK_ERROR, f"SUSPICIOUS: Very small page response ({len(page_source)} chars) for {cr}")
+
+        # Walk fletch-render -> google ad -> video iframe
+        for stage, selector in IFRAME_CHAIN:
+            stage_start = time.perf_counter()
+            try:
+                iframe = WebDriverWait(driver, latency.timeout(stage), poll_frequency=POLL_FREQUENCY).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+                )
+            except TimeoutException:
+                # No video iframe in the ad frame means no video; a missing
+                # outer frame means the page did not finish in time
+                if stage == 'video':
+                    driver.switch_to.default_content()
+                    return None
+                raise ScrapeFailure(TIMEOUT, f"no {stage} iframe")
+            stages[stage] = time.perf_counter() - stage_start
+            latency.record(stage, stages[stage])
+            if stage != 'video':
+                driver.switch_to.frame(iframe)
+        video_iframe = iframe
+
+        # Get the video iframe source
+        video_iframe_src = video_iframe.get_attribute('src')
+
+        # Switch back to default content
+        driver.switch_to.default_content()
+
+        if video_iframe_src and "youtube.com/embed/" in video_iframe_src:
+            video_id = video_iframe_src.split("youtube.com/embed/")[1].split("?")[0]
+            return video_id
+
+        return None
+
+    except Exception as e:
+        driver.switch_to.default_content()
+        # Re-raise classified so the scheduler can record and retry it
+        if isinstance(e, ScrapeFailure):
+            raise
+        raise ScrapeFailure(classify_selenium_error(e), str(e)) from e
+
+class SeleniumBackend(Backend):
+    """Extraction with the browsers of a BrowserPool, one thread per creative in
+    flight; pool_size should match the scheduler's worker ceiling"""
+    name = 'selenium'
+
+    def __init__(self, base_url=TRANSPARENCY_URL, timings=None, pool_size=3, proxies=None,
+                 firefox_binary=FIREFOX_BINARY, geckodriver=GECKODRIVER, latency=None, min_page_chars=1000):
+        super().__init__(base_url, timings)
+        self.pool_size = pool_size
+        self.proxies = proxies
+        self.firefox_binary = firefox_binary
+        self.geckodriver = geckodriver
+        self.min_page_chars = min_page_chars
+        # Iframe timeouts shared by all threads
+        self.latency = latency or LatencyTracker(DEFAULT_STAGE_TIMEOUTS)
+        self.browser_pool = None
+
+    @classmethod
+    def from_options(cls, options, timings=None):
+        return cls(
+            options.get('base_url', TRANSPARENCY_URL), timings,
+            pool_size=options.get('workers', 3),
+            proxies=options.get('proxies'),
+            firefox_binary=options.get('firefox_binary') or FIREFOX_BINARY,
+            geckodriver=options.get('geckodriver') or GECKODRIVER,
+            min_page_chars=options.get('min_page_chars', 1000),
+        )
+
+    async def start(self):
+        print(f"Creating browser pool with {self.pool_size} firefox browsers...")
+        # The proxies must be known before the pool launches its browsers
+        self.browser_pool = await asyncio.to_thread(
+            BrowserPool, self.pool_size, 'firefox', self.firefox_binary, self.geckodriver, self.proxies)
+
+    async def extract(self, cr, ar):
+        stages = {}
+        try:
+            with self.timings.measure(self.name):
+                video_id = await asyncio.to_thread(self._extract, cr, ar, stages)
+        except ScrapeFailure as e:
+            e.stages = stages
+            raise
+        return self.result(video_id, stages=stages)
+
+    def _extract(self, cr, ar, stages):
+        # Runs in a worker thread
+        try:
+            browser = self.browser_pool.get_browser()
+        except Exception as e:
+            raise ScrapeFailure(classify_selenium_error(e), str(e)) from e
+        try:
+            return extract_video_id_with_selenium(browser, cr, ar, self.base_url, self.latency,
+                                                  self.min_page_chars, stages)
+        finally:
+            self.browser_pool.return_browser(browser)
+
+    async def close(self):
+        if self.browser_pool:
+            await asyncio.to_thread(self.browser_pool.close_all)
+
+    def summary(self):
+        return [f"Final iframe timeouts: {self.latency.summary()}"]
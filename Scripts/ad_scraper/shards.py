@@ -0,0 +1,51 @@
+# Deterministic partition of a creative list into shards, so that independent
+# processes (on one machine or several) can each scrape one shard with their
+# own browser and journal, and the merge of their outputs.
+#
+# A creative's shard depends only on its Creative_ID (the Ad_ID of the
+# bundle): a stable hash of the ID modulo the number of shards. Python's
+# hash() is salted per process and cannot be used. Shards are numbered 1..N.
+
+import hashlib
+import os
+
+from .processed import ProcessedSet
+from .sinks import ResultSink, read_table
+
+def shard_of(cr, num_shards):
+    """Shard (1..num_shards) a creative belongs to"""
+    digest = hashlib.blake2b(cr.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % num_shards + 1
+
+def shard_path(path, shard, num_shards):
+    """Per-shard variant of an output or progress path:
+    video_ids_x.csv -> video_ids_x.shard-3-of-8.csv"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard}-of-{num_shards}{ext}"
+
+def parse_shard(text):
+    # "3/8" -> (3, 8)
+    shard, _, num_shards = text.partition('/')
+    shard, num_shards = int(shard), int(num_shards)
+    if not 1 <= shard <= num_shards:
+        raise ValueError(f"shard {shard} is not between 1 and {num_shards}")
+    return shard, num_shards
+
+def merge_shards(output_file, num_shards):
+    """Combine the outputs of every shard of output_file into it and write its
+    video -> creatives mapping. Returns the sink written, or None (writing
+    nothing) if a shard's output is missing"""
+    shard_files = [shard_path(output_file, shard, num_shards) for shard in range(1, num_shards + 1)]
+    missing = [path for path in shard_files if not os.path.exists(path)]
+    if missing:
+        print(f"Not merging, {len(missing)} of {num_shards} shard outputs are missing: {', '.join(missing)}")
+        return None
+
+    # Streamed; repeated creatives are dropped, remembered compactly
+    seen = ProcessedSet()
+    with ResultSink(output_file) as sink:
+        for path in shard_files:
+            for row in read_table(path):
+                if seen.add((row[0], row[1])):
+                    sink.write(row[0], row[1], row[2])
+    return sink
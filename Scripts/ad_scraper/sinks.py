@@ -0,0 +1,150 @@
+# Where the video IDs found go.
+#
+# ResultSink writes every result to the output file the moment it is found,
+# so the output can be tailed while a run goes on and nothing grows with the
+# length of the run but the count of each distinct video. Next to the output
+# it writes the video -> creatives mapping in long format, one row per
+# creative with the Occurrence of its video (1 for the first creative found
+# using it, 2 for the second, ...), so grouping by Video_ID gives every
+# creative of a video. Both are CSV, or Parquet (written in row groups, so
+# readable only once closed) if the output path ends in .parquet.
+#
+# A resumed run rebuilds both files from the progress journal, which the
+# tracker replays into the sink before any new result arrives.
+
+import csv
+import os
+
+# pyarrow is only needed for Parquet outputs
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+RESULT_COLUMNS = ['Creative_ID', 'Advertiser_ID', 'Video_ID']
+MAPPING_COLUMNS = ['Video_ID', 'Creative_ID', 'Advertiser_ID', 'Occurrence']
+
+def mapping_path(output_file):
+    """Path of the video -> creatives mapping of an output: video_ids_x.csv -> video_ids_x.videos.csv"""
+    root, ext = os.path.splitext(output_file)
+    return f"{root}.videos{ext}"
+
+def is_parquet(path):
+    return path.lower().endswith('.parquet')
+
+class CsvTable:
+    """Rows appended to a CSV file, flushed one by one so readers see them at once"""
+    def __init__(self, path, columns):
+        self.file = open(path, mode='w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetTable:
+    """Rows appended to a Parquet file in row groups of row_group_size. Columns
+    are strings, except Occurrence"""
+    def __init__(self, path, columns, row_group_size=10000):
+        if pa is None:
+            raise ImportError("Parquet outputs require pyarrow (pip install pyarrow)")
+        self.columns = columns
+        self.schema = pa.schema([(column, pa.int64() if column == 'Occurrence' else pa.string())
+                                 for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            columns = {column: [row[i] for row in self.rows] for i, column in enumerate(self.columns)}
+            self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+def open_table(path, columns):
+    """Table writer for path, Parquet or CSV by its extension"""
+    return ParquetTable(path, columns) if is_parquet(path) else CsvTable(path, columns)
+
+def read_table(path):
+    """Rows (lists) of a table written by open_table, without the header"""
+    if is_parquet(path):
+        if pa is None:
+            raise ImportError("Parquet outputs require pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+        return
+    with open(path, mode='r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip header row
+        yield from reader
+
+class Sink:
+    """Receives the videos found, in the order they are found, and counts
+    them and how many creatives use each video"""
+    def __init__(self):
+        self.count = 0
+        self.video_counts = {}  # video_id -> creatives found using it so far
+
+    @property
+    def unique_videos(self):
+        return len(self.video_counts)
+
+    def write(self, cr, ar, video_id):
+        occurrence = self.video_counts.get(video_id, 0) + 1
+        self.video_counts[video_id] = occurrence
+        self.count += 1
+        self._write(cr, ar, video_id, occurrence)
+
+    def _write(self, cr, ar, video_id, occurrence):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ResultList(Sink):
+    """Keeps the results in memory as {'cr', 'ar', 'video_id'} dicts; for short
+    runs such as backend comparisons"""
+    def __init__(self):
+        super().__init__()
+        self.results = []
+
+    def _write(self, cr, ar, video_id, occurrence):
+        self.results.append({'cr': cr, 'ar': ar, 'video_id': video_id})
+
+class ResultSink(Sink):
+    """Writes results to output_file, and the video -> creatives mapping to
+    mapping_file (next to it by default), as they arrive"""
+    def __init__(self, output_file, mapping_file=None):
+        super().__init__()
+        self.output_file = output_file
+        self.mapping_file = mapping_file or mapping_path(output_file)
+        self.results = open_table(output_file, RESULT_COLUMNS)
+        self.mapping = open_table(self.mapping_file, MAPPING_COLUMNS)
+
+    def _write(self, cr, ar, video_id, occurrence):
+        self.results.write([cr, ar, video_id])
+        self.mapping.write([video_id, cr, ar, occurrence])
+
+    def close(self):
+        self.results.close()
+        self.mapping.close()
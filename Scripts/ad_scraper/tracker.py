@@ -0,0 +1,305 @@
+# Journal of the creatives a scraping run has processed, shared by every backend.
+
+import collections
+import itertools
+import json
+import os
+import threading
+import time
+
+from .common import MAX_ATTEMPTS, NOT_VIDEO, TRANSIENT_OUTCOMES, VIDEO
+from .processed import ProcessedSet
+from .sinks import ResultList
+
+REPLAY_CHUNK = 65536
+
+class ProgressTracker:
+    """Tracks processed URLs and results in an append-only journal.
+
+    Every result is one JSON line appended to <progress file>.jsonl, so saving
+    never rewrites earlier results and a crash can at worst leave a torn last
+    line, which is dropped on the next start. The journal is replayed on
+    startup and compacted when it holds damaged lines, or compact_ratio times
+    the lines (at least min_compact_lines) a compacted journal would have.
+
+    The processed (cr, ar) pairs are held in a ProcessedSet. Compaction
+    writes them to a binary snapshot, <progress file>.processed, and keeps
+    only the lines the snapshot cannot stand for in the journal: the videos
+    found, the failures and any pair with unusual IDs. A resume loads the
+    snapshot and replays just those lines and the ones appended since.
+
+    The videos found are not kept but written to sink (see sinks.py) as they
+    are recorded, those of the journal first, while it is replayed on startup.
+    The default sink keeps them in a list.
+
+    Lines also carry the outcome of the attempt and how many attempts the URL
+    has had. A transient failure leaves the URL unprocessed until it has had
+    max_attempts, so a resumed run retries it instead of losing it.
+
+    record_outcome only records the result in memory; the lines are written by
+    save_progress, which is due every checkpoint_every results or every
+    checkpoint_seconds, whichever comes first. That bounds the work lost on
+    an interruption and lets the caller do the disk I/O off the event loop."""
+    def __init__(self, progress_file, compact_ratio=2.0, checkpoint_every=50, checkpoint_seconds=30,
+                 max_attempts=MAX_ATTEMPTS, min_compact_lines=10000, sink=None):
+        self.progress_file = progress_file
+        self.journal_file = os.path.splitext(progress_file)[0] + '.jsonl'
+        self.snapshot_file = os.path.splitext(progress_file)[0] + '.processed'
+        self.compact_ratio = compact_ratio
+        self.min_compact_lines = min_compact_lines
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.max_attempts = max_attempts
+        self.sink = sink if sink is not None else ResultList()
+        self.processed_urls = ProcessedSet()
+        self.videos = 0  # Processed URLs with a video
+        self.failures = {}  # url_key -> (attempts, last outcome) of URLs still to retry
+        self.outcome_counts = collections.Counter()  # Outcomes recorded in this run
+        self.pending = []
+        self.last_checkpoint = time.monotonic()
+        self.journal_lines = 0
+        self.journal = None
+        # _lock guards the in-memory state, _save_lock serializes journal writes
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.load_progress()
+        self.journal = open(self.journal_file, 'a', encoding='utf-8')
+
+    def load_progress(self):
+        """Replay the journal, or import a progress file written by an older version"""
+        if os.path.exists(self.journal_file):
+            damaged = self._replay_journal(self._load_snapshot())
+        else:
+            if os.path.exists(self.snapshot_file):
+                # Left from a run whose journal was removed; the pairs in it
+                # must not count as processed in this one
+                os.remove(self.snapshot_file)
+            if not os.path.exists(self.progress_file) or not self._import_progress_file():
+                return
+            damaged = self._replay_journal()
+
+        if damaged:
+            self.compact()
+        print(f"Resumed: {len(self.processed_urls)} URLs already processed, {len(self.failures)} to retry")
+
+    def _import_progress_file(self):
+        # Write the progress file of an older version as a journal; returns False if it is unreadable
+        try:
+            with open(self.progress_file, 'r') as f:
+                data = json.load(f)
+            found = {f"{r['cr']}_{r['ar']}": r['video_id'] for r in data.get('results', [])}
+            lines = []
+            for url_key in data.get('processed_urls', []):
+                cr, _, ar = url_key.partition('_')
+                lines.append(json.dumps({'cr': cr, 'ar': ar, 'video_id': found.get(url_key)}) + '\n')
+        except:
+            print("Starting fresh (couldn't load progress file)")
+            return False
+        with open(self.journal_file, 'w', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        return True
+
+    def _load_snapshot(self):
+        # Load the processed pairs of the last compaction; returns True if there were any
+        if not os.path.exists(self.snapshot_file):
+            return False
+        try:
+            self.processed_urls = ProcessedSet.load(self.snapshot_file)
+        except (OSError, ValueError) as e:
+            # Only costs a rescrape of the creatives without a video
+            print(f"Ignoring the processed-pairs snapshot ({e})")
+            return False
+        return True
+
+    def _replay_journal(self, from_snapshot=False):
+        # Apply every journal line; returns True if any line was damaged. With
+        # a snapshot loaded, the lines of videos whose pair it holds are the
+        # results the compaction kept, and only those go to the sink. Lines
+        # are applied REPLAY_CHUNK at a time, see _apply_many
+        damaged = False
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            while True:
+                lines = list(itertools.islice(f, REPLAY_CHUNK))
+                if not lines:
+                    break
+                self.journal_lines += len(lines)
+                try:
+                    # All the lines in one go, unless one of them is damaged
+                    parsed = json.loads('[' + ','.join(lines) + ']')
+                except ValueError:
+                    parsed = []
+                    for line in lines:
+                        try:
+                            parsed.append(json.loads(line))
+                        except ValueError:
+                            # A torn write from a crash, normally only on the last line
+                            damaged = True
+                records = [record for record in parsed
+                           if type(record) is dict and 'cr' in record and 'ar' in record and 'video_id' in record]
+                damaged = damaged or len(records) < len(parsed)
+                self._apply_many(records, from_snapshot)
+        return damaged
+
+    def _apply_many(self, records, from_snapshot=False):
+        # _apply for each of a run of journal records, in order, with one
+        # lookup of the pairs of the transient ones and one add_many of the
+        # others instead of a lookup or add per line
+        pairs = [(record['cr'], record['ar']) for record in records]
+        transient = [record.get('outcome') in TRANSIENT_OUTCOMES and record.get('attempts', 1) < self.max_attempts
+                     for record in records]
+        if any(transient):
+            was_processed = iter(self.processed_urls.contains_many(itertools.compress(pairs, transient)))
+            added = iter(self.processed_urls.add_many(
+                itertools.compress(pairs, [not retry for retry in transient])))
+            done = set()  # Pairs final earlier in the run
+        else:
+            transient = itertools.repeat(False)
+            added = iter(self.processed_urls.add_many(pairs))
+            done = None
+        for record, pair, retry in zip(records, pairs, transient):
+            if retry:
+                if not (next(was_processed) or pair in done):
+                    self.failures[f"{pair[0]}_{pair[1]}"] = (record.get('attempts', 1), record['outcome'])
+                continue
+            if done is not None:
+                done.add(pair)
+            if next(added):
+                if self.failures:
+                    self.failures.pop(f"{pair[0]}_{pair[1]}", None)
+            elif not (from_snapshot and record['video_id']):
+                continue
+            if record['video_id']:
+                self.videos += 1
+                self.sink.write(pair[0], pair[1], record['video_id'])
+
+    def _apply(self, cr, ar, video_id, outcome=None, attempts=1):
+        # Record a result in memory; returns False if the URL was already processed.
+        # Lines without an outcome (older journals) are final
+        if outcome in TRANSIENT_OUTCOMES and attempts < self.max_attempts:
+            if (cr, ar) in self.processed_urls:
+                return False
+            self.failures[f"{cr}_{ar}"] = (attempts, outcome)
+            return True
+        if not self.processed_urls.add((cr, ar)):
+            return False
+        if self.failures:
+            self.failures.pop(f"{cr}_{ar}", None)
+        if video_id:
+            self.videos += 1
+            self.sink.write(cr, ar, video_id)
+        return True
+
+    def compact(self):
+        """Atomically rewrite the journal with a line per video found, per failed
+        URL and per processed URL the snapshot cannot hold, then the snapshot"""
+        with self._save_lock:
+            # Snapshot the state; the video lines are copied from the journal,
+            # so pending lines are written to it first
+            with self._lock:
+                pending, self.pending = self.pending, []
+                processed_urls = self.processed_urls.copy()
+                failures = list(self.failures.items())
+                self.last_checkpoint = time.monotonic()
+
+            if self.journal:
+                self.journal.write(''.join(pending))
+                self.journal.close()
+
+            other = processed_urls.other
+            found_other = set()
+            videos = 0
+            temp_file = self.journal_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f, \
+                    open(self.journal_file, 'r', encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                        cr, ar, video_id = record['cr'], record['ar'], record['video_id']
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if video_id:
+                        f.write(json.dumps({'cr': cr, 'ar': ar, 'video_id': video_id}) + '\n')
+                        videos += 1
+                        if (cr, ar) in other:
+                            found_other.add((cr, ar))
+                unusual = [pair for pair in other if pair not in found_other]
+                for cr, ar in unusual:
+                    f.write(json.dumps({'cr': cr, 'ar': ar, 'video_id': None}) + '\n')
+                for url_key, (attempts, outcome) in failures:
+                    cr, _, ar = url_key.partition('_')
+                    f.write(json.dumps({'cr': cr, 'ar': ar, 'video_id': None,
+                                        'outcome': outcome, 'attempts': attempts}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            # The journal goes first: a snapshot older than the journal only
+            # misses pairs, while a newer one could hide results not yet written
+            os.replace(temp_file, self.journal_file)
+            processed_urls.save(self.snapshot_file)
+            self.journal_lines = videos + len(unusual) + len(failures)
+
+            if self.journal:
+                self.journal = open(self.journal_file, 'a', encoding='utf-8')
+
+    def checkpoint_due(self):
+        """True when checkpoint_every results or checkpoint_seconds have passed since the last save"""
+        with self._lock:
+            if not self.pending:
+                return False
+            return (len(self.pending) >= self.checkpoint_every
+                    or time.monotonic() - self.last_checkpoint >= self.checkpoint_seconds)
+
+    def save_progress(self):
+        """Write pending results to the journal and make them durable, compacting
+        if worthwhile. Blocking; safe to call from a worker thread"""
+        with self._save_lock:
+            with self._lock:
+                pending, self.pending = self.pending, []
+                self.last_checkpoint = time.monotonic()
+            if pending:
+                self.journal.write(''.join(pending))
+                self.journal_lines += len(pending)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+        if self.journal_lines > self.compact_ratio * max(self._compacted_lines(), self.min_compact_lines):
+            self.compact()
+
+    def _compacted_lines(self):
+        # Lines a compacted journal would have
+        return self.videos + len(self.processed_urls.other) + len(self.failures)
+
+    def close(self):
+        """Save and close the journal"""
+        self.save_progress()
+        self.journal.close()
+
+    def record_outcome(self, cr, ar, outcome, video_id=None):
+        """Record one attempt at a URL; written at the next checkpoint. Returns
+        True if the URL is now processed, False if it is worth retrying"""
+        with self._lock:
+            url_key = f"{cr}_{ar}"
+            attempts = self.failures.get(url_key, (0, None))[0] + 1
+            self.outcome_counts[outcome] += 1
+            if self._apply(cr, ar, video_id, outcome, attempts):
+                self.pending.append(json.dumps({'cr': cr, 'ar': ar, 'video_id': video_id,
+                                                'outcome': outcome, 'attempts': attempts}) + '\n')
+            return (cr, ar) in self.processed_urls
+
+    def add_result(self, cr, ar, video_id):
+        """Add a final result and mark URL as processed"""
+        self.record_outcome(cr, ar, VIDEO if video_id else NOT_VIDEO, video_id)
+
+    def attempts(self, cr, ar):
+        """Failed attempts so far of a URL that is still to be retried"""
+        return self.failures.get(f"{cr}_{ar}", (0, None))[0]
+
+    def is_processed(self, cr, ar):
+        """Check if URL was already processed"""
+        return (cr, ar) in self.processed_urls
+
+    def unprocessed(self, urls):
+        """The (cr, ar) pairs of urls not processed yet, in order; one lookup
+        of them all, much faster than is_processed on each of a long list"""
+        urls = list(urls)
+        with self._lock:
+            processed = self.processed_urls.contains_many(urls)
+        return [url for url, done in zip(urls, processed) if not done]
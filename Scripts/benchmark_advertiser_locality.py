@@ -0,0 +1,108 @@
+# Benchmark of the advertiser-locality mode of the ad_scraper scheduler.
+#
+# Scrapes the same synthetic workload from mock_transparency_server.py with
+# each backend twice, from a fresh journal and a fresh mock: once in input
+# order (the creatives of 50 advertisers shuffled together, like a slice of
+# the transparency reports) and once grouped by advertiser, each group kept on
+# one worker (--order advertiser). The mock charges a creative of an
+# advertiser that is not among the last few its client session loaded an
+# extra ADVERTISER_LATENCY, standing in for the advertiser-level state a real
+# site and browser keep warm. That cost is a model written for this
+# benchmark, not measured on the real site, so the gain shown is only as
+# real as the model; and grouping does not make the slowest creatives any
+# faster, since the p95 is set by slow pages and by the first, cold creative
+# of every group. Reports wall time, the p50/p95 seconds per creative, the
+# share of creatives whose advertiser was cold, whether every video ID was
+# found, and how the advertiser order compares with the input order,
+# including whether both found the same video IDs. The playwright backend
+# needs WebKit installed (playwright install webkit) and is skipped without
+# it.
+#
+# Usage: python benchmark_advertiser_locality.py [number_of_creatives] [backend ...]
+#        e.g. python benchmark_advertiser_locality.py 400 http playwright
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from ad_scraper import Metrics, ProgressTracker, StageTimings, make_backend, scrape_all
+from ad_scraper.sinks import ResultList
+from mock_transparency_server import MockTransparencyServer, make_creatives
+
+DEFAULT_BACKENDS = ['http', 'playwright']
+WORKERS = 7
+GROUP_SIZE = 50
+ORDERS = {'input': None, 'advertiser': GROUP_SIZE}
+ADVERTISER_LATENCY = 0.3
+WARM_ADVERTISERS = 8
+# Fine buckets, so the interpolated p50/p95 are within 10ms
+LATENCY_BUCKETS = tuple(round(0.01 * i, 2) for i in range(1, 1001)) + (20.0, 30.0, 60.0)
+
+async def scrape(backend, urls, progress_tracker, metrics, group_size):
+    await backend.start()
+    try:
+        await scrape_all(backend, urls, progress_tracker, WORKERS, metrics=metrics, group_size=group_size)
+    finally:
+        await backend.close()
+
+def run(spec, urls, group_size, work_dir):
+    with MockTransparencyServer(advertiser_latency=ADVERTISER_LATENCY, warm_advertisers=WARM_ADVERTISERS) as mock:
+        options = {
+            'base_url': mock.base_url,
+            'workers': WORKERS,
+            # The mock site is served from 127.0.0.1; its "third-party" host is localhost
+            'allow_hosts': ['127.0.0.1'],
+            # Mock pages are far smaller than real ones
+            'min_page_chars': 0,
+        }
+        progress_tracker = ProgressTracker(os.path.join(work_dir, f"progress_{spec}_{group_size}.jsonl"),
+                                           sink=ResultList())
+        backend = make_backend(spec, options, StageTimings())
+        metrics = Metrics(buckets=LATENCY_BUCKETS)
+        start_time = time.time()
+        try:
+            # The scraper logs every URL; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(scrape(backend, urls, progress_tracker, metrics, group_size))
+        finally:
+            progress_tracker.close()
+        elapsed = time.time() - start_time
+        expected = {cr: video_id for cr, video_id in mock.expected_results(urls).items() if video_id}
+        found = {result['cr']: result['video_id'] for result in progress_tracker.sink.results}
+        cold_share = mock.cold_loads / max(mock.cold_loads + mock.warm_loads, 1)
+    return elapsed, metrics.report()['stages'].get('total', {}), cold_share, found, expected
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    specs = sys.argv[2:] or DEFAULT_BACKENDS
+    urls = make_creatives(count)
+
+    print(f"{count} creatives of 50 advertisers, {WORKERS} workers, {ADVERTISER_LATENCY}s extra for a cold "
+          f"advertiser, {WARM_ADVERTISERS} advertisers kept warm per session (the mock's model, not the real site)")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for spec in specs:
+            runs = {}
+            for order, group_size in ORDERS.items():
+                try:
+                    elapsed, total, cold_share, found, expected = run(spec, urls, group_size, work_dir)
+                except Exception as e:
+                    print(f"{spec:>12} {order:>10} order: skipped ({type(e).__name__}: {str(e).splitlines()[0]})")
+                    break
+                runs[order] = elapsed, total, found
+                print(f"{spec:>12} {order:>10} order: {elapsed:.1f}s, {count / elapsed:.2f} URLs/sec, "
+                      f"p50 {total.get('p50', 0):.2f}s p95 {total.get('p95', 0):.2f}s per creative, "
+                      f"{cold_share * 100:.0f}% cold advertisers, "
+                      f"results {'match' if found == expected else 'DO NOT match'} the mock")
+            if len(runs) == len(ORDERS):
+                (input_elapsed, input_total, input_found), (elapsed, total, found) = runs['input'], runs['advertiser']
+                print(f"{spec:>12} advertiser vs input order: wall time x{elapsed / input_elapsed:.2f}, "
+                      f"p50 x{total.get('p50', 0) / max(input_total.get('p50', 0), 1e-9):.2f}, "
+                      f"p95 x{total.get('p95', 0) / max(input_total.get('p95', 0), 1e-9):.2f}; "
+                      f"video IDs {'the same' if found == input_found else 'DIFFERENT'} in both orders")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Benchmark for the Playwright scraper's scheduler.
+#
+# Runs the same synthetic workload against mock_transparency_server.py five
+# times: with the previous lock-step scheduling (batches of 8 URLs, 7 batches at
+# a time, each group waiting for its slowest batch, a new page for every URL),
+# with the shared queue of long-lived workers of ad_scraper.scrape_all at the
+# same number of pages in flight, first still opening a new page per URL and then reusing the warm
+# pages of a PagePool, then the same without request blocking, and finally
+# with the queue trying the direct HTTP path before using a page. Reports wall
+# time, throughput, the time spent setting up contexts and pages, the bytes a
+# page transfers per creative, and whether every video ID was found.
+#
+# Usage: python benchmark_playwright_scheduler.py [number_of_creatives]
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from playwright.async_api import async_playwright
+
+from ad_scraper import ChainBackend, LatencyTracker, ProgressTracker, StageTimings, process_url, scrape_all
+from ad_scraper.http_backend import HttpBackend, create_http_client
+from ad_scraper.playwright_backend import (
+    ALLOWED_HOSTS,
+    DEFAULT_STAGE_TIMEOUTS,
+    PagePool,
+    PlaywrightBackend,
+    RequestFilter,
+    create_webkit_browser,
+)
+from mock_transparency_server import MockTransparencyServer, make_creatives
+
+BATCH_SIZE = 8
+CONCURRENCY = 7
+
+# The mock site is served from 127.0.0.1; its "third-party" host is localhost
+MOCK_FILTER = RequestFilter(ALLOWED_HOSTS + ('127.0.0.1',))
+
+class AllowAllFilter(RequestFilter):
+    """No request blocking"""
+    def allows(self, request):
+        return True
+
+class FreshPagePool(PagePool):
+    """The previous page handling: a new page for every URL"""
+    async def release(self, page):
+        await self._close_page(page)
+
+async def run_lockstep(browser, http_client, urls, progress_tracker, base_url, timings):
+    # The scheduling used before scrape_all: groups of CONCURRENCY batches run
+    # together, URLs inside a batch run one after another in one context
+    batches = [urls[i:i + BATCH_SIZE] for i in range(0, len(urls), BATCH_SIZE)]
+    latency = LatencyTracker(DEFAULT_STAGE_TIMEOUTS)
+
+    async def run_batch(batch, batch_id):
+        page_pool = FreshPagePool(browser, timings=timings, request_filter=MOCK_FILTER)
+        backend = PlaywrightBackend(base_url, timings, latency=latency, browser=browser, page_pool=page_pool)
+        try:
+            for cr, ar in batch:
+                await process_url(backend, cr, ar, batch_id, progress_tracker)
+        finally:
+            await backend.close()
+
+    for i in range(0, len(batches), CONCURRENCY):
+        group = batches[i:i + CONCURRENCY]
+        await asyncio.gather(*(run_batch(batch, i + j + 1) for j, batch in enumerate(group)))
+
+async def run_with(backend, urls, progress_tracker):
+    await backend.start()
+    try:
+        await scrape_all(backend, urls, progress_tracker, CONCURRENCY)
+    finally:
+        await backend.close()
+
+async def run_queue_fresh_pages(browser, http_client, urls, progress_tracker, base_url, timings):
+    page_pool = FreshPagePool(browser, timings=timings, request_filter=MOCK_FILTER)
+    await run_with(PlaywrightBackend(base_url, timings, browser=browser, page_pool=page_pool), urls, progress_tracker)
+
+async def run_queue(browser, http_client, urls, progress_tracker, base_url, timings):
+    backend = PlaywrightBackend(base_url, timings, request_filter=MOCK_FILTER, browser=browser)
+    await run_with(backend, urls, progress_tracker)
+
+async def run_queue_unfiltered(browser, http_client, urls, progress_tracker, base_url, timings):
+    backend = PlaywrightBackend(base_url, timings, request_filter=AllowAllFilter(), browser=browser)
+    await run_with(backend, urls, progress_tracker)
+
+async def run_queue_http(browser, http_client, urls, progress_tracker, base_url, timings):
+    backend = ChainBackend([
+        HttpBackend(base_url, timings, client=http_client),
+        PlaywrightBackend(base_url, timings, request_filter=MOCK_FILTER, browser=browser),
+    ])
+    await run_with(backend, urls, progress_tracker)
+
+async def benchmark(scheduler, urls, mock, work_dir):
+    progress_tracker = ProgressTracker(os.path.join(work_dir, f"progress_{scheduler.__name__}.json"))
+    timings = StageTimings()
+    async with async_playwright() as playwright:
+        browser = await create_webkit_browser(playwright)
+        http_client = await create_http_client(playwright, mock.base_url)
+        try:
+            start_time = time.time()
+            # The scraper logs every URL; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                await scheduler(browser, http_client, urls, progress_tracker, mock.base_url, timings)
+            elapsed = time.time() - start_time
+        finally:
+            await http_client.dispose()
+            await browser.close()
+
+    expected = {cr: video_id for cr, video_id in mock.expected_results(urls).items() if video_id}
+    found = {result['cr']: result['video_id'] for result in progress_tracker.sink.results}
+    setup = sum(timings.totals.get(stage, 0.0) for stage in ('context_setup', 'page_setup'))
+    return elapsed, setup, timings.bytes_per_call('playwright'), found == expected
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    urls = make_creatives(count)
+
+    with MockTransparencyServer() as mock, tempfile.TemporaryDirectory() as work_dir:
+        print(f"{count} creatives against {mock.base_url}, {CONCURRENCY} pages in flight")
+        for scheduler in (run_lockstep, run_queue_fresh_pages, run_queue, run_queue_unfiltered, run_queue_http):
+            elapsed, setup, page_bytes, correct = asyncio.run(benchmark(scheduler, urls, mock, work_dir))
+            print(f"{scheduler.__name__:>21}: {elapsed:.1f}s, {count / elapsed:.2f} URLs/sec, "
+                  f"{setup:.2f}s page/context setup, {page_bytes / 1024:.1f} KB per page load, "
+                  f"results {'match' if correct else 'DO NOT match'} the mock")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Benchmark for the processed-pairs set of the ad_scraper progress journal.
+#
+# Builds the set of processed (Creative ID, Advertiser ID) pairs of a large
+# synthetic run twice, as the Python set of "CR..._AR..." strings the tracker
+# used to keep and as an ad_scraper.processed.ProcessedSet, and reports the
+# memory each takes (traced allocations; the ProcessedSet as loaded from its
+# snapshot, which is how a resumed run holds it) and the cost of a lookup,
+# one at a time and, for the ProcessedSet, in one contains_many call as the
+# scheduler does for its input. Then writes the journal such a run leaves
+# behind and times a resume from it, before and after a compaction has
+# written the binary snapshot; only the lines of the videos found are
+# replayed after one, so the gain depends on the share of creatives with a
+# video. At 5M creatives with 20% videos the memory drops about tenfold but
+# the snapshot resume only 3-4 times, and a resume from the full journal
+# (a run that never compacted) is slower than with the set of strings.
+#
+# Usage: python benchmark_processed_set.py [number_of_creatives] [video_share]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from ad_scraper.processed import ProcessedSet
+from ad_scraper.tracker import ProgressTracker
+
+def synthetic_pairs(num_pairs, num_advertisers=10**4, seed=0):
+    # Unique creatives spread over as many advertisers as benchmark_creative_filter.py uses
+    rng = random.Random(seed)
+    creatives = set()
+    while len(creatives) < num_pairs:
+        creatives.add(rng.randrange(10**20))
+    return [(f"CR{cr:020d}", f"AR{rng.randrange(num_advertisers):020d}") for cr in creatives]
+
+def traced_size(build):
+    # Bytes still allocated by what build() returns
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+def lookup_sample(pairs, num_lookups=200_000):
+    # Half stored pairs, half (almost surely) absent ones
+    rng = random.Random(1)
+    sample = [rng.choice(pairs) for _ in range(num_lookups // 2)]
+    return sample + [(f"CR{rng.randrange(10**20):020d}", ar) for _, ar in sample]
+
+def time_lookups(contains, pairs):
+    sample = lookup_sample(pairs)
+    start_time = time.perf_counter()
+    found = sum(contains(pair) for pair in sample)
+    return (time.perf_counter() - start_time) / len(sample), found
+
+def time_batch_lookup(contains_many, pairs):
+    sample = lookup_sample(pairs)
+    start_time = time.perf_counter()
+    found = sum(contains_many(sample))
+    return (time.perf_counter() - start_time) / len(sample), found
+
+def write_journal(journal_file, pairs, video_share, seed=0):
+    # One final line per pair, as a run without retries leaves it
+    rng = random.Random(seed)
+    with open(journal_file, 'w', encoding='utf-8') as f:
+        for i, (cr, ar) in enumerate(pairs):
+            video_id = f"v{i:010d}" if rng.random() < video_share else None
+            f.write(json.dumps({'cr': cr, 'ar': ar, 'video_id': video_id,
+                                'outcome': 'video' if video_id else 'not_video', 'attempts': 1}) + '\n')
+
+def replay_into_string_set(journal_file):
+    # The resume of the old tracker: every line into a set of strings
+    processed_urls = set()
+    results = []
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            url_key = f"{record['cr']}_{record['ar']}"
+            if url_key not in processed_urls:
+                processed_urls.add(url_key)
+                if record['video_id']:
+                    results.append(record)
+    return processed_urls, results
+
+def main():
+    num_pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    video_share = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+
+    print(f"Generating {num_pairs} synthetic creatives...")
+    pairs = synthetic_pairs(num_pairs)
+
+    strings, string_bytes = traced_size(lambda: {f"{cr}_{ar}" for cr, ar in pairs})
+    per_lookup, _ = time_lookups(lambda pair: f"{pair[0]}_{pair[1]}" in strings, pairs)
+    print(f"  set of strings: {string_bytes / 1e6:.1f} MB ({string_bytes / num_pairs:.0f} B per pair), "
+          f"{per_lookup * 1e6:.2f} us per lookup")
+    del strings
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        start_time = time.perf_counter()
+        processed = ProcessedSet()
+        for pair in pairs:
+            processed.add(pair)
+        processed.merge()
+        built = time.perf_counter() - start_time
+        processed.save(os.path.join(work_dir, 'snapshot'))
+        del processed
+        processed, compact_bytes = traced_size(lambda: ProcessedSet.load(os.path.join(work_dir, 'snapshot')))
+        per_lookup, found = time_lookups(processed.__contains__, pairs)
+        per_batch_lookup, found_in_batch = time_batch_lookup(processed.contains_many, pairs)
+        print(f"   ProcessedSet: {compact_bytes / 1e6:.1f} MB ({compact_bytes / num_pairs:.0f} B per pair), "
+              f"{per_lookup * 1e6:.2f} us per lookup, {per_batch_lookup * 1e6:.2f} us per pair looked up "
+              f"with contains_many, built pair by pair in {built:.1f}s")
+        if found != 100_000 or found_in_batch != 100_000:
+            print("WARNING: lookups of the stored pairs failed")
+        print(f"  memory: {string_bytes / compact_bytes:.1f}x smaller")
+        del processed
+
+        progress_file = os.path.join(work_dir, 'progress.json')
+        write_journal(os.path.join(work_dir, 'progress.jsonl'), pairs, video_share)
+        print(f"Journal: {num_pairs} lines, {video_share:.0%} videos")
+
+        start_time = time.perf_counter()
+        _, results = replay_into_string_set(os.path.join(work_dir, 'progress.jsonl'))
+        baseline = time.perf_counter() - start_time
+        print(f"  resume into a set of strings: {baseline:.1f}s")
+
+        start_time = time.perf_counter()
+        tracker = ProgressTracker(progress_file)
+        resumed = time.perf_counter() - start_time
+        print(f"  resume from the full journal: {resumed:.1f}s ({baseline / resumed:.1f}x the speed of the set of strings)")
+        start_time = time.perf_counter()
+        tracker.compact()
+        tracker.close()
+        print(f"  compaction: {time.perf_counter() - start_time:.1f}s, snapshot "
+              f"{os.path.getsize(os.path.join(work_dir, 'progress.processed')) / 1e6:.1f} MB")
+
+        start_time = time.perf_counter()
+        tracker = ProgressTracker(progress_file)
+        resumed = time.perf_counter() - start_time
+        tracker.close()
+        print(f"  resume from the snapshot: {resumed:.1f}s ({baseline / resumed:.1f}x the speed of the set of strings)")
+        if len(tracker.processed_urls) != num_pairs or tracker.videos != len(results):
+            print("WARNING: the resumed tracker does not match the journal")
+
+if __name__ == "__main__":
+    main()
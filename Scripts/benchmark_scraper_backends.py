@@ -0,0 +1,51 @@
+# Head-to-head benchmark of the scraper backends of the ad_scraper package.
+#
+# Every backend scrapes the same synthetic workload from
+# mock_transparency_server.py under the same scheduler, from a fresh journal,
+# with the same ceiling on creatives in flight. Reports wall time, throughput,
+# the bytes a backend transfers per creative where it measures them, and
+# whether every video ID was found. Selenium is only included when asked for,
+# since it needs Firefox and geckodriver (found on the PATH, or give their
+# paths in the FIREFOX_BINARY and GECKODRIVER environment variables).
+#
+# Usage: python benchmark_scraper_backends.py [number_of_creatives] [backend ...]
+#        e.g. python benchmark_scraper_backends.py 300 http playwright http+playwright selenium
+
+import os
+import sys
+
+from ad_scraper.cli import compare_backends
+from mock_transparency_server import MockTransparencyServer, make_creatives
+
+DEFAULT_BACKENDS = ['http', 'playwright', 'http+playwright']
+WORKERS = 7
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    specs = sys.argv[2:] or DEFAULT_BACKENDS
+    urls = make_creatives(count)
+
+    with MockTransparencyServer() as mock:
+        options = {
+            'base_url': mock.base_url,
+            'workers': WORKERS,
+            # The mock site is served from 127.0.0.1; its "third-party" host is localhost
+            'allow_hosts': ['127.0.0.1'],
+            # Mock pages are far smaller than real ones
+            'min_page_chars': 0,
+            'firefox_binary': os.environ.get('FIREFOX_BINARY'),
+            'geckodriver': os.environ.get('GECKODRIVER'),
+        }
+        print(f"{count} creatives against {mock.base_url}, up to {WORKERS} in flight")
+        expected = {cr: video_id for cr, video_id in mock.expected_results(urls).items() if video_id}
+        for run in compare_backends(specs, urls, options, initial_concurrency=WORKERS):
+            seconds = run['seconds']
+            timings = run['backend'].timings
+            page_bytes = ''.join(f", {timings.bytes_per_call(stage) / 1024:.1f} KB per {stage} load"
+                                 for stage in timings.bytes)
+            print(f"{run['backend'].name:>16}: {seconds:.1f}s, {count / seconds:.2f} URLs/sec{page_bytes}, "
+                  f"{len(run['found'])}/{len(expected)} videos, "
+                  f"results {'match' if run['found'] == expected else 'DO NOT match'} the mock")
+
+if __name__ == "__main__":
+    main()
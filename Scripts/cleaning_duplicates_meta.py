@@ -25,16 +25,311 @@
 #                                    \\
 #   
 
+import argparse
+import bisect
+import glob
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import compress
+
 import pandas as pd
 
-# ask for the file path
-file_name = input("Enter the path to the CSV file: ")
+# ad_creative_bodies is the 7th column (0-based) of the Meta ad library export
+BODY_COLUMN = 7
+
+def dedup_in_memory(file_name, output_file='cleaned_meta.csv'):
+    # Load the whole export and drop duplicates in the 7th column
+    data = pd.read_csv(file_name)
+    cleaned_data = data.drop_duplicates(subset=data.columns[BODY_COLUMN])
+    cleaned_data.to_csv(output_file, index=False)
+    return len(data), len(cleaned_data)
+
+def body_digest(body):
+    # 128-bit digest of a creative body; only these are kept in memory
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=16).digest()
+
+def read_chunks(file_name, chunksize):
+    # Every field is read as text so rows are written back exactly as they
+    # were read, and missing bodies compare equal to each other as in pandas
+    return pd.read_csv(file_name, dtype=str, keep_default_na=False, chunksize=chunksize)
+
+def first_seen(bodies, seen):
+    # Boolean mask of the bodies whose digest is not in seen yet; adds them
+    return new_digests([body_digest(body) for body in bodies], seen)
+
+def new_digests(digests, seen):
+    # Boolean mask of the digests not in seen yet (only the first of repeats);
+    # adds them. An index is queried a batch at a time rather than per digest
+    if isinstance(seen, SeenBodyIndex):
+        return seen.add_new(digests)
+    keep = []
+    for digest in digests:
+        if digest in seen:
+            keep.append(False)
+        else:
+            seen.add(digest)
+            keep.append(True)
+    return keep
+
+# Digests looked up and inserted per SQLite statement; below the default limit
+# on the number of parameters of a statement in older SQLite versions (999)
+INDEX_BATCH = 500
+
+class SeenBodyIndex:
+    """Persistent set of the body digests seen by earlier runs, stored in SQLite.
+    Can be passed as `seen` to the stream and parallel modes so that only bodies
+    never seen before are written. Digests added during a run are committed
+    when it finishes successfully and discarded if it fails."""
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS seen (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.connection.commit()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+        self.connection.close()
+    
+    def __contains__(self, digest):
+        return self.connection.execute("SELECT 1 FROM seen WHERE digest = ?", (digest,)).fetchone() is not None
+    
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+    
+    def add(self, digest):
+        self.connection.execute("INSERT OR IGNORE INTO seen (digest) VALUES (?)", (digest,))
+    
+    def add_new(self, digests):
+        """[digest not in self for digest in digests], adding each one, with one
+        SELECT and one INSERT per INDEX_BATCH digests"""
+        keep = []
+        for start in range(0, len(digests), INDEX_BATCH):
+            batch = digests[start:start + INDEX_BATCH]
+            unique = list(set(batch))
+            placeholders = ','.join('?' * len(unique))
+            known = {row[0] for row in self.connection.execute(
+                f"SELECT digest FROM seen WHERE digest IN ({placeholders})", unique)}
+            new = []
+            for digest in batch:
+                if digest in known:
+                    keep.append(False)
+                else:
+                    known.add(digest)
+                    new.append((digest,))
+                    keep.append(True)
+            self.connection.executemany("INSERT INTO seen (digest) VALUES (?)", new)
+        return keep
+
+def dedup_streaming(file_name, output_file='cleaned_meta.csv', chunksize=100_000, seen=None):
+    # Read the export a chunk at a time and write first-seen rows straight to
+    # the output. Memory is bounded by the set of body digests
+    seen = set() if seen is None else seen
+    rows_read = rows_written = 0
+    with open(output_file, mode='w', encoding='utf-8', newline='') as file:
+        # The header is written up front, so a header-only export still gets one
+        pd.read_csv(file_name, dtype=str, nrows=0).to_csv(file, index=False)
+        for chunk in read_chunks(file_name, chunksize):
+            cleaned_chunk = chunk[first_seen(chunk.iloc[:, BODY_COLUMN], seen)]
+            cleaned_chunk.to_csv(file, header=False, index=False)
+            rows_read += len(chunk)
+            rows_written += len(cleaned_chunk)
+    return rows_read, rows_written
+
+def expand_inputs(pattern):
+    # A directory means every CSV in it; anything else is a file name or glob.
+    # Empty if nothing matches
+    if os.path.isdir(pattern):
+        return sorted(glob.glob(os.path.join(pattern, '*.csv')))
+    # A file whose name has glob characters in it does not match itself
+    return sorted(glob.glob(pattern)) or ([pattern] if os.path.isfile(pattern) else [])
+
+def hash_file(file_name, chunksize):
+    # Worker: the row numbers and digests of the first occurrence of every body
+    # within one file, plus the file's header and row count
+    seen = set()
+    rows = array('Q')
+    digests = bytearray()
+    row_number = 0
+    header = None
+    for chunk in read_chunks(file_name, chunksize):
+        header = list(chunk.columns)
+        for body in chunk.iloc[:, BODY_COLUMN]:
+            digest = body_digest(body)
+            if digest not in seen:
+                seen.add(digest)
+                rows.append(row_number)
+                digests += digest
+            row_number += 1
+    return header, row_number, rows, bytes(digests)
+
+def write_kept_rows(file_name, part_file, keep_rows, chunksize):
+    # Worker: write the given (sorted) row numbers of a file, without header
+    position = 0
+    with open(part_file, mode='w', encoding='utf-8', newline='') as file:
+        if not keep_rows:
+            # Nothing to write, e.g. a header-only export
+            return part_file
+        for chunk in read_chunks(file_name, chunksize):
+            if chunk.empty:
+                continue
+            # Chunks keep the file-wide row numbers as their index
+            end = bisect.bisect_right(keep_rows, chunk.index[-1], lo=position)
+            chunk.loc[list(keep_rows[position:end])].to_csv(file, header=False, index=False)
+            position = end
+    return part_file
+
+def dedup_parallel(file_names, output_file='cleaned_meta.csv', chunksize=100_000, workers=None, seen=None):
+    # Global dedup across many exports. Files are parsed and hashed in a
+    # process pool, the per-file digests are merged in file order so a body is
+    # kept only in the first file (and row) it appears in, and the kept rows
+    # are written in parallel to part files that are concatenated at the end
+    seen = set() if seen is None else seen
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        hashed = list(executor.map(hash_file, file_names, [chunksize] * len(file_names)))
+        
+        header = None
+        rows_read = 0
+        keep_rows_per_file = []
+        for file_name, (file_header, row_count, rows, digests) in zip(file_names, hashed):
+            if file_header is None:
+                keep_rows_per_file.append(array('Q'))
+                continue
+            if header is None:
+                header = file_header
+            elif file_header != header:
+                raise ValueError(f"{file_name} has different columns from {file_names[0]}")
+            rows_read += row_count
+            
+            file_digests = [digests[i * 16:(i + 1) * 16] for i in range(len(rows))]
+            keep_rows_per_file.append(array('Q', compress(rows, new_digests(file_digests, seen))))
+        
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        with tempfile.TemporaryDirectory(dir=output_dir) as parts_dir:
+            part_files = [os.path.join(parts_dir, f"part-{i}.csv") for i in range(len(file_names))]
+            list(executor.map(write_kept_rows, file_names, part_files, keep_rows_per_file, [chunksize] * len(file_names)))
+            
+            with open(output_file, mode='w', encoding='utf-8', newline='') as file:
+                if header is not None:
+                    pd.DataFrame(columns=header).to_csv(file, index=False)
+                for part_file in part_files:
+                    with open(part_file, mode='r', encoding='utf-8', newline='') as part:
+                        shutil.copyfileobj(part, file)
+    
+    return rows_read, sum(len(keep_rows) for keep_rows in keep_rows_per_file)
+
+def dedup_near_duplicates(file_name, output_file='cleaned_meta.csv', threshold=0.8, num_perm=128, chunksize=100_000):
+    # Cluster bodies that are near-duplicates of each other (MinHash/LSH, see
+    # near_duplicates.py). Writes one representative row per cluster, the first
+    # in file order, to output_file with cluster_id and cluster_size columns, and
+    # every row with its cluster_id to <output>_clusters.csv
+    from near_duplicates import NearDuplicateIndex
+    
+    # First pass: exact duplicates share one signature, so only distinct bodies
+    # are added to the index
+    index = NearDuplicateIndex(threshold, num_perm)
+    doc_of = {}
+    rows_per_doc = []
+    for chunk in read_chunks(file_name, chunksize):
+        for body in chunk.iloc[:, BODY_COLUMN]:
+            digest = body_digest(body)
+            doc = doc_of.get(digest)
+            if doc is None:
+                doc = doc_of[digest] = index.add(body)
+                rows_per_doc.append(0)
+            rows_per_doc[doc] += 1
+    
+    cluster_of_doc = index.clusters()
+    cluster_sizes = [0] * (max(cluster_of_doc) + 1 if cluster_of_doc else 0)
+    for doc, cluster_id in enumerate(cluster_of_doc):
+        cluster_sizes[cluster_id] += rows_per_doc[doc]
+    
+    # Second pass: label every row and write the first row of each cluster
+    clusters_file = f"{os.path.splitext(output_file)[0]}_clusters.csv"
+    written = [False] * len(cluster_sizes)
+    rows_read = 0
+    with open(output_file, mode='w', encoding='utf-8', newline='') as file, \
+         open(clusters_file, mode='w', encoding='utf-8', newline='') as all_rows_file:
+        for i, chunk in enumerate(read_chunks(file_name, chunksize)):
+            cluster_ids = [cluster_of_doc[doc_of[body_digest(body)]] for body in chunk.iloc[:, BODY_COLUMN]]
+            chunk['cluster_id'] = cluster_ids
+            chunk.to_csv(all_rows_file, header=(i == 0), index=False)
+            
+            representative = []
+            for cluster_id in cluster_ids:
+                representative.append(not written[cluster_id])
+                written[cluster_id] = True
+            representatives = chunk[representative]
+            representatives = representatives.assign(cluster_size=[cluster_sizes[c] for c in representatives['cluster_id']])
+            representatives.to_csv(file, header=(i == 0), index=False)
+            rows_read += len(chunk)
+    
+    print(f"{len(doc_of)} distinct bodies in {len(cluster_sizes)} near-duplicate clusters; all rows labelled in {clusters_file}")
+    return rows_read, len(cluster_sizes)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Remove duplicate ad_creative_bodies from a Meta ad library export.")
+    parser.add_argument('input', nargs='?',
+                        help="Meta ad library CSV, or a directory/glob of exports deduplicated together (prompted for when omitted)")
+    parser.add_argument('-o', '--output', default='cleaned_meta.csv')
+    parser.add_argument('--mode', choices=['stream', 'memory'], default='stream',
+                        help="stream: chunked, keeps only body digests in memory; memory: load the whole file")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="rows per chunk in stream mode")
+    parser.add_argument('--near-duplicates', action='store_true',
+                        help="cluster near-duplicate bodies with MinHash/LSH instead of exact matching")
+    parser.add_argument('--threshold', type=float, default=0.8,
+                        help="estimated Jaccard similarity at which bodies are near-duplicates (default 0.8)")
+    parser.add_argument('--num-perm', type=int, default=128, help="MinHash signature length")
+    parser.add_argument('--index', metavar='PATH',
+                        help="SQLite index of bodies seen by earlier runs; only bodies never seen before are written, "
+                             "and this run's bodies are added to it")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes used when several files are given (default: one per core)")
+    return parser.parse_args(argv)
 
-data = pd.read_csv(file_name)
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
 
-# drop duplicates in the 7th column
-cleaned_data = data.drop_duplicates(subset=data.columns[7])
+    # ask for the file path
+    file_name = args.input or input("Enter the path to the CSV file: ")
+    file_names = expand_inputs(file_name)
+    if not file_names:
+        print(f"No CSV files matched {file_name}")
+        return
 
-cleaned_data.to_csv('cleaned_meta.csv', index=False)
+    if args.index and (args.near_duplicates or args.mode != 'stream'):
+        print("--index can only be used in stream mode")
+        return
+    if len(file_names) > 1 and (args.near_duplicates or args.mode != 'stream'):
+        print("Several input files can only be deduplicated in stream mode")
+        return
 
+    if args.near_duplicates:
+        rows_read, rows_written = dedup_near_duplicates(file_names[0], args.output, args.threshold, args.num_perm, args.chunksize)
+    elif args.mode == 'memory':
+        rows_read, rows_written = dedup_in_memory(file_names[0], args.output)
+    else:
+        with SeenBodyIndex(args.index) if args.index else nullcontext(set()) as seen:
+            if args.index:
+                print(f"Loaded index {args.index} with {len(seen)} previously seen bodies")
+            if len(file_names) > 1:
+                print(f"Deduplicating {len(file_names)} files")
+                rows_read, rows_written = dedup_parallel(file_names, args.output, args.chunksize, args.workers, seen)
+            else:
+                rows_read, rows_written = dedup_streaming(file_names[0], args.output, args.chunksize, seen)
+    print(f"Kept {rows_written} of {rows_read} rows ({rows_read - rows_written} duplicates removed), written to {args.output}")
 
+if __name__ == "__main__":
+    main()
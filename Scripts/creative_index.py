@@ -0,0 +1,224 @@
+# Persisted interval index over the Date_Range_Start/Date_Range_End columns of
+# google-political-ads-creative-stats.csv.
+#
+# The index is built once per bundle and stored next to the CSV as
+# <csv>.idx. It holds, for every row, the date range, the byte offset of the
+# row in the CSV and small integer codes for Ad_Type and Regions, sorted by
+# start date and laid out as an implicit augmented interval tree (the layout
+# used by cgranges): the node at index i of the sorted arrays covers a subtree
+# whose largest end date is stored in max_ends[i]. A date-window query then
+# visits O(log n + k) nodes for k overlapping ads, and only the matching rows
+# are read back from the CSV.
+#
+# Intervals are stored half-open as [start, end + 1) with dates as YYYYMMDD
+# integers, so an ad overlaps the window [start_date, end_date] exactly when
+# start < end_date + 1 and start_date < end + 1. This includes ads that run
+# through the whole window.
+
+import csv
+import json
+import os
+import sys
+from array import array
+
+MAGIC = b'CRIDX1\n'
+
+# (attribute, array typecode) in the order they are stored on disk
+ARRAYS = [
+    ('starts', 'I'),
+    ('ends', 'I'),
+    ('max_ends', 'I'),
+    ('offsets', 'Q'),
+    ('ad_types', 'B'),
+    ('regions', 'H'),
+]
+
+def parse_date(date_string):
+    # YYYY-MM-DD -> integer YYYYMMDD
+    return int(date_string.strip().replace('-', ''))
+
+def iter_lines(file):
+    # Decoded lines of a binary file; the file position after each csv record
+    # is the offset of the next one because csv.reader never reads ahead
+    for line in iter(file.readline, b''):
+        yield line.decode('utf-8')
+
+def iter_rows_with_offsets(file_path):
+    # Yield (byte offset, row) for every row of a CSV file
+    csv.field_size_limit(sys.maxsize)
+    with open(file_path, mode='rb') as file:
+        reader = csv.reader(iter_lines(file))
+        while True:
+            offset = file.tell()
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            yield offset, row
+
+def source_signature(file_path):
+    # Used to detect an index that is older than its CSV
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+class IntervalIndex:
+    def __init__(self, csv_path, header, arrays):
+        self.csv_path = csv_path
+        self.header = header
+        for name, _ in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.ad_type_codes = {value: code for code, value in enumerate(header['ad_types'])}
+        self.region_codes = {value: code for code, value in enumerate(header['regions'])}
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, csv_path):
+        """Scan the CSV once and build the index"""
+        starts, ends, offsets = array('I'), array('I'), array('Q')
+        ad_types, regions = array('B'), array('H')
+        ad_type_codes, region_codes = {}, {}
+
+        rows = iter_rows_with_offsets(csv_path)
+        next(rows, None)  # Skip header row
+        for offset, row in rows:
+            starts.append(parse_date(row[7]))
+            ends.append(parse_date(row[8]) + 1)
+            offsets.append(offset)
+            ad_types.append(ad_type_codes.setdefault(row[2], len(ad_type_codes)))
+            regions.append(region_codes.setdefault(row[3], len(region_codes)))
+
+        # Sort every column by start date
+        order = sorted(range(len(starts)), key=starts.__getitem__)
+        arrays = {
+            'starts': array('I', (starts[i] for i in order)),
+            'ends': array('I', (ends[i] for i in order)),
+            'offsets': array('Q', (offsets[i] for i in order)),
+            'ad_types': array('B', (ad_types[i] for i in order)),
+            'regions': array('H', (regions[i] for i in order)),
+        }
+        del order, starts, ends, offsets, ad_types, regions
+        arrays['max_ends'] = array('I', arrays['ends'])
+        max_level = augment(arrays['ends'], arrays['max_ends'])
+
+        header = {
+            'source': source_signature(csv_path),
+            'max_level': max_level,
+            'ad_types': list(ad_type_codes),
+            'regions': list(region_codes),
+        }
+        return cls(csv_path, header, arrays)
+
+    def save(self, index_path):
+        """Write the index to disk"""
+        with open(index_path, mode='wb') as file:
+            file.write(MAGIC)
+            file.write(json.dumps(self.header).encode('utf-8') + b'\n')
+            for name, _ in ARRAYS:
+                getattr(self, name).tofile(file)
+
+    @classmethod
+    def load(cls, csv_path, index_path):
+        """Read an index written by save()"""
+        with open(index_path, mode='rb') as file:
+            if file.readline() != MAGIC:
+                raise ValueError(f"{index_path} is not a creative-stats interval index")
+            header = json.loads(file.readline())
+            n = (os.path.getsize(index_path) - file.tell()) // sum(array(t).itemsize for _, t in ARRAYS)
+            arrays = {}
+            for name, typecode in ARRAYS:
+                arrays[name] = array(typecode)
+                arrays[name].fromfile(file, n)
+        return cls(csv_path, header, arrays)
+
+    @classmethod
+    def open(cls, csv_path, index_path=None):
+        """Load the index for csv_path, building and saving it if it is missing or stale"""
+        index_path = index_path or f"{csv_path}.idx"
+        if os.path.exists(index_path):
+            index = cls.load(csv_path, index_path)
+            if index.header['source'] == source_signature(csv_path):
+                return index
+            print(f"Index {index_path} is out of date, rebuilding")
+        print(f"Building interval index for {csv_path}...")
+        index = cls.build(csv_path)
+        index.save(index_path)
+        return index
+
+    def overlapping(self, start_date, end_date):
+        """Positions of every ad whose date range overlaps [start_date, end_date]"""
+        starts, ends, max_ends = self.starts, self.ends, self.max_ends
+        n = len(starts)
+        st, en = start_date, end_date + 1
+        found = []
+
+        max_level = self.header['max_level']
+        if n == 0:
+            return found
+
+        # Iterative walk of the implicit tree; stack entries are (level, node, visited_left)
+        stack = [(max_level, (1 << max_level) - 1, 0)]
+        while stack:
+            k, x, w = stack.pop()
+            if k <= 3:
+                # Small subtree: scan it linearly
+                i = x >> k << k
+                i1 = min(i + (1 << (k + 1)) - 1, n)
+                while i < i1 and starts[i] < en:
+                    if st < ends[i]:
+                        found.append(i)
+                    i += 1
+            elif w == 0:
+                # Descend left only if something there ends after the window starts
+                y = x - (1 << (k - 1))
+                stack.append((k, x, 1))
+                if y >= n or max_ends[y] > st:
+                    stack.append((k - 1, y, 0))
+            elif x < n and starts[x] < en:
+                if st < ends[x]:
+                    found.append(x)
+                stack.append((k - 1, x + (1 << (k - 1)), 0))
+        return found
+
+    def query(self, ad_type, start_date, end_date, region='US'):
+        """CSV byte offsets of matching ads, in file order"""
+        ad_type_code = self.ad_type_codes.get(ad_type)
+        region_code = self.region_codes.get(region)
+        if ad_type_code is None or region_code is None:
+            return []
+        return sorted(
+            self.offsets[i]
+            for i in self.overlapping(start_date, end_date)
+            if self.ad_types[i] == ad_type_code and self.regions[i] == region_code
+        )
+
+    def read_rows(self, offsets):
+        """Yield the CSV rows stored at the given byte offsets"""
+        csv.field_size_limit(sys.maxsize)
+        with open(self.csv_path, mode='rb') as file:
+            for offset in offsets:
+                file.seek(offset)
+                yield next(csv.reader(iter_lines(file)))
+
+def augment(ends, max_ends):
+    # Fill max_ends so that every node of the implicit tree holds the largest
+    # end in its subtree; returns the height of the tree
+    n = len(ends)
+    if n == 0:
+        return 0
+    last_i = 0
+    last = 0
+    for i in range(0, n, 2):
+        last_i, last = i, ends[i]
+    k = 1
+    while 1 << k <= n:
+        x = 1 << (k - 1)
+        for i in range((x << 1) - 1, n, x << 2):
+            right = max_ends[i + x] if i + x < n else last
+            max_ends[i] = max(ends[i], max_ends[i - x], right)
+        last_i = last_i - x if last_i >> k & 1 else last_i + x
+        if last_i < n and max_ends[last_i] > last:
+            last = max_ends[last_i]
+        k += 1
+    return k - 1
@@ -0,0 +1,134 @@
+# This script converts the CSV files of a google-political-ads-transparency-bundle
+# into a columnar Parquet store, so the creative filter in scraping_creative.py
+# does not have to re-parse the raw CSVs on every run. It only needs to be run
+# again when the bundle is refreshed.
+#
+# google-political-ads-creative-stats.csv is partitioned by Ad_Type and by the
+# month of Date_Range_Start (hive layout, e.g. Ad_Type=VIDEO/Start_Month=2024-10/),
+# so queries only open the directories that can match. Since an ad can run for
+# months, the longest run in the file is stored next to the partitions (in
+# _max_ad_days.json) to tell how far before a window the first possible start
+# month lies. Every other bundle CSV is written as a single unpartitioned
+# dataset.
+#
+# Usage: python ingest_bundle.py <bundle directory> <store directory>
+
+import csv
+import json
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+
+BUNDLE_PREFIX = 'google-political-ads-'
+
+# Columns parsed as dates; everything else is kept as text so that bucketed
+# values such as "≤ 10k" never break type inference halfway through a file
+DATE_COLUMNS = ['Date_Range_Start', 'Date_Range_End', 'Week_Start_Date', 'Report_Data_Updated_Date']
+
+CREATIVE_STATS = 'creative-stats'
+CREATIVE_PARTITIONING = ds.partitioning(
+    pa.schema([('Ad_Type', pa.string()), ('Start_Month', pa.string())]),
+    flavor='hive',
+)
+# Written next to the creative-stats partitions; the dataset reader skips
+# files starting with an underscore
+MAX_AD_DAYS_FILE = '_max_ad_days.json'
+
+def read_header(file_path):
+    # Column names from the first line of a CSV file
+    csv.field_size_limit(sys.maxsize)
+    with open(file_path, mode='r', encoding='utf-8', newline='') as file:
+        return next(csv.reader(file))
+
+def open_bundle_csv(file_path, block_size=64 << 20):
+    # Stream a bundle CSV as Arrow record batches with explicit column types
+    header = read_header(file_path)
+    column_types = {
+        column: pa.date32() if column in DATE_COLUMNS else pa.string()
+        for column in header
+    }
+    return pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types),
+    )
+
+def with_start_month(batches, spans):
+    # Add the Start_Month partition column ("YYYY-MM") to each batch, and
+    # collect the longest Date_Range_Start to Date_Range_End of each in spans
+    for batch in batches:
+        start_month = pc.strftime(batch.column('Date_Range_Start'), format='%Y-%m')
+        longest = pc.max(pc.days_between(batch.column('Date_Range_Start'), batch.column('Date_Range_End'))).as_py()
+        if longest is not None:
+            spans.append(longest)
+        yield pa.RecordBatch.from_arrays(
+            batch.columns + [start_month],
+            names=batch.schema.names + ['Start_Month'],
+        )
+
+def ingest_file(file_path, table_dir):
+    # Convert one bundle CSV into a Parquet dataset under table_dir
+    reader = open_bundle_csv(file_path)
+    spans = None
+    if os.path.basename(table_dir) == CREATIVE_STATS:
+        spans = []
+        schema = reader.schema.append(pa.field('Start_Month', pa.string()))
+        data = pa.RecordBatchReader.from_batches(schema, with_start_month(reader, spans))
+        partitioning = CREATIVE_PARTITIONING
+    else:
+        data = reader
+        partitioning = None
+
+    ds.write_dataset(
+        data,
+        table_dir,
+        format='parquet',
+        partitioning=partitioning,
+        existing_data_behavior='delete_matching',
+        max_rows_per_group=128 * 1024,
+    )
+    if spans is not None:
+        with open(os.path.join(table_dir, MAX_AD_DAYS_FILE), mode='w', encoding='utf-8') as file:
+            json.dump({'max_ad_days': max(spans, default=0)}, file)
+
+def read_max_ad_days(table_dir):
+    # Longest run of an ad in a creative-stats dataset, in days, or None for a
+    # store written before it was recorded
+    try:
+        with open(os.path.join(table_dir, MAX_AD_DAYS_FILE), mode='r', encoding='utf-8') as file:
+            return json.load(file)['max_ad_days']
+    except FileNotFoundError:
+        return None
+
+def ingest_bundle(bundle_dir, store_dir):
+    # Convert every google-political-ads-*.csv in bundle_dir; returns the
+    # table directories that were written
+    written = []
+    for file_name in sorted(os.listdir(bundle_dir)):
+        if not (file_name.startswith(BUNDLE_PREFIX) and file_name.endswith('.csv')):
+            continue
+        table_name = file_name[len(BUNDLE_PREFIX):-len('.csv')]
+        table_dir = os.path.join(store_dir, table_name)
+        print(f"Converting {file_name} -> {table_dir}")
+        ingest_file(os.path.join(bundle_dir, file_name), table_dir)
+        written.append(table_dir)
+    return written
+
+def main():
+    bundle_dir = sys.argv[1] if len(sys.argv) > 1 else input("Enter the path to the transparency bundle directory: ")
+    store_dir = sys.argv[2] if len(sys.argv) > 2 else input("Enter the path for the Parquet store: ")
+
+    written = ingest_bundle(bundle_dir, store_dir)
+    if not written:
+        print(f"No {BUNDLE_PREFIX}*.csv files found in {bundle_dir}")
+        return
+    print(f"Converted {len(written)} files into {store_dir}")
+    print(f"Use {os.path.join(store_dir, CREATIVE_STATS)} as the input of scraping_creative.py with the parquet backend")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# Local stand-in for the Google ad transparency site, used by the scraper
+# benchmarks. It serves the same nesting of iframes the scrapers walk:
+#
+#   /advertiser/{ar}/creative/{cr}   page with an iframe#fletch-render-...
+#   /render/{ar}/{cr}                fletch-render frame with an iframe#google_ad_...
+#   /ad/{ar}/{cr}                    ad frame; video creatives hold an iframe#video_...
+#   /youtube.com/embed/{video_id}    stand-in for the YouTube embed
+#
+# and the two requests behind them that the scrapers' direct HTTP path makes:
+#
+#   POST /anji/_/rpc/LookupService/GetCreativeById   creative RPC, escaped like
+#                                                    the real one, pointing at...
+#   /ads/preview/content.js?cr=...&ar=...            render payload; video
+#                                                    creatives embed the YouTube URL
+#
+# The creative page also pulls in an analytics script (from "localhost", so it
+# counts as a third-party host next to 127.0.0.1), a stylesheet and an image,
+# and the embed page a large player script, so that request blocking has
+# something to save. With a capacity, creative pages beyond that many in
+# flight are answered with 429, like a rate-limiting site.
+#
+# Whether a creative is a video, its video ID, how long its page takes to
+# load and whether its first loads fail (flaky_share, off by default) are
+# derived from the creative ID, so every run (and every scheduler
+# being compared) sees exactly the same workload. Page latency is log-normal
+# with a small share of very slow pages to reproduce the long tail of the
+# real site.
+#
+# With an advertiser_latency, the mock also models the advertiser-level state
+# a client keeps warm between creatives: it hands out a session cookie and
+# remembers the last warm_advertisers advertisers each session loaded a
+# creative of. A creative page or RPC of any other advertiser costs
+# advertiser_latency on top of its own latency, so the order in which a
+# client visits advertisers shows up in its per-creative latency.
+
+import contextlib
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from http.cookies import CookieError, SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CREATIVE_RPC_PATH = '/anji/_/rpc/LookupService/GetCreativeById'
+SESSION_COOKIE = 'mock_session'
+
+# Subresources of the mock pages and their sizes in bytes
+STATIC_FILES = {
+    'analytics.js': 40 * 1024,
+    'static/app.css': 30 * 1024,
+    'static/logo.png': 20 * 1024,
+    'youtube.com/s/player/base.js': 400 * 1024,
+}
+
+class MockTransparencyServer:
+    """Runs the mock site in a background thread; use as a context manager"""
+    def __init__(self, median_latency=0.4, sigma=0.5, slow_share=0.05, slow_latency=4.0,
+                 video_share=0.7, frame_latency=0.02, rpc_share=0.25, flaky_share=0.0, flaky_failures=1,
+                 capacity=None, advertiser_latency=0.0, warm_advertisers=8, host='127.0.0.1', port=0):
+        self.median_latency = median_latency
+        self.sigma = sigma
+        self.slow_share = slow_share
+        self.slow_latency = slow_latency
+        self.video_share = video_share
+        self.frame_latency = frame_latency
+        # The RPC answers in this share of the time the full page takes
+        self.rpc_share = rpc_share
+        # This share of creatives answers 503 to its first flaky_failures page loads
+        self.flaky_share = flaky_share
+        self.flaky_failures = flaky_failures
+        self.page_loads = {}
+        # With a capacity, creative pages beyond that many in flight get a 429
+        self.capacity = capacity
+        self.active_pages = 0
+        self.rejected = 0
+        # With an advertiser_latency, a session's first creative of an
+        # advertiser not among its warm_advertisers most recent ones is slower
+        self.advertiser_latency = advertiser_latency
+        self.warm_advertisers = warm_advertisers
+        self.sessions = {}  # session ID -> OrderedDict of its warm advertisers
+        self.cold_loads = 0
+        self.warm_loads = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _random(self, cr):
+        # Per-creative random stream, independent of request order
+        return random.Random(hashlib.blake2b(cr.encode('utf-8'), digest_size=8).digest())
+
+    def is_video(self, cr):
+        return self._random(cr).random() < self.video_share
+
+    def video_id(self, cr):
+        """The YouTube ID the mock serves for a video creative"""
+        alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+        rng = self._random(cr + '/video')
+        return ''.join(rng.choice(alphabet) for _ in range(11))
+
+    def page_latency(self, cr):
+        """Seconds the creative page takes to respond"""
+        rng = self._random(cr + '/latency')
+        if rng.random() < self.slow_share:
+            return self.slow_latency
+        return self.median_latency * math.exp(rng.gauss(0, self.sigma))
+
+    def is_flaky(self, cr):
+        return self._random(cr + '/flaky').random() < self.flaky_share
+
+    def expected_results(self, creatives):
+        """{cr: video_id or None} for a list of (cr, ar) pairs"""
+        return {cr: self.video_id(cr) if self.is_video(cr) else None for cr, _ in creatives}
+
+    def open_session(self, cookie_header):
+        # (session ID, whether it is new) for a request's Cookie header, or
+        # (None, False) when sessions are not modelled
+        if not self.advertiser_latency:
+            return None, False
+        try:
+            morsel = SimpleCookie(cookie_header or '').get(SESSION_COOKIE)
+        except CookieError:
+            morsel = None
+        with self._lock:
+            if morsel is not None and morsel.value in self.sessions:
+                return morsel.value, False
+            session = str(len(self.sessions) + 1)
+            self.sessions[session] = OrderedDict()
+            return session, True
+
+    def advertiser_delay(self, session, ar):
+        """Extra seconds a creative of advertiser ar costs the session, which
+        then has the advertiser warm"""
+        if not self.advertiser_latency or session is None:
+            return 0.0
+        with self._lock:
+            warm = self.sessions[session]
+            if ar in warm:
+                warm.move_to_end(ar)
+                self.warm_loads += 1
+                return 0.0
+            warm[ar] = True
+            if len(warm) > self.warm_advertisers:
+                warm.popitem(last=False)
+            self.cold_loads += 1
+            return self.advertiser_latency
+
+    def render(self, path, session=None):
+        # Returns (status, html body, delay in seconds) for a request path
+        parts = path.split('?')[0].strip('/').split('/')
+        if len(parts) == 4 and parts[0] == 'advertiser' and parts[2] == 'creative':
+            ar, cr = parts[1], parts[3]
+            with self._lock:
+                self.page_loads[cr] = loads = self.page_loads.get(cr, 0) + 1
+            if self.is_flaky(cr) and loads <= self.flaky_failures:
+                return 503, 'service unavailable', self.frame_latency
+            port = self._server.server_address[1]
+            body = (f'<html><head><script src="http://localhost:{port}/analytics.js"></script>'
+                    f'<link rel="stylesheet" href="/static/app.css"></head><body><img src="/static/logo.png">'
+                    f'<iframe id="fletch-render-{cr[-6:]}" src="/render/{ar}/{cr}"></iframe></body></html>')
+            return 200, body, self.page_latency(cr) + self.advertiser_delay(session, ar)
+        if len(parts) == 3 and parts[0] == 'render':
+            ar, cr = parts[1], parts[2]
+            body = f'<html><body><iframe id="google_ads_iframe_{cr[-6:]}" src="/ad/{ar}/{cr}"></iframe></body></html>'
+            return 200, body, self.frame_latency
+        if len(parts) == 3 and parts[0] == 'ad':
+            cr = parts[2]
+            if self.is_video(cr):
+                body = f'<html><body><iframe id="video_player" src="/youtube.com/embed/{self.video_id(cr)}?enablejsapi=1"></iframe></body></html>'
+            else:
+                body = '<html><body><div class="image-ad">ad</div></body></html>'
+            return 200, body, self.frame_latency
+        if len(parts) == 3 and parts[0] == 'youtube.com' and parts[1] == 'embed':
+            return 200, '<html><head><script src="/youtube.com/s/player/base.js"></script></head><body></body></html>', 0
+        static_path = '/'.join(parts)
+        if static_path in STATIC_FILES:
+            return 200, '/' * STATIC_FILES[static_path], 0
+        if parts == ['ads', 'preview', 'content.js']:
+            cr = parse_qs(urlsplit(path).query).get('cr', [''])[0]
+            if self.is_video(cr):
+                body = f'var ad = {{"video_videoId": "{self.video_id(cr)}", "src": "https:\\/\\/www.youtube.com\\/embed\\/{self.video_id(cr)}?enablejsapi=1"}};'
+            else:
+                body = 'var ad = {"image_url": "https:\\/\\/tpc.googlesyndication.com\\/simgad\\/1"};'
+            return 200, body, self.frame_latency
+        return 404, 'not found', 0
+
+    def render_rpc(self, path, form, session=None):
+        # Returns (status, body, delay in seconds) for a POST to the creative RPC
+        if urlsplit(path).path != CREATIVE_RPC_PATH:
+            return 404, 'not found', 0
+        try:
+            request = json.loads(parse_qs(form)['f.req'][0])
+            ar, cr = request['1'], request['2']
+        except (KeyError, IndexError, ValueError):
+            return 400, 'bad request', 0
+        # Escaped the way the real RPC response escapes '=' and '&'
+        content_url = f"{self.base_url}/ads/preview/content.js?cr={cr}&ar={ar}"
+        snippet = f'<script src="{content_url}"></script>'
+        body = ")]}'\n" + json.dumps({'1': {'1': ar, '2': cr, '5': [{'1': {'4': snippet}}]}})
+        body = body.replace('=', '\\u003d').replace('&', '\\u0026')
+        return 200, body, self.page_latency(cr) * self.rpc_share + self.advertiser_delay(session, ar)
+
+    @contextlib.contextmanager
+    def page_slot(self, path):
+        # Yields False if a creative page request is over capacity
+        is_page = path.startswith('/advertiser/')
+        with self._lock:
+            admitted = not (is_page and self.capacity is not None and self.active_pages >= self.capacity)
+            if is_page and admitted:
+                self.active_pages += 1
+            elif not admitted:
+                self.rejected += 1
+        try:
+            yield admitted
+        finally:
+            if is_page and admitted:
+                with self._lock:
+                    self.active_pages -= 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                session, new_session = server.open_session(self.headers.get('Cookie'))
+                with server.page_slot(self.path) as admitted:
+                    if admitted:
+                        self.respond(*server.render(self.path, session), session if new_session else None)
+                    else:
+                        self.respond(429, 'too many requests', 0)
+
+            def do_POST(self):
+                with server._lock:
+                    server.requests += 1
+                length = int(self.headers.get('Content-Length') or 0)
+                form = self.rfile.read(length).decode('utf-8')
+                session, new_session = server.open_session(self.headers.get('Cookie'))
+                self.respond(*server.render_rpc(self.path, form, session), session if new_session else None)
+
+            def respond(self, status, body, delay, new_session=None):
+                time.sleep(delay)
+                payload = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                if new_session is not None:
+                    self.send_header('Set-Cookie', f"{SESSION_COOKIE}={new_session}; Path=/")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def make_creatives(count, advertisers=50, seed=0):
+    """Synthetic (cr, ar) pairs in the ID format of the real site"""
+    rng = random.Random(seed)
+    advertiser_ids = [f"AR{rng.randrange(10**20):020d}" for _ in range(advertisers)]
+    return [(f"CR{rng.randrange(10**20):020d}", rng.choice(advertiser_ids)) for _ in range(count)]
+
+if __name__ == "__main__":
+    with MockTransparencyServer(port=8765) as mock:
+        print(f"Mock transparency site on {mock.base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
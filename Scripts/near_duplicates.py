@@ -0,0 +1,122 @@
+# Near-duplicate clustering of ad bodies with MinHash and locality-sensitive
+# hashing, used by cleaning_duplicates_meta.py --near-duplicates.
+#
+# Bodies are normalized (case, punctuation, whitespace and URL parameters are
+# ignored) and turned into character 5-gram shingles. Each body gets a MinHash
+# signature whose values agree with another body's with probability equal to
+# the Jaccard similarity of their shingle sets. Signatures are split into bands
+# and bodies that share any band land in the same LSH bucket; a new body is
+# compared with every earlier body in any of its buckets and with no other,
+# so the work grows roughly linearly with the number of bodies instead of
+# quadratically. A body whose whole signature equals an earlier one's joins it
+# without entering the buckets, since it would match the same candidates.
+# Candidates whose estimated similarity reaches the threshold are merged with
+# a union-find, and every cluster is represented by its earliest body.
+
+import re
+import zlib
+
+import numpy as np
+
+# Modulus of the universal hash family used for the MinHash permutations; the
+# products of 31-bit values stay within uint64
+MERSENNE_PRIME = (1 << 31) - 1
+
+URL = re.compile(r'(?:https?://|www\.)\S+')
+NON_WORD = re.compile(r'[^\w\s]+')
+
+def normalize_body(text):
+    """Lowercase, drop URL query strings and fragments, punctuation and extra whitespace"""
+    text = URL.sub(lambda match: re.split(r'[?#]', match.group(0))[0], text.lower())
+    text = NON_WORD.sub(' ', text)
+    return ' '.join(text.split())
+
+def shingle_hashes(text, size=5):
+    """32-bit hashes of the character shingles of a normalized body"""
+    if len(text) <= size:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+def choose_bands(num_perm, threshold):
+    """Pick (bands, rows) with bands * rows == num_perm whose LSH threshold
+    (1 / bands) ** (1 / rows) is closest to the requested similarity"""
+    candidates = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(candidates, key=lambda pair: abs((1 / pair[0]) ** (1 / pair[1]) - threshold))
+
+class NearDuplicateIndex:
+    """Assigns bodies to near-duplicate clusters as they are added"""
+    def __init__(self, threshold=0.8, num_perm=128, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+
+        # Signatures are stored in one growing array, one row per body
+        self.signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.parent = []
+        self.buckets = [{} for _ in range(self.bands)]  # band values -> list of bodies
+        self.exact = {}  # hash of a whole signature -> first body with it
+
+    def __len__(self):
+        return len(self.parent)
+
+    def signature(self, text):
+        """MinHash signature of a body"""
+        hashes = shingle_hashes(normalize_body(text)) % np.uint64(MERSENNE_PRIME)
+        if len(hashes) == 0:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint32)
+        return ((self.a * hashes + self.b) % np.uint64(MERSENNE_PRIME)).min(axis=1).astype(np.uint32)
+
+    def add(self, text):
+        """Add a body, merge it with any near-duplicates already added, and return its id"""
+        doc = len(self.parent)
+        if doc == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        signature = self.signature(text)
+        self.signatures[doc] = signature
+        self.parent.append(doc)
+
+        first = self.exact.setdefault(hash(signature.tobytes()), doc)
+        if first != doc and np.array_equal(self.signatures[first], signature):
+            self.union(doc, first)
+            return doc
+
+        candidates = set()
+        for band, bucket in enumerate(self.buckets):
+            members = bucket.setdefault(signature[band * self.rows:(band + 1) * self.rows].tobytes(), [])
+            candidates.update(members)
+            members.append(doc)
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similar = (self.signatures[candidates] == signature).mean(axis=1) >= self.threshold
+            for other in candidates[similar]:
+                self.union(doc, int(other))
+        return doc
+
+    def similarity(self, doc, other):
+        """Estimated Jaccard similarity of two added bodies"""
+        return float(np.mean(self.signatures[doc] == self.signatures[other]))
+
+    def find(self, doc):
+        # Union-find root with path halving
+        parent = self.parent
+        while parent[doc] != doc:
+            parent[doc] = parent[parent[doc]]
+            doc = parent[doc]
+        return doc
+
+    def union(self, doc, other):
+        # The earlier body always becomes the root, so it represents the cluster
+        root, other_root = self.find(doc), self.find(other)
+        if root != other_root:
+            self.parent[max(root, other_root)] = min(root, other_root)
+
+    def clusters(self):
+        """Cluster id of every body, numbered 0, 1, ... in order of first appearance"""
+        cluster_ids = {}
+        return [cluster_ids.setdefault(self.find(doc), len(cluster_ids)) for doc in range(len(self.parent))]
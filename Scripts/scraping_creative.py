@@ -25,67 +25,401 @@
 #                                    \\
 #                                     '
 
+import argparse
 import csv
+import datetime
+import itertools
 import sys
+from contextlib import ExitStack
+
+# pandas is only needed for the vectorized backend, and pyarrow (when installed)
+# gives it a faster CSV reader
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+# The only columns the filter needs; the wide targeting and spend columns are
+# never parsed by the vectorized backend
+FILTER_COLUMNS = ['Ad_ID', 'Ad_Type', 'Regions', 'Advertiser_ID', 'Date_Range_Start', 'Date_Range_End']
+
+VALID_AD_TYPES = ['VIDEO', 'IMAGE', 'TEXT']
 
 def read_csv(file_path):
     # Increase the field size limit to handle large fields
     csv.field_size_limit(sys.maxsize)
     
-    with open(file_path, mode='r', encoding='utf-8') as file:
+    # Yield rows one at a time so memory stays constant regardless of file size
+    with open(file_path, mode='r', encoding='utf-8', newline='') as file:
         reader = csv.reader(file)
-        data = [row for row in reader]
-    return data
+        for row in reader:
+            yield row
 
 def write_csv(file_path, data):
     with open(file_path, mode='w', encoding='utf-8', newline='') as file:
         writer = csv.writer(file)
         writer.writerows(data)
+
+def parse_date(date_string):
+    # Accept both YYYY-MM-DD and YYYYMMDD and return the date as an integer
+    return int(date_string.strip().replace('-', ''))
+
+def make_query(output_file, ad_type, start_date, end_date, region='US', row_limit=0):
+    # A query is one output slice: an ad type and region over a date window.
+    # Dates are integers (YYYYMMDD) and row_limit 0 means no limit
+    return {
+        'output_file': output_file,
+        'ad_type': ad_type,
+        'start_date': start_date,
+        'end_date': end_date,
+        'region': region,
+        'row_limit': row_limit,
+    }
+
+class QueryWriter:
+    """Writes the Creative ID/Advertiser ID pairs of one query, up to its row limit"""
+    def __init__(self, query):
+        self.query = query
+        self.count = 0
+        self.file = open(query['output_file'], mode='w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.file.close()
+    
+    @property
+    def full(self):
+        """True once the row limit has been reached"""
+        return 0 < self.query['row_limit'] <= self.count
+    
+    def write_rows(self, rows):
+        """Write rows, dropping any beyond the row limit"""
+        if self.query['row_limit'] > 0:
+            rows = itertools.islice(rows, self.query['row_limit'] - self.count)
+        for row in rows:
+            self.writer.writerow(row)
+            self.count += 1
+
+def stream_filter(input_file, queries):
+    # Filter the input row by row and write matches as they are found, so only
+    # the current row is ever held in memory. Every query is answered from the
+    # same single pass, and the scan stops once all of them hit their limits
+    with ExitStack() as stack:
+        writers = [stack.enter_context(QueryWriter(query)) for query in queries]
         
+        # Only the queries for a row's ad type and region need the date test
+        writers_by_key = {}
+        for writer in writers:
+            writers_by_key.setdefault((writer.query['ad_type'], writer.query['region']), []).append(writer)
+        open_writers = len(writers)
+        
+        for row in read_csv(input_file):
+            candidates = writers_by_key.get((row[2], row[3]))
+            if not candidates:
+                continue
+            
+            # Convert date strings to integers for comparison. An ad matches when
+            # its date range overlaps the window, including ads that span the
+            # whole window
+            int_start_date = parse_date(row[7])
+            int_end_date = parse_date(row[8])
+            for writer in candidates:
+                query = writer.query
+                if writer.full or int_start_date > query['end_date'] or int_end_date < query['start_date']:
+                    continue
+                # Keep only the Creative ID (column 0) and Advertiser ID (column 4)
+                writer.write_rows([[row[0], row[4]]])
+                if writer.full:
+                    open_writers -= 1
+            if open_writers == 0:
+                break
+        
+        return [writer.count for writer in writers]
+
+def read_filter_columns(file_path, chunksize=1_000_000):
+    # Yield DataFrames holding only the filter columns, with categoricals for
+    # Ad_Type/Regions and datetime64 for the date range
+    if pd is None:
+        raise ImportError("The pandas backend requires pandas (pip install pandas)")
     
-def main():    
-    input_file = input("Enter the input CSV file path for google-political-ads-creative-stats: ")
-    output_file = input("Enter the output CSV file path: ")
+    if pa is not None:
+        yield from read_filter_columns_arrow(file_path)
+        return
+    
+    chunks = pd.read_csv(
+        file_path,
+        usecols=FILTER_COLUMNS,
+        dtype={
+            'Ad_ID': str,
+            'Advertiser_ID': str,
+            'Ad_Type': 'category',
+            'Regions': 'category',
+            'Date_Range_Start': str,
+            'Date_Range_End': str,
+        },
+        chunksize=chunksize,
+    )
+    for chunk in chunks:
+        chunk['Date_Range_Start'] = pd.to_datetime(chunk['Date_Range_Start'], format='%Y-%m-%d')
+        chunk['Date_Range_End'] = pd.to_datetime(chunk['Date_Range_End'], format='%Y-%m-%d')
+        yield chunk
+
+def read_filter_columns_arrow(file_path, block_size=64 << 20):
+    # Streaming pyarrow reader: parses one block at a time, so memory stays
+    # bounded by block_size, and converts only the filter columns while
+    # reading (dictionary-encoded strings become categoricals). Unlike
+    # pa_csv.read_csv it does not parse blocks in parallel
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        # Some of the targeting fields contain quoted newlines
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=FILTER_COLUMNS,
+            column_types={
+                'Ad_ID': pa.string(),
+                'Advertiser_ID': pa.string(),
+                'Ad_Type': pa.dictionary(pa.int32(), pa.string()),
+                'Regions': pa.dictionary(pa.int32(), pa.string()),
+                'Date_Range_Start': pa.timestamp('s'),
+                'Date_Range_End': pa.timestamp('s'),
+            },
+        ),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+def to_timestamp(date):
+    # Integer YYYYMMDD -> pandas Timestamp
+    return pd.to_datetime(str(date), format='%Y%m%d')
+
+def to_date(date):
+    # Integer YYYYMMDD -> datetime.date
+    return datetime.date(date // 10000, date // 100 % 100, date % 100)
+
+def to_month(date):
+    # Integer YYYYMMDD -> "YYYY-MM", the Start_Month partition value
+    return f"{date // 10000:04d}-{date // 100 % 100:02d}"
+
+def filter_mask(frame, query):
+    # Evaluate the whole predicate as boolean masks over the frame
+    start = to_timestamp(query['start_date'])
+    end = to_timestamp(query['end_date'])
+    
+    mask = (frame['Ad_Type'] == query['ad_type']) & (frame['Regions'] == query['region'])
+    mask &= (frame['Date_Range_Start'] <= end) & (frame['Date_Range_End'] >= start)
+    return mask
+
+def vectorized_filter(input_file, queries, chunksize=1_000_000):
+    # Same output as stream_filter, evaluated a chunk at a time with pandas
+    with ExitStack() as stack:
+        writers = [stack.enter_context(QueryWriter(query)) for query in queries]
+        for chunk in read_filter_columns(input_file, chunksize=chunksize):
+            for writer in writers:
+                if not writer.full:
+                    matches = chunk.loc[filter_mask(chunk, writer.query), ['Ad_ID', 'Advertiser_ID']]
+                    writer.write_rows(matches.itertuples(index=False, name=None))
+            if all(writer.full for writer in writers):
+                break
+        return [writer.count for writer in writers]
+
+def arrow_mask(batch, query):
+    # Same predicate as filter_mask, for an Arrow record batch
+    start = pa.scalar(to_date(query['start_date']), pa.date32())
+    end = pa.scalar(to_date(query['end_date']), pa.date32())
+    return pc.and_(
+        pc.and_(pc.equal(batch.column('Ad_Type'), query['ad_type']), pc.equal(batch.column('Regions'), query['region'])),
+        pc.and_(pc.less_equal(batch.column('Date_Range_Start'), end), pc.greater_equal(batch.column('Date_Range_End'), start)),
+    )
+
+def parquet_filter(input_dir, queries):
+    # Query the creative-stats table written by ingest_bundle.py. The Ad_Type and
+    # Start_Month partitions prune whole directories, the remaining predicates
+    # are pushed down to Parquet row-group statistics, and only the filter
+    # columns are ever decoded. The scan covers the union of all queries and
+    # each batch is then split per query
+    if pa is None:
+        raise ImportError("The parquet backend requires pyarrow (pip install pyarrow)")
+    
+    from ingest_bundle import CREATIVE_PARTITIONING, read_max_ad_days
+    
+    start_date = min(query['start_date'] for query in queries)
+    start = pa.scalar(to_date(start_date), pa.date32())
+    end_date = max(query['end_date'] for query in queries)
+    end = pa.scalar(to_date(end_date), pa.date32())
+    
+    # Ads that start after the window can never match, so later months are
+    # pruned. So are months before the window by more than the longest ad run,
+    # when the store records it
+    expression = (
+        ds.field('Ad_Type').isin(sorted({query['ad_type'] for query in queries}))
+        & (ds.field('Start_Month') <= to_month(end_date))
+        & ds.field('Regions').isin(sorted({query['region'] for query in queries}))
+        & (ds.field('Date_Range_Start') <= end)
+        & (ds.field('Date_Range_End') >= start)
+    )
+    max_ad_days = read_max_ad_days(input_dir)
+    if max_ad_days is not None:
+        earliest_start = to_date(start_date) - datetime.timedelta(days=max_ad_days)
+        expression &= ds.field('Start_Month') >= earliest_start.strftime('%Y-%m')
+    dataset = ds.dataset(input_dir, format='parquet', partitioning=CREATIVE_PARTITIONING)
+    
+    with ExitStack() as stack:
+        writers = [stack.enter_context(QueryWriter(query)) for query in queries]
+        for batch in dataset.to_batches(columns=FILTER_COLUMNS, filter=expression):
+            for writer in writers:
+                if not writer.full:
+                    matches = batch.filter(arrow_mask(batch, writer.query))
+                    writer.write_rows(zip(matches.column('Ad_ID').to_pylist(), matches.column('Advertiser_ID').to_pylist()))
+            if all(writer.full for writer in writers):
+                break
+        return [writer.count for writer in writers]
 
-    # read data from CSV
-    data = read_csv(input_file)
+def index_filter(input_file, queries):
+    # Answer each query from the persisted interval index next to the CSV
+    # (built on first use), reading back only the matching rows
+    from creative_index import IntervalIndex
+    
+    index = IntervalIndex.open(input_file)
+    counts = []
+    for query in queries:
+        offsets = index.query(query['ad_type'], query['start_date'], query['end_date'], query['region'])
+        with QueryWriter(query) as writer:
+            writer.write_rows([row[0], row[4]] for row in index.read_rows(offsets))
+        counts.append(writer.count)
+    return counts
+
+BACKENDS = {
+    'stream': stream_filter,
+    'pandas': vectorized_filter,
+    'parquet': parquet_filter,
+    'index': index_filter,
+}
+
+def read_query_file(file_path):
+    # Queries from a CSV with columns output_file, start_date, end_date, ad_type
+    # and optionally region (default US) and row_limit (default 0)
+    queries = []
+    with open(file_path, mode='r', encoding='utf-8', newline='') as file:
+        for row in csv.DictReader(file):
+            queries.append(make_query(
+                row['output_file'],
+                row['ad_type'].strip().upper(),
+                parse_date(row['start_date']),
+                parse_date(row['end_date']),
+                (row.get('region') or 'US').strip(),
+                int(row.get('row_limit') or 0),
+            ))
+    return queries
+
+def expand_queries(output_template, windows, ad_types, regions, row_limit):
+    # Every combination of date window x ad type x region. The output path is
+    # formatted with {ad_type}, {region}, {start_date} and {end_date}
+    queries = []
+    for (start_date, end_date), ad_type, region in itertools.product(windows, ad_types, regions):
+        output_file = output_template.format(ad_type=ad_type, region=region, start_date=start_date, end_date=end_date)
+        queries.append(make_query(output_file, ad_type, start_date, end_date, region, row_limit))
+    return queries
+
+def parse_window(text):
+    # "START:END" -> (start_date, end_date)
+    start, _, end = text.partition(':')
+    if not end:
+        raise argparse.ArgumentTypeError(f"expected START:END, got {text!r}")
+    return parse_date(start), parse_date(end)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Filter google-political-ads-creative-stats into Creative_ID,Advertiser_ID CSVs. "
+                    "Run without arguments for interactive prompts.",
+    )
+    parser.add_argument('input', help="creative-stats CSV, or its Parquet store directory for the parquet backend")
+    parser.add_argument('--backend', choices=list(BACKENDS), default='stream')
+    parser.add_argument('--queries', metavar='FILE',
+                        help="CSV of queries (output_file,start_date,end_date,ad_type[,region][,row_limit]) answered in one pass")
+    parser.add_argument('-o', '--output', metavar='PATH',
+                        help="output path; with several windows/types/regions use {ad_type}, {region}, {start_date} and {end_date}")
+    parser.add_argument('--window', metavar='START:END', type=parse_window, action='append',
+                        help="date window, e.g. 2024-10-01:2024-10-31 (repeatable)")
+    parser.add_argument('--ad-type', action='append', type=str.upper, choices=VALID_AD_TYPES,
+                        help="ad type (repeatable, default VIDEO)")
+    parser.add_argument('--region', action='append', help="region (repeatable, default US)")
+    parser.add_argument('--limit', type=int, default=0, help="row limit per query (0 for no limit)")
+    args = parser.parse_args(argv)
+    
+    if args.queries:
+        args.query_list = read_query_file(args.queries)
+    elif args.output and args.window:
+        args.query_list = expand_queries(args.output, args.window, args.ad_type or ['VIDEO'], args.region or ['US'], args.limit)
+    else:
+        parser.error("either --queries or both --output and --window are required")
+    
+    outputs = [query['output_file'] for query in args.query_list]
+    if len(set(outputs)) != len(outputs):
+        parser.error("every query needs its own output file")
+    for query in args.query_list:
+        if query['ad_type'] not in VALID_AD_TYPES:
+            parser.error(f"invalid ad type {query['ad_type']!r}, choose from {VALID_AD_TYPES}")
+    return args
+
+def prompt_query():
+    # Interactive mode: ask for a single query
+    input_file = input("Enter the input CSV file path for google-political-ads-creative-stats (or its Parquet store directory): ")
+    output_file = input("Enter the output CSV file path: ")
     
     # get start data from the user
-    start_date = int(input("Enter the starting date (YYYY-MM-DD): "))
+    start_date = parse_date(input("Enter the starting date (YYYY-MM-DD): "))
 
     # get the end date from the user
-    end_date = int(input("Enter the ending date (YYYY-MM-DD): "))
+    end_date = parse_date(input("Enter the ending date (YYYY-MM-DD): "))
     
     # Enter the type of data to filter. Options are VIDEO, IMAGE, TEXT
     ad_type = input("Enter the type of ad to filter (e.g., VIDEO, IMAGE, TEXT): ").upper()
 
     # Validate ad_type
-    valid_ad_types = ['VIDEO', 'IMAGE', 'TEXT']
-    if ad_type not in valid_ad_types:
-        print(f"Invalid ad type. Please choose from {valid_ad_types}.")
-        return
+    if ad_type not in VALID_AD_TYPES:
+        print(f"Invalid ad type. Please choose from {VALID_AD_TYPES}.")
+        return None
     
     # Enter a limit for the number of rows to print (0 for no limit)
     row_limit = int(input("Enter a limit for the number of rows to print (0 for no limit): "))
-
-    filtered_rows = []
     
-    for row in data:
-        if row[2] == ad_type and row[3] == 'US':
-            # Convert date strings to integers for comparison
-            int_start_date = int(row[7].replace('-', ''))
-            int_end_date = int(row[8].replace('-', ''))
-            if start_date <= int_start_date <= end_date or start_date <= int_end_date <= end_date:
-                # Filter only the first and fifth columns
-                # Assuming the first column is the creative ID and the fifth is the advertiser ID
-                filtered_row = [row[0], row[4]]
-                filtered_rows.append(filtered_row)
+    # Choose how the filter is evaluated: row by row, vectorized with pandas,
+    # from a Parquet store, or through the interval index
+    backend = input(f"Enter the filter backend {list(BACKENDS)} (default stream): ").strip().lower() or 'stream'
+    if backend not in BACKENDS:
+        print(f"Invalid backend. Please choose from {list(BACKENDS)}.")
+        return None
+    
+    return input_file, backend, [make_query(output_file, ad_type, start_date, end_date, row_limit=row_limit)]
+    
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        args = parse_args(argv)
+        input_file, backend, queries = args.input, args.backend, args.query_list
+    else:
+        prompted = prompt_query()
+        if prompted is None:
+            return
+        input_file, backend, queries = prompted
 
-    write_csv(output_file, data=filtered_rows[:row_limit] if row_limit > 0 else filtered_rows)
-    print(f"Written {len(filtered_rows)} rows with columns 0 and 4 to {output_file} from {input_file} from date {start_date} to {end_date}")
+    counts = BACKENDS[backend](input_file, queries)
+    for query, count in zip(queries, counts):
+        print(f"Written {count} rows with columns 0 and 4 to {query['output_file']} from {input_file} "
+              f"({query['ad_type']}, {query['region']}) from date {query['start_date']} to {query['end_date']}")
 
 
 if __name__ == "__main__":
     main()
-    
-    
\ No newline at end of file
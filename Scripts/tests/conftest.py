@@ -0,0 +1,6 @@
+# The scripts and the ad_scraper package are imported from Scripts/, which is
+# where they are run from
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
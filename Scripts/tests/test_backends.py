@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from ad_scraper.backends import Backend, CachedBackend, ChainBackend
+from ad_scraper.cache import VideoCache
+from ad_scraper.common import NETWORK_ERROR, PARSE_ERROR, RATE_LIMITED, TIMEOUT, ScrapeFailure
+
+class StubBackend(Backend):
+    """Answers every creative with video_id, or raises a failure with outcome"""
+    def __init__(self, name, video_id=None, outcome=None):
+        super().__init__()
+        self.name = name
+        self.video_id = video_id
+        self.outcome = outcome
+        self.calls = 0
+
+    async def extract(self, cr, ar):
+        self.calls += 1
+        if self.outcome:
+            failure = ScrapeFailure(self.outcome)
+            failure.stages = {self.name: 0.1}
+            raise failure
+        return self.result(self.video_id, stages={self.name: 0.1})
+
+def extract(backend):
+    return asyncio.run(backend.extract('CR1', 'AR1'))
+
+@pytest.mark.parametrize('outcome', [RATE_LIMITED, NETWORK_ERROR, TIMEOUT])
+def test_chain_raises_transient_failures_without_trying_the_next_backend(outcome):
+    browser = StubBackend('browser', 'video-id')
+    chain = ChainBackend([StubBackend('http', outcome=outcome), browser])
+    with pytest.raises(ScrapeFailure) as failure:
+        extract(chain)
+    assert failure.value.outcome == outcome
+    assert failure.value.stages == {'http': 0.1}
+    assert browser.calls == 0
+
+@pytest.mark.parametrize('http', [StubBackend('http', outcome=PARSE_ERROR), StubBackend('http')])
+def test_chain_falls_through_parse_errors_and_misses(http):
+    result = extract(ChainBackend([http, StubBackend('browser', 'video-id')]))
+    assert result['video_id'] == 'video-id'
+    assert result['backend'] == 'browser'
+    assert result['stages'] == {'http': 0.1, 'browser': 0.1}
+
+@pytest.fixture
+def cache(tmp_path):
+    with VideoCache(str(tmp_path / 'videos.sqlite3')) as cache:
+        yield cache
+
+def test_http_miss_is_not_cached_so_a_browser_run_still_scrapes(cache):
+    assert extract(CachedBackend(StubBackend('http'), cache))['video_id'] is None
+    browser = StubBackend('playwright', 'video-id')
+    result = extract(CachedBackend(browser, cache))
+    assert (result['video_id'], result['backend'], browser.calls) == ('video-id', 'playwright', 1)
+
+def test_http_miss_cached_by_an_older_run_is_ignored(cache):
+    cache.store('CR1', 'AR1', None, 'http')
+    browser = StubBackend('playwright')
+    extract(CachedBackend(browser, cache))
+    assert browser.calls == 1
+
+@pytest.mark.parametrize('spec', ['playwright', 'http+playwright'])
+def test_browser_miss_is_answered_from_the_cache(cache, spec):
+    stages = [StubBackend(name) for name in spec.split('+')]
+    backend = stages[0] if len(stages) == 1 else ChainBackend(stages)
+    extract(CachedBackend(backend, cache))
+    result = extract(CachedBackend(backend, cache))
+    assert (result['video_id'], result['backend']) == (None, 'cache')
+    assert [stage.calls for stage in stages] == [1] * len(stages)
+
+def test_playwright_close_after_failed_launch_raises_the_launch_error(monkeypatch):
+    playwright_backend = pytest.importorskip('ad_scraper.playwright_backend')
+
+    async def no_browser(playwright):
+        raise RuntimeError("no browser installed")
+
+    async def start_and_close():
+        backend = playwright_backend.PlaywrightBackend()
+        try:
+            await backend.start()
+        finally:
+            await backend.close()
+        return backend
+
+    monkeypatch.setattr(playwright_backend, 'create_webkit_browser', no_browser)
+    with pytest.raises(RuntimeError, match="no browser installed"):
+        asyncio.run(start_and_close())
+
+def test_selenium_browsers_are_launched_with_the_proxies_given(monkeypatch):
+    selenium_backend = pytest.importorskip('ad_scraper.selenium_backend')
+    # A "browser" is the proxy it was launched with
+    monkeypatch.setattr(selenium_backend.BrowserPool, '_create_browser', lambda pool: pool._get_next_proxy())
+
+    backend = selenium_backend.SeleniumBackend(pool_size=3, proxies=['10.0.0.1:8080', '10.0.0.2:8080'])
+    asyncio.run(backend.start())
+    browsers = [backend.browser_pool.browsers.get_nowait() for _ in range(3)]
+    assert browsers == ['10.0.0.1:8080', '10.0.0.2:8080', '10.0.0.1:8080']
+
+def test_selenium_browsers_are_launched_through_a_geckodriver_service(monkeypatch):
+    selenium_backend = pytest.importorskip('ad_scraper.selenium_backend')
+    launched = []
+    monkeypatch.setattr(selenium_backend.webdriver, 'Firefox', lambda **kwargs: launched.append(kwargs))
+
+    pool = selenium_backend.BrowserPool(pool_size=1, firefox_binary='/opt/firefox/firefox',
+                                        geckodriver='/opt/geckodriver')
+    assert len(launched) == 1 and pool.browsers.qsize() == 1
+    assert set(launched[0]) == {'options', 'service'}
+    assert launched[0]['service'].path == '/opt/geckodriver'
+    assert launched[0]['options'].binary_location == '/opt/firefox/firefox'
@@ -0,0 +1,71 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import cleaning_duplicates_meta
+from cleaning_duplicates_meta import SeenBodyIndex, dedup_parallel, dedup_streaming, main
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+EXPORT = os.path.join(FIXTURES, 'meta_export.csv')
+HEADER_ONLY = os.path.join(FIXTURES, 'meta_header_only.csv')
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+def test_streaming_keeps_first_of_each_body(tmp_path):
+    output = tmp_path / 'cleaned.csv'
+    assert dedup_streaming(EXPORT, output, chunksize=2) == (5, 3)
+    assert list(pd.read_csv(output)['id']) == [1, 2, 4]
+
+def test_streaming_header_only_export_keeps_header(tmp_path):
+    output = tmp_path / 'cleaned.csv'
+    assert dedup_streaming(HEADER_ONLY, output) == (0, 0)
+    assert read_lines(output) == read_lines(HEADER_ONLY)
+
+def test_parallel_skips_header_only_exports(tmp_path):
+    inputs = [tmp_path / 'a_header_only.csv', tmp_path / 'b_export.csv', tmp_path / 'c_export.csv']
+    shutil.copy(HEADER_ONLY, inputs[0])
+    shutil.copy(EXPORT, inputs[1])
+    shutil.copy(EXPORT, inputs[2])
+    output = tmp_path / 'cleaned.csv'
+    assert dedup_parallel([str(path) for path in inputs], str(output), chunksize=2, workers=2) == (10, 3)
+    assert list(pd.read_csv(output)['id']) == [1, 2, 4]
+
+def test_parallel_header_only_exports_only(tmp_path):
+    output = tmp_path / 'cleaned.csv'
+    assert dedup_parallel([HEADER_ONLY, HEADER_ONLY], str(output), workers=2) == (0, 0)
+    assert read_lines(output) == read_lines(HEADER_ONLY)
+
+@pytest.mark.parametrize('pattern', ['empty_dir', 'empty_dir/*.csv', 'missing.csv'])
+def test_no_matching_inputs_is_reported(tmp_path, capsys, pattern):
+    (tmp_path / 'empty_dir').mkdir()
+    output = tmp_path / 'cleaned.csv'
+    main([str(tmp_path / pattern), '-o', str(output)])
+    assert "No CSV files matched" in capsys.readouterr().out
+    assert not output.exists()
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_index_second_run_writes_only_new_bodies(tmp_path, monkeypatch, parallel):
+    # Small batches, so a run spans several SELECT/INSERT batches
+    monkeypatch.setattr(cleaning_duplicates_meta, 'INDEX_BATCH', 2)
+    second_export = tmp_path / 'second_export.csv'
+    data = pd.read_csv(EXPORT)
+    new_rows = pd.DataFrame([dict(data.iloc[0], id=6, ad_creative_bodies="Every vote counts"),
+                             dict(data.iloc[0], id=7), dict(data.iloc[0], id=8, ad_creative_bodies="Every vote counts"),
+                             dict(data.iloc[0], id=9, ad_creative_bodies="Fund the parks")])
+    pd.concat([data.iloc[[1]], new_rows]).to_csv(second_export, index=False)
+
+    index = str(tmp_path / 'seen.sqlite')
+    for export, expected_rows, expected_ids in [(EXPORT, (5, 3), [1, 2, 4]), (str(second_export), (5, 2), [6, 9])]:
+        output = tmp_path / 'cleaned.csv'
+        with SeenBodyIndex(index) as seen:
+            if parallel:
+                assert dedup_parallel([export], str(output), chunksize=2, workers=1, seen=seen) == expected_rows
+            else:
+                assert dedup_streaming(export, output, chunksize=2, seen=seen) == expected_rows
+        assert list(pd.read_csv(output)['id']) == expected_ids
+    with SeenBodyIndex(index) as seen:
+        assert len(seen) == 5
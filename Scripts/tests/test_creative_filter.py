@@ -0,0 +1,142 @@
+import csv
+import os
+import random
+
+import pytest
+
+import scraping_creative
+from creative_index import IntervalIndex
+from scraping_creative import BACKENDS, main, make_query, parse_date, to_date
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+CREATIVE_STATS = os.path.join(FIXTURES, 'creative_stats.csv')
+
+# (start_date, end_date): the fixture's ads span this window, end on its start
+# day, start on its end day, start months before it, or run exactly over it
+WINDOWS = [
+    (20241001, 20241031),
+    (20241001, 20241001),
+    (20241031, 20241031),
+    (20240601, 20240605),
+    (20250201, 20250301),
+]
+
+def read_rows(path):
+    with open(path, mode='r', encoding='utf-8', newline='') as file:
+        return list(csv.reader(file))
+
+def brute_force(start_date, end_date, ad_type='VIDEO', region='US'):
+    # The pairs of every ad of the type and region whose run overlaps the window
+    return sorted((row[0], row[4]) for row in read_rows(CREATIVE_STATS)[1:]
+                  if row[2] == ad_type and row[3] == region
+                  and parse_date(row[7]) <= end_date and parse_date(row[8]) >= start_date)
+
+def run_backend(tmp_path, backend, input_path, start_date, end_date, ad_type='VIDEO'):
+    output = str(tmp_path / f"{backend}_{ad_type}_{start_date}_{end_date}.csv")
+    count, = BACKENDS[backend](input_path, [make_query(output, ad_type, start_date, end_date)])
+    rows = sorted(tuple(row) for row in read_rows(output))
+    assert count == len(rows)
+    return rows
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_stream_matches_brute_force(tmp_path, window):
+    assert run_backend(tmp_path, 'stream', CREATIVE_STATS, *window) == brute_force(*window)
+
+def test_stream_answers_every_query_up_to_its_limit(tmp_path):
+    queries = [make_query(str(tmp_path / f"{i}.csv"), ad_type, *window, row_limit=limit)
+               for i, (ad_type, window, limit) in enumerate([('VIDEO', WINDOWS[0], 0), ('IMAGE', WINDOWS[0], 0),
+                                                               ('VIDEO', WINDOWS[0], 2), ('TEXT', WINDOWS[1], 0)])]
+    counts = BACKENDS['stream'](CREATIVE_STATS, queries)
+    expected = [brute_force(*WINDOWS[0]), brute_force(*WINDOWS[0], 'IMAGE'),
+                brute_force(*WINDOWS[0])[:2], brute_force(*WINDOWS[1], 'TEXT')]
+    assert counts == [len(pairs) for pairs in expected]
+    outputs = [sorted(tuple(row) for row in read_rows(query['output_file'])) for query in queries]
+    assert outputs[:2] + outputs[3:] == expected[:2] + expected[3:]
+    # The first matches in file order
+    assert outputs[2] == expected[2]
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_pandas_matches_brute_force(tmp_path, monkeypatch, window):
+    pytest.importorskip('pandas')
+    # Without pyarrow, pandas' own chunked reader is used
+    monkeypatch.setattr(scraping_creative, 'pa', None)
+    assert run_backend(tmp_path, 'pandas', CREATIVE_STATS, *window) == brute_force(*window)
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_pyarrow_reader_matches_brute_force(tmp_path, window):
+    pytest.importorskip('pandas')
+    pytest.importorskip('pyarrow')
+    assert run_backend(tmp_path, 'pandas', CREATIVE_STATS, *window) == brute_force(*window)
+
+@pytest.fixture
+def parquet_store(tmp_path):
+    pytest.importorskip('pyarrow')
+    from ingest_bundle import ingest_file
+    store = str(tmp_path / 'store' / 'creative-stats')
+    ingest_file(CREATIVE_STATS, store)
+    return store
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_parquet_matches_brute_force(tmp_path, parquet_store, window):
+    assert run_backend(tmp_path, 'parquet', parquet_store, *window) == brute_force(*window)
+
+def test_parquet_store_records_longest_run(parquet_store):
+    from ingest_bundle import read_max_ad_days
+    runs = [(to_date(parse_date(row[7])), to_date(parse_date(row[8]))) for row in read_rows(CREATIVE_STATS)[1:]]
+    assert read_max_ad_days(parquet_store) == max((end - start).days for start, end in runs)
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_index_matches_brute_force(tmp_path, window):
+    input_path = str(tmp_path / 'creative_stats.csv')
+    with open(CREATIVE_STATS, mode='rb') as source, open(input_path, mode='wb') as copy:
+        copy.write(source.read())
+    assert run_backend(tmp_path, 'index', input_path, *window) == brute_force(*window)
+    assert run_backend(tmp_path, 'index', input_path, *window, 'IMAGE') == brute_force(*window, 'IMAGE')
+
+def write_random_stats(path, count, rng):
+    # Ads with random runs of 0 to 120 days over two years
+    with open(path, mode='w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Ad_ID', 'Ad_URL', 'Ad_Type', 'Regions', 'Advertiser_ID', 'Advertiser_Name',
+                         'Ad_Campaigns_List', 'Date_Range_Start', 'Date_Range_End'])
+        days = [year * 10000 + month * 100 + day for year in (2023, 2024) for month in range(1, 13) for day in range(1, 29)]
+        for i in range(count):
+            start = rng.randrange(len(days))
+            end = min(start + rng.randrange(120), len(days) - 1)
+            writer.writerow([f"CR{i:020d}", '', 'VIDEO', 'US', 'AR1', '', '', days[start], days[end]])
+    return days
+
+@pytest.mark.parametrize('count', [1, 2, 15, 16, 17, 300])
+def test_overlapping_matches_brute_force(tmp_path, count):
+    rng = random.Random(count)
+    input_path = str(tmp_path / 'random_stats.csv')
+    days = write_random_stats(input_path, count, rng)
+    index = IntervalIndex.build(input_path)
+    runs = [(int(row[7]), int(row[8])) for row in read_rows(input_path)[1:]]
+    by_start = sorted(runs, key=lambda run: run[0])
+    for _ in range(200):
+        start, end = sorted(rng.sample(days, 2))
+        found = sorted((index.starts[i], index.ends[i] - 1) for i in index.overlapping(start, end))
+        assert found == sorted(run for run in by_start if run[0] <= end and run[1] >= start)
+
+def test_empty_index(tmp_path):
+    input_path = str(tmp_path / 'header_only.csv')
+    with open(CREATIVE_STATS, mode='r', encoding='utf-8', newline='') as file:
+        header = file.readline()
+    with open(input_path, mode='w', encoding='utf-8', newline='') as file:
+        file.write(header)
+    index = IntervalIndex.open(input_path)
+    assert len(index) == 0
+    assert index.overlapping(20240101, 20241231) == []
+    assert IntervalIndex.load(input_path, f"{input_path}.idx").query('VIDEO', 20240101, 20241231) == []
+    assert run_backend(tmp_path, 'index', input_path, 20240101, 20241231) == []
+
+def test_cli_writes_every_window_and_type(tmp_path, capsys):
+    output = str(tmp_path / '{ad_type}_{start_date}_{end_date}.csv')
+    main([CREATIVE_STATS, '--backend', 'stream', '-o', output, '--window', '2024-10-01:2024-10-31',
+          '--window', '20241031:20241031', '--ad-type', 'video', '--ad-type', 'IMAGE'])
+    for start_date, end_date in [WINDOWS[0], WINDOWS[2]]:
+        for ad_type in ['VIDEO', 'IMAGE']:
+            rows = read_rows(output.format(ad_type=ad_type, start_date=start_date, end_date=end_date))
+            assert sorted(tuple(row) for row in rows) == brute_force(start_date, end_date, ad_type)
+    assert capsys.readouterr().out.count("Written") == 4
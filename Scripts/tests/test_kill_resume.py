@@ -0,0 +1,84 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from mock_transparency_server import MockTransparencyServer, make_creatives
+
+pytest.importorskip('playwright')
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CREATIVES = 300
+WORKERS = 4
+# checkpoint_every of the CLI's tracker, plus the results that can complete
+# within its one-second checkpoint poll at the mock's pace
+LOST_AT_MOST = 50 + 30
+
+def read_videos(path):
+    # {cr: video_id} of an output CSV, and its number of rows; a row torn by
+    # the kill is left out
+    videos, rows = {}, 0
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in list(csv.reader(f))[1:]:
+            if len(row) == 3 and len(row[2]) == 11:
+                videos[row[0]] = row[2]
+                rows += 1
+    return videos, rows
+
+def read_journal(path):
+    videos = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record['video_id']:
+                videos[record['cr']] = record['video_id']
+    return videos
+
+def test_killed_run_resumes_without_losing_or_repeating_results(tmp_path):
+    urls = make_creatives(CREATIVES)
+    input_file = tmp_path / 'slice.csv'
+    with open(input_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Creative_ID', 'Advertiser_ID'])
+        writer.writerows(urls)
+    output_file = tmp_path / 'video_ids_slice.csv'
+    mapping_file = tmp_path / 'video_ids_slice.videos.csv'
+    journal_file = tmp_path / 'progress_slice.jsonl'
+
+    with MockTransparencyServer(median_latency=0.8) as mock:
+        command = [sys.executable, '-m', 'ad_scraper', str(input_file), '--backend', 'http',
+                   '--base-url', mock.base_url, '--workers', str(WORKERS), '--initial-concurrency', str(WORKERS),
+                   '--no-cache', '--quiet']
+        run = subprocess.Popen(command, cwd=SCRIPTS, stdout=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 120
+            while time.monotonic() < deadline and run.poll() is None:
+                if output_file.exists() and read_videos(output_file)[1] >= 100:
+                    break
+                time.sleep(0.05)
+            assert run.poll() is None, "the run finished before it could be killed"
+            run.kill()
+        finally:
+            run.wait()
+
+        found, _ = read_videos(output_file)
+        journaled = read_journal(journal_file)
+        assert journaled.items() <= found.items()
+        assert len(journaled) >= len(found) - LOST_AT_MOST
+
+        subprocess.run(command, cwd=SCRIPTS, stdout=subprocess.DEVNULL, check=True, timeout=300)
+        expected = {cr: video_id for cr, video_id in mock.expected_results(urls).items() if video_id}
+
+    videos, rows = read_videos(output_file)
+    assert videos == expected
+    assert rows == len(expected)
+    with open(mapping_file, encoding='utf-8', newline='') as f:
+        mapping = list(csv.reader(f))[1:]
+    assert sorted((cr, video_id) for video_id, cr, _, _ in mapping) == sorted(expected.items())
@@ -0,0 +1,40 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from ad_scraper.metrics import Metrics, MetricsServer
+
+def parse_samples(text):
+    # {series name with labels: value} of a Prometheus text exposition
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, _, value = line.rpartition(' ')
+            samples[name] = float(value)
+    return samples
+
+def test_metrics_endpoint_serves_counts(tmp_path):
+    metrics = Metrics(buckets=(0.1, 1.0))
+    for backend, outcome, seconds in [('http', 'video', 0.05), ('http', 'video', 0.5), ('http', 'timeout', 30.0),
+                                      ('playwright', 'not_video', 2.0)]:
+        metrics.begin()
+        metrics.end(backend, outcome, seconds, {'navigation': seconds / 2})
+    metrics.begin()
+
+    with MetricsServer(metrics, 0) as server:
+        with urllib.request.urlopen(server.url, timeout=10) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            samples = parse_samples(response.read().decode('utf-8'))
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(server.url.replace('/metrics', '/other'), timeout=10)
+
+    assert samples['scraper_creatives_total{backend="http",outcome="video"}'] == 2
+    assert samples['scraper_creatives_total{backend="http",outcome="timeout"}'] == 1
+    assert samples['scraper_creatives_total{backend="playwright",outcome="not_video"}'] == 1
+    assert samples['scraper_stage_seconds_count{stage="total"}'] == 4
+    assert samples['scraper_stage_seconds_sum{stage="total"}'] == pytest.approx(32.55)
+    assert [samples[f'scraper_stage_seconds_bucket{{stage="total",le="{le}"}}'] for le in ('0.1', '1', '+Inf')] == [1, 2, 4]
+    assert [samples[f'scraper_stage_seconds_bucket{{stage="navigation",le="{le}"}}'] for le in ('0.1', '1', '+Inf')] == [1, 3, 4]
+    assert samples['scraper_in_flight'] == 1
+    assert 'scraper_concurrency_limit' not in samples
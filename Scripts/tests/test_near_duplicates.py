@@ -0,0 +1,32 @@
+import numpy as np
+
+from near_duplicates import NearDuplicateIndex
+
+class FixedSignatures(NearDuplicateIndex):
+    """Index whose bodies are their MinHash signatures, written as 'v1 v2 ...'"""
+    def signature(self, text):
+        return np.array([int(value) for value in text.split()], dtype=np.uint32)
+
+def test_near_duplicates_behind_a_dissimilar_bucket_owner_are_merged():
+    # 2 bands of 2 rows; the first body fills the first band's bucket of both
+    # near-duplicates but is similar to neither of them
+    index = FixedSignatures(threshold=0.75, num_perm=4)
+    assert (index.bands, index.rows) == (2, 2)
+    index.add('1 2 9 9')
+    index.add('1 2 3 4')
+    index.add('1 2 3 5')
+    assert index.clusters() == [0, 1, 1]
+
+def test_identical_signatures_join_the_first_body():
+    index = FixedSignatures(threshold=0.75, num_perm=4)
+    for text in ('1 2 3 4', '5 6 7 8', '1 2 3 4', '1 2 3 4'):
+        index.add(text)
+    assert index.clusters() == [0, 1, 0, 0]
+    assert sum(len(members) for bucket in index.buckets for members in bucket.values()) == 4
+
+def test_near_duplicate_bodies_cluster():
+    index = NearDuplicateIndex()
+    index.add("Shop the summer sale today! https://example.com/sale?utm_source=fb")
+    index.add("Something else entirely, about insurance quotes for drivers")
+    index.add("SHOP the summer sale today https://example.com/sale?utm_source=ig")
+    assert index.clusters() == [0, 1, 0]
@@ -0,0 +1,73 @@
+import json
+import random
+
+import pytest
+
+from ad_scraper import tracker
+from ad_scraper.common import NOT_VIDEO, RATE_LIMITED, TIMEOUT, VIDEO
+from ad_scraper.processed import ProcessedSet
+from ad_scraper.tracker import ProgressTracker
+
+def random_pairs(rng, count):
+    # Mostly usual Creative IDs over a few advertisers, with repeats and some
+    # IDs the records cannot hold
+    pairs = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.1 and pairs:
+            pairs.append(rng.choice(pairs))
+        elif kind < 0.15:
+            pairs.append((rng.choice(['CR12', 'CR' + '1' * 21, 'XR' + '0' * 20, 'CR' + '٣' * 20]),
+                          f"AR{rng.randrange(3)}"))
+        else:
+            pairs.append((f"CR{rng.randrange(10**20):020d}", f"AR{rng.randrange(50):020d}"))
+    return pairs
+
+def test_add_many_and_contains_many_match_add_and_in(tmp_path):
+    rng = random.Random(0)
+    one_by_one, batched = ProcessedSet(merge_every=16), ProcessedSet(merge_every=16)
+    for _ in range(5):
+        pairs = random_pairs(rng, 300)
+        assert batched.add_many(pairs) == [one_by_one.add(pair) for pair in pairs]
+        queries = pairs[::3] + random_pairs(rng, 100)
+        assert batched.contains_many(queries) == [pair in one_by_one for pair in queries]
+    assert sorted(batched) == sorted(one_by_one)
+
+    batched.save(str(tmp_path / 'snapshot'))
+    loaded = ProcessedSet.load(str(tmp_path / 'snapshot'))
+    encoded = [pair for pair in one_by_one if pair not in one_by_one.other]
+    assert loaded.contains_many(encoded) == [True] * len(encoded)
+
+def random_journal(rng, count, max_attempts):
+    # Lines as runs with retries write them, plus repeats a crash can leave
+    pairs = random_pairs(rng, count // 3)
+    lines = []
+    for _ in range(count):
+        cr, ar = rng.choice(pairs)
+        outcome = rng.choice([VIDEO, NOT_VIDEO, TIMEOUT, RATE_LIMITED, None])
+        video_id = f"v{rng.randrange(10**6):010d}" if outcome == VIDEO else None
+        record = {'cr': cr, 'ar': ar, 'video_id': video_id}
+        if outcome:
+            record.update(outcome=outcome, attempts=rng.randrange(1, max_attempts + 1))
+        lines.append(json.dumps(record) + '\n')
+    return lines
+
+@pytest.mark.parametrize('chunk', [7, tracker.REPLAY_CHUNK])
+def test_replay_matches_applying_each_line(tmp_path, monkeypatch, chunk):
+    monkeypatch.setattr(tracker, 'REPLAY_CHUNK', chunk)
+    lines = random_journal(random.Random(1), 2000, tracker.MAX_ATTEMPTS)
+    (tmp_path / 'progress.jsonl').write_text(''.join(lines) + '{"cr": "CR1', encoding='utf-8')
+
+    expected = ProgressTracker(str(tmp_path / 'expected.json'))
+    for line in lines:
+        record = json.loads(line)
+        expected._apply(record['cr'], record['ar'], record['video_id'], record.get('outcome'),
+                        record.get('attempts', 1))
+    expected.close()
+
+    replayed = ProgressTracker(str(tmp_path / 'progress.json'))
+    replayed.close()
+    assert sorted(replayed.processed_urls) == sorted(expected.processed_urls)
+    assert replayed.failures == expected.failures
+    assert replayed.sink.results == expected.sink.results
+    assert replayed.videos == expected.videos
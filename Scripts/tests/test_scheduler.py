@@ -0,0 +1,47 @@
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from ad_scraper import scheduler
+from ad_scraper.backends import Backend
+from ad_scraper.common import RATE_LIMITED, ScrapeFailure
+from ad_scraper.scheduler import scrape_all
+from ad_scraper.tracker import ProgressTracker
+from mock_transparency_server import make_creatives
+
+class AnswerBackend(Backend):
+    """A video for two creatives in three, after a rate limit on the first
+    attempt at every seventh one"""
+    name = 'answer'
+
+    def __init__(self):
+        super().__init__()
+        self.attempted = set()
+
+    async def extract(self, cr, ar):
+        await asyncio.sleep(0)
+        number = int(cr[2:])
+        if number % 7 == 0 and cr not in self.attempted:
+            self.attempted.add(cr)
+            raise ScrapeFailure(RATE_LIMITED, "429")
+        return self.result(f"v{number % 10**10:010d}" if number % 3 else None)
+
+def scrape(tmp_path, urls, group_size):
+    progress_tracker = ProgressTracker(str(tmp_path / f"progress_{group_size}.json"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(scrape_all(AnswerBackend(), urls, progress_tracker, 4, group_size=group_size))
+    progress_tracker.close()
+    return progress_tracker
+
+@pytest.mark.parametrize('group_size', [1, 5, 50])
+def test_advertiser_order_finds_what_input_order_finds(tmp_path, monkeypatch, group_size):
+    monkeypatch.setattr(scheduler, 'retry_delay', lambda attempts: 0)
+    urls = make_creatives(200)
+    in_input_order = scrape(tmp_path, urls, None)
+    by_advertiser = scrape(tmp_path, urls, group_size)
+    assert sorted(by_advertiser.processed_urls) == sorted(in_input_order.processed_urls) == sorted(urls)
+    key = lambda result: result['cr']
+    assert sorted(by_advertiser.sink.results, key=key) == sorted(in_input_order.sink.results, key=key)
+    assert in_input_order.failures == by_advertiser.failures == {}
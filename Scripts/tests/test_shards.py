@@ -0,0 +1,40 @@
+import pytest
+
+from ad_scraper.shards import merge_shards, shard_of, shard_path
+from ad_scraper.sinks import ResultSink, mapping_path, read_table
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_merge_drops_creatives_found_by_two_shards(tmp_path, extension):
+    if extension == '.parquet':
+        pytest.importorskip('pyarrow')
+    output = str(tmp_path / f"video_ids{extension}")
+    shard_rows = [
+        [('CR1', 'AR1', 'v1'), ('CR2', 'AR1', 'v2'), ('CR3', 'AR2', 'v1')],
+        # CR2 again, as after a rerun with a different shard count
+        [('CR4', 'AR2', 'v3'), ('CR2', 'AR1', 'v2'), ('CR5', 'AR3', 'v1')],
+    ]
+    for shard, rows in enumerate(shard_rows, 1):
+        with ResultSink(shard_path(output, shard, 2)) as sink:
+            for row in rows:
+                sink.write(*row)
+
+    merged = merge_shards(output, 2)
+    assert (merged.count, merged.unique_videos) == (5, 3)
+    assert [tuple(row) for row in read_table(output)] == [
+        ('CR1', 'AR1', 'v1'), ('CR2', 'AR1', 'v2'), ('CR3', 'AR2', 'v1'), ('CR4', 'AR2', 'v3'), ('CR5', 'AR3', 'v1')]
+    assert sorted((row[0], row[1], int(row[3])) for row in read_table(mapping_path(output))) == [
+        ('v1', 'CR1', 1), ('v1', 'CR3', 2), ('v1', 'CR5', 3), ('v2', 'CR2', 1), ('v3', 'CR4', 1)]
+
+def test_merge_needs_every_shard(tmp_path, capsys):
+    output = str(tmp_path / 'video_ids.csv')
+    with ResultSink(shard_path(output, 1, 2)) as sink:
+        sink.write('CR1', 'AR1', 'v1')
+    assert merge_shards(output, 2) is None
+    assert "1 of 2 shard outputs are missing" in capsys.readouterr().out
+    assert not (tmp_path / 'video_ids.csv').exists()
+
+def test_shards_partition_creatives():
+    creatives = [f"CR{i:020d}" for i in range(1000)]
+    shards = [shard_of(cr, 8) for cr in creatives]
+    assert shards == [shard_of(cr, 8) for cr in creatives]
+    assert set(shards) == set(range(1, 9))
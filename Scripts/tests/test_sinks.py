@@ -0,0 +1,51 @@
+import contextlib
+import io
+
+import pytest
+
+from ad_scraper.common import NOT_VIDEO, TIMEOUT
+from ad_scraper.sinks import ResultSink, mapping_path, read_table
+from ad_scraper.tracker import ProgressTracker
+
+def start_run(tmp_path, output, compact):
+    sink = ResultSink(output)
+    with contextlib.redirect_stdout(io.StringIO()):
+        # With compaction at every save, a resume reads the snapshot too
+        tracker = ProgressTracker(str(tmp_path / 'progress.json'), sink=sink,
+                                  compact_ratio=0.0 if compact else 2.0, min_compact_lines=0)
+    return sink, tracker
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_resumed_sink_neither_drops_nor_repeats_rows(tmp_path, extension, compact):
+    if extension == '.parquet':
+        pytest.importorskip('pyarrow')
+    output = str(tmp_path / f"video_ids{extension}")
+
+    # The first run saves a checkpoint, finds two more videos and dies before
+    # the next one, so those two are scraped again
+    sink, tracker = start_run(tmp_path, output, compact)
+    tracker.add_result('CR1', 'AR1', 'v1')
+    tracker.add_result('CR2', 'AR1', None)
+    tracker.add_result('CR3', 'AR2', 'v1')
+    tracker.record_outcome('CR4', 'AR2', TIMEOUT)
+    tracker.save_progress()
+    tracker.add_result('CR5', 'AR3', 'v2')
+    tracker.add_result('CR6', 'AR3', 'v1')
+    tracker.journal.close()
+    sink.close()
+
+    sink, tracker = start_run(tmp_path, output, compact)
+    assert [cr for cr, ar in [('CR1', 'AR1'), ('CR2', 'AR1'), ('CR3', 'AR2'), ('CR4', 'AR2'), ('CR5', 'AR3'), ('CR6', 'AR3')]
+            if not tracker.is_processed(cr, ar)] == ['CR4', 'CR5', 'CR6']
+    tracker.add_result('CR4', 'AR2', 'v3')
+    tracker.add_result('CR5', 'AR3', 'v2')
+    tracker.add_result('CR6', 'AR3', 'v1')
+    tracker.record_outcome('CR7', 'AR1', NOT_VIDEO)
+    tracker.close()
+    sink.close()
+
+    assert sorted(tuple(row) for row in read_table(output)) == [
+        ('CR1', 'AR1', 'v1'), ('CR3', 'AR2', 'v1'), ('CR4', 'AR2', 'v3'), ('CR5', 'AR3', 'v2'), ('CR6', 'AR3', 'v1')]
+    assert sorted((row[0], row[1], int(row[3])) for row in read_table(mapping_path(output))) == [
+        ('v1', 'CR1', 1), ('v1', 'CR3', 2), ('v1', 'CR6', 3), ('v2', 'CR5', 1), ('v3', 'CR4', 1)]